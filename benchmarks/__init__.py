@@ -0,0 +1,46 @@
+""" Benchmarks for ProjectTime. Each module is runnable on its own, e.g.:
+
+    python -m benchmarks.charge_indexes --charges 3000000
+
+Benchmarks never touch the configured database. They create (and afterwards
+destroy) a throwaway test database next to it, the same way the unit test
+runner does, so they can be pointed at a development server safely.
+"""
+
+import os
+import sys
+from contextlib import contextmanager
+
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'src', 'ProjectTime')
+
+
+def setup():
+    """ Configure Django for use outside of manage.py. """
+    # The root URLconf includes 'project.urls' relative to the ProjectTime
+    # package directory, which manage.py would normally put on the path.
+    if PROJECT_DIR not in sys.path:
+        sys.path.insert(0, PROJECT_DIR)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE',
+                          'ProjectTime.config.settings')
+
+    import django  # pylint: disable=import-outside-toplevel
+    django.setup()
+
+
+@contextmanager
+def benchmark_database(verbosity=1):
+    """ Create a migrated throwaway database for the duration of the block. """
+    # pylint: disable=import-outside-toplevel
+    from django.test.utils import (setup_databases, setup_test_environment,
+                                   teardown_databases,
+                                   teardown_test_environment)
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=verbosity, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=verbosity)
+        teardown_test_environment()
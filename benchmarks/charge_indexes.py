@@ -0,0 +1,162 @@
+""" Shows the query plans of the hot Charge queries with and without the
+    Charge indexes added in project migrations 0004_charge_indexes,
+    0006_charge_time_range, 0009_charge_owner_project_members,
+    0012_charge_duration_seconds and 0013_chargerollup_owner.
+
+    python -m benchmarks.charge_indexes [--charges N] [--projects N] [--users N]
+"""
+
+import argparse
+from datetime import timedelta
+
+from . import benchmark_database, setup
+
+BENCHMARKED_INDEXES = (
+    'charge_project_start_time_idx',
+    'charge_project_end_time_idx',
+    'charge_open_start_time_idx',
+    'charge_time_range_idx',
+    'charge_owner_start_time_idx',
+    'charge_owner_open_idx',
+    'charge_owner_duration_idx',
+    'charge_project_duration_idx',
+    'charge_owner_project_end_idx',
+)
+
+
+def get_hot_queries():
+    """ The querysets issued by the dashboard, reports and filtered lists. """
+    # pylint: disable=import-outside-toplevel
+    from django.contrib.auth import get_user_model
+    from django.db.models import Count
+    from django.utils import timezone
+
+    from ProjectTime.project.models import Charge, Project
+
+    now = timezone.now()
+    start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    user = get_user_model().objects.order_by('pk').first()
+    busiest_project = (Charge.objects.values('project')
+                       .annotate(count=Count('id'))
+                       .order_by('-count')
+                       .values_list('project', flat=True)
+                       .first())
+
+    return {
+        'Dashboard: open charges of one user': (
+            Charge.objects
+            .for_user(user)
+            .filter(closed=False)
+            .select_related('project')
+            .order_by('start_time')
+            .annotate_total_time_charged()
+        ),
+        'Admin: active projects with latest charge of any user': (
+            Project.objects
+            .filter(active=True)
+            .order_by('name')
+            .annotate_latest_charge()
+        ),
+        'Dashboard: projects of one user with their latest charge': (
+            Project.objects
+            .for_user(user)
+            .filter(active=True)
+            .order_by('name')
+            .annotate_latest_charge(owner=user)
+        ),
+        'Report: monthly range scan for one project': (
+            Charge.objects
+            .filter(project=busiest_project,
+                    end_time__isnull=False,
+                    start_time__range=(start_of_month, now))
+        ),
+        'Report: charges overlapping this month': (
+            Charge.objects
+            .time_charged_between(start_of_month, now)
+        ),
+        'Charge list: first page of one user': (
+            Charge.objects
+            .for_user(user)
+            .order_by('start_time', 'pk')[:10]
+        ),
+        'Charge list: one project, one week': (
+            Charge.objects
+            .filter(project=busiest_project,
+                    start_time__gte=now - timedelta(days=7),
+                    start_time__lt=now)
+            .order_by('start_time')
+        ),
+        'Charge list: first page of one user, by time spent': (
+            Charge.objects
+            .for_user(user)
+            .annotate_time_charged()
+            .order_by('-duration_seconds', '-pk')[:10]
+        ),
+        'Charge list: one project, by time spent': (
+            Charge.objects
+            .filter(project=busiest_project)
+            .annotate_time_charged()
+            .order_by('-duration_seconds')[:10]
+        ),
+    }
+
+
+def get_benchmarked_indexes():
+    from ProjectTime.project.models import Charge  # pylint: disable=import-outside-toplevel
+
+    return [index for index in Charge._meta.indexes
+            if index.name in BENCHMARKED_INDEXES]
+
+
+def explain_hot_queries():
+    for title, queryset in get_hot_queries().items():
+        print(f'--- {title}')
+        print(queryset.explain(analyze=True, buffers=True))
+        print()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--charges', type=int, default=3_000_000)
+    parser.add_argument('--projects', type=int, default=200)
+    parser.add_argument('--users', type=int, default=50)
+    args = parser.parse_args(argv)
+
+    setup()
+
+    # pylint: disable=import-outside-toplevel
+    from django.db import connection
+
+    from ProjectTime.project.models import Charge
+
+    from .data import seed_charges, seed_projects, seed_users
+
+    with benchmark_database():
+        print(f'Seeding {args.users} users, {args.projects} projects and '
+              f'{args.charges} charges...')
+        seed_users(args.users)
+        seed_projects(args.projects)
+        seed_charges(args.charges)
+
+        with connection.schema_editor() as schema_editor:
+            for index in get_benchmarked_indexes():
+                schema_editor.remove_index(Charge, index)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        print('=== Before: without {} ===\n'.format(', '.join(BENCHMARKED_INDEXES)))
+        explain_hot_queries()
+
+        with connection.schema_editor() as schema_editor:
+            for index in get_benchmarked_indexes():
+                schema_editor.add_index(Charge, index)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        print('=== After: with {} ===\n'.format(', '.join(BENCHMARKED_INDEXES)))
+        explain_hot_queries()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+""" Generates large volumes of benchmark data directly in PostgreSQL.
+
+Rows are produced with generate_series() in a single INSERT ... SELECT per
+table, which is orders of magnitude faster than saving model instances and
+makes seeding millions of charges practical.
+"""
+
+from django.db import connection
+
+
+def seed_projects(count, inactive_ratio=0.1):
+    """ Insert `count` projects, roughly `inactive_ratio` of them inactive. """
+    from ProjectTime.project.models import Project  # pylint: disable=import-outside-toplevel
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {Project._meta.db_table} (name, active) '
+            "SELECT 'Benchmark Project ' || i, random() >= %s "
+            'FROM generate_series(1, %s) AS i',
+            [inactive_ratio, count]
+        )
+
+
+def seed_users(count):
+    """ Insert `count` users, who cannot log in. """
+    from django.contrib.auth import get_user_model  # pylint: disable=import-outside-toplevel
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {get_user_model()._meta.db_table} '
+            '(username, password, is_superuser, is_staff, is_active, '
+            ' first_name, last_name, email, date_joined) '
+            "SELECT 'benchmark-user-' || i, '!', false, false, true, '', '', '', now() "
+            'FROM generate_series(1, %s) AS i',
+            [count]
+        )
+
+
+def seed_charges(count, years=3, open_ratio=0.001):
+    """ Insert `count` charges spread uniformly over the past `years` years.
+
+        Charges are spread over the existing projects with a skewed
+        distribution (a few projects receive most of the time), last between
+        15 minutes and 8 hours, and all but `open_ratio` of them are closed.
+        The latest open charge of each user is running (has no end time
+        yet), as users have at most one running charge. Charges are owned by
+        the existing users uniformly (if there are any), who are made members
+        of the projects they charged. The reporting rollups and project
+        totals are rebuilt afterwards, since the rows bypass the model
+        signals.
+    """
+    # pylint: disable=import-outside-toplevel
+    from django.contrib.auth import get_user_model
+
+    from ProjectTime.project.models import Charge, ChargeRollup, ChargeTotal, Project
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'WITH projects AS (SELECT array_agg(id ORDER BY id) AS ids '
+            f'                  FROM {Project._meta.db_table}), '
+            f'     users AS (SELECT array_agg(id ORDER BY id) AS ids '
+            f'               FROM {get_user_model()._meta.db_table}) '
+            f'INSERT INTO {Charge._meta.db_table} '
+            '(project_id, owner_id, start_time, end_time, closed) '
+            'SELECT projects.ids[1 + floor(power(r, 2) * array_length(projects.ids, 1))::int], '
+            '       users.ids[1 + floor(u * array_length(users.ids, 1))::int], '
+            '       s, '
+            "       s + interval '1 minute' * (15 + floor(d * 465)), "
+            '       o >= %(open)s '
+            'FROM projects, users, ('
+            "    SELECT now() - interval '1 year' * %(years)s * random() AS s, "
+            '           random() AS r, random() AS u, random() AS d, random() AS o '
+            '    FROM generate_series(1, %(count)s)'
+            ') AS g',
+            {'open': open_ratio, 'years': years, 'count': count}
+        )
+
+        cursor.execute(
+            f'UPDATE {Charge._meta.db_table} SET end_time = NULL '
+            'WHERE id IN (SELECT DISTINCT ON (owner_id) id '
+            f'             FROM {Charge._meta.db_table} '
+            '             WHERE NOT closed AND owner_id IS NOT NULL '
+            '             ORDER BY owner_id, start_time DESC)'
+        )
+
+        cursor.execute(
+            f'INSERT INTO {Project.members.through._meta.db_table} (project_id, user_id) '
+            f'SELECT DISTINCT project_id, owner_id FROM {Charge._meta.db_table} '
+            'WHERE owner_id IS NOT NULL '
+            'ON CONFLICT DO NOTHING'
+        )
+
+        cursor.execute(f'ANALYZE {Project._meta.db_table}, {Charge._meta.db_table}')
+
+    ChargeRollup.objects.rebuild()
+    ChargeTotal.objects.rebuild()
@@ -0,0 +1,88 @@
+""" Compares the latency of a deep page of the charge list when paginated by
+    page number (a COUNT, then an OFFSET past every earlier row) and when
+    paginated by keyset (a seek to the cursor, with no COUNT).
+
+    python -m benchmarks.keyset_pagination [--charges N] [--projects N] [--page N]
+
+Latencies are those of the whole request to the charge list view, including
+rendering, and are the median of several runs after a warm-up request.
+"""
+
+import argparse
+import statistics
+import time
+
+from . import benchmark_database, setup
+
+PER_PAGE = 10
+
+
+def measure(title, client, path, params, runs):
+    client.get(path, params)
+
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        response = client.get(path, params)
+        timings.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.status_code
+
+    print(f'{title:<36} {statistics.median(timings) * 1000:>10.1f} ms')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--charges', type=int, default=3_000_000)
+    parser.add_argument('--projects', type=int, default=200)
+    parser.add_argument('--page', type=int, default=1000)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    setup()
+
+    # pylint: disable=import-outside-toplevel
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from django.test import Client, override_settings
+    from django.urls import reverse
+
+    from ProjectTime.project.models import Charge
+    from ProjectTime.project.pagination import dump_cursor
+
+    from .data import seed_charges, seed_projects
+
+    with benchmark_database():
+        print(f'Seeding {args.projects} projects and {args.charges} charges...')
+        # The only user, so that the charge list shows all of the charges.
+        user = get_user_model().objects.create_superuser(
+            'benchmark', 'benchmark@example.com', 'benchmark')
+        seed_projects(args.projects)
+        seed_charges(args.charges)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        client = Client()
+        client.force_login(user)
+        path = reverse('project:charge-list')
+
+        # The cursor that the previous page would have linked to.
+        last_row = (Charge.objects
+                    .for_user(user)
+                    .order_by('start_time', 'pk')
+                    .values_list('start_time', 'pk')[(args.page - 1) * PER_PAGE - 1])
+        cursor = dump_cursor(['start_time', 'pk'], list(last_row))
+
+        with override_settings(PROJECTTIME_KEYSET_PAGINATION=False):
+            measure('By page number: first page', client, path, {}, args.runs)
+            measure(f'By page number: page {args.page}', client, path,
+                    {'page': args.page}, args.runs)
+
+        with override_settings(PROJECTTIME_KEYSET_PAGINATION=True):
+            measure('By keyset: first page', client, path, {}, args.runs)
+            measure(f'By keyset: page {args.page}', client, path,
+                    {'cursor': cursor}, args.runs)
+
+
+if __name__ == '__main__':
+    main()
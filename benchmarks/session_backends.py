@@ -0,0 +1,96 @@
+""" Compares the SQL queries and latency of each request with the database,
+    cached database and signed cookie session engines.
+
+    python -m benchmarks.session_backends [--charges N] [--projects N] [--runs N]
+
+Each page is requested once to warm the caches (including the cached timezone
+of the user) and then --runs times. The query count is that of a single
+warm request, and the latency is the median of the runs, including
+rendering.
+"""
+
+import argparse
+import statistics
+import time
+
+from . import benchmark_database, setup
+
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+
+
+def measure(client, path, params, runs):
+    """ Returns the query count and median latency (in milliseconds) of a
+        warm request.
+    """
+    # pylint: disable=import-outside-toplevel
+    from ProjectTime.project.instrumentation import collect_request_metrics
+
+    client.get(path, params)
+    # Counted as the instrumentation middleware counts them, since the test
+    # client resets connection.queries on every request.
+    with collect_request_metrics() as metrics:
+        response = client.get(path, params)
+    assert response.status_code == 200, response.status_code
+
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        client.get(path, params)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    return metrics.query_count, statistics.median(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--charges', type=int, default=10_000)
+    parser.add_argument('--projects', type=int, default=20)
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    setup()
+
+    # pylint: disable=import-outside-toplevel
+    from django.contrib.auth import get_user_model
+    from django.test import Client, override_settings
+    from django.urls import reverse
+
+    from ProjectTime.timezone.utils import set_user_timezone
+
+    from .data import seed_charges, seed_projects
+
+    pages = {
+        'DashboardView': (reverse('dashboard'), {}),
+        'ChargeListView': (reverse('project:charge-list'), {}),
+        'ProjectAutocompleteView': (reverse('project:project-autocomplete'),
+                                    {'term': 'project 1'}),
+        'Admin index': (reverse('admin:index'), {}),
+    }
+
+    with benchmark_database(verbosity=0):
+        print(f'Seeding {args.projects} projects and {args.charges} charges...')
+        user = get_user_model().objects.create_superuser(
+            'benchmark', 'benchmark@example.com', 'benchmark')
+        seed_projects(args.projects)
+        seed_charges(args.charges)
+        # Keeps the timezone warning from being added to every page.
+        set_user_timezone(user, 'UTC')
+
+        print(f'\n{"Page":<28} {"Engine":<16} {"Queries":>8} {"Latency":>12}')
+        for page, (path, params) in pages.items():
+            for name, engine in SESSION_ENGINES.items():
+                with override_settings(SESSION_ENGINE=engine):
+                    client = Client()
+                    client.force_login(user)
+                    query_count, latency = measure(client, path, params, args.runs)
+
+                print(f'{page:<28} {name:<16} {query_count:>8} {latency:>9.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,249 @@
+""" Times the dashboard, the charge list, the project admin changelist, the
+    project autocomplete and the reporting helpers against a seeded database,
+    and saves the results as JSON so that they can be compared across commits.
+
+    python -m benchmarks.suite [--size {10k,1m,10m}] [--output FILE] [--baseline FILE]
+
+Each case runs once to warm up and then --runs times, with the cache cleared
+before every run, so cached charts and counts do not hide regressions. The
+median, minimum and maximum wall time and the number of SQL queries of each
+case are saved, along with the commit, the data volumes and the versions of
+Python, Django and PostgreSQL. With --baseline, each case is compared to the
+results of an earlier run, and the exit status is 1 if any case got slower
+than --max-slowdown times its baseline median, or ran more queries. Timings
+are only comparable between runs on the same machine, while query counts
+are comparable anywhere (see benchmarks/baselines).
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from . import benchmark_database, setup
+
+# The charges, projects and users seeded for each --size.
+SIZES = {
+    '10k': (10_000, 20, 5),
+    '1m': (1_000_000, 200, 50),
+    '10m': (10_000_000, 1000, 200),
+}
+
+TO_PANDAS_VALUES = ('id', 'project__name', 'start_time', 'end_time', 'closed',
+                    'db_time_charged')
+
+
+def get_cases(client, user):
+    """ The benchmarked cases, as a mapping of names to functions. """
+    # pylint: disable=import-outside-toplevel
+    from django.db.models import Count
+    from django.urls import reverse
+    from django.utils import timezone as django_timezone
+
+    from ProjectTime.project.models import Charge, Project
+    from ProjectTime.project.utils import reporting
+
+    busiest_project = (Charge.objects
+                       .for_user(user)
+                       .values('project')
+                       .annotate(count=Count('id'))
+                       .order_by('-count')
+                       .values_list('project', flat=True)
+                       .first())
+    project_ids = list(Project.objects.for_user(user).values_list('pk', flat=True))
+
+    def get(path, params=None):
+        def request():
+            response = client.get(path, params or {})
+            assert response.status_code == 200, response.status_code
+
+        return request
+
+    return {
+        'DashboardView': get(reverse('dashboard')),
+        'ChargeListView': get(reverse('project:charge-list')),
+        'ChargeListView, filtered by project and status': get(
+            reverse('project:charge-list'),
+            {'project': busiest_project, 'closed': 'true'}),
+        'ChargeListView, filtered by project name': get(
+            reverse('project:charge-list'),
+            {'project__name__icontains': '1'}),
+        'ProjectAdmin changelist': get(reverse('admin:project_project_changelist')),
+        'ProjectAutocompleteView': get(reverse('project:project-autocomplete'),
+                                       {'term': 'project 12'}),
+        'get_monthly_summary_series': (
+            lambda: reporting.get_monthly_summary_series(django_timezone.localtime(),
+                                                         project_ids, user)),
+        'to_pandas, charges of one user': (
+            lambda: (Charge.objects
+                     .for_user(user)
+                     .annotate_time_charged()
+                     .to_pandas(*TO_PANDAS_VALUES))),
+        'aggregate_time_charged, all charges': (
+            lambda: Charge.objects.aggregate_time_charged()),
+    }
+
+
+def measure(run, runs):
+    """ Returns the timings (in milliseconds) and query count of a case. """
+    # pylint: disable=import-outside-toplevel
+    from django.core.cache import cache
+
+    from ProjectTime.project.instrumentation import collect_request_metrics
+
+    # Queries are counted as the instrumentation middleware counts them,
+    # since the test client resets connection.queries on every request.
+    cache.clear()
+    with collect_request_metrics() as metrics:
+        run()
+
+    timings = []
+    for _ in range(runs):
+        cache.clear()
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    return {
+        'median_ms': round(statistics.median(timings), 3),
+        'min_ms': round(min(timings), 3),
+        'max_ms': round(max(timings), 3),
+        'runs': runs,
+        'queries': metrics.query_count,
+    }
+
+
+def get_environment():
+    # pylint: disable=import-outside-toplevel
+    import django
+    from django.db import connection
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                    capture_output=True, text=True, check=True).stdout)
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = None, None
+
+    return {
+        'commit': commit,
+        'dirty': dirty,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'postgresql': connection.pg_version,
+    }
+
+
+def compare(results, baseline, max_slowdown):
+    """ Prints each case against its baseline, and returns whether any case
+        got slower than max_slowdown times its baseline median, or ran more
+        queries than it did.
+    """
+    regressed = False
+    print(f'\n{"Case":<48} {"Baseline":>12} {"Current":>12} {"Change":>8} {"Queries":>9}')
+    for name, result in results['cases'].items():
+        previous = baseline['cases'].get(name)
+        if not previous:
+            print(f'{name:<48} {"-":>12} {result["median_ms"]:>9.1f} ms {"new":>8} '
+                  f'{result["queries"]:>9}')
+            continue
+
+        ratio = result['median_ms'] / previous['median_ms'] if previous['median_ms'] else 1
+        flags = []
+        if ratio > max_slowdown:
+            flags.append('slower')
+        if result['queries'] > previous['queries']:
+            flags.append('more queries')
+        regressed = regressed or bool(flags)
+        queries = f'{previous["queries"]}->{result["queries"]}'
+        print(f'{name:<48} {previous["median_ms"]:>9.1f} ms {result["median_ms"]:>9.1f} ms '
+              f'{ratio:>7.2f}x {queries:>9}{"".join(f" {flag}" for flag in flags)}')
+
+    if baseline.get('data') != results['data']:
+        print('\nThe baseline was seeded with different data volumes: '
+              f'{baseline.get("data")}')
+
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', choices=SIZES, default='10k')
+    parser.add_argument('--charges', type=int, help='Overrides the charges of --size.')
+    parser.add_argument('--projects', type=int, help='Overrides the projects of --size.')
+    parser.add_argument('--users', type=int, help='Overrides the users of --size.')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--case', action='append', dest='cases',
+                        help='Only run the cases containing this text (repeatable).')
+    parser.add_argument('--output', help='The file to save the results to, as JSON.')
+    parser.add_argument('--baseline', help='The results of an earlier run to compare to.')
+    parser.add_argument('--max-slowdown', type=float, default=1.2)
+    args = parser.parse_args(argv)
+
+    charges, projects, users = SIZES[args.size]
+    charges = args.charges if args.charges is not None else charges
+    projects = args.projects if args.projects is not None else projects
+    users = args.users if args.users is not None else users
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    setup()
+
+    # pylint: disable=import-outside-toplevel
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+
+    from ProjectTime.timezone.utils import set_user_timezone
+
+    from .data import seed_charges, seed_projects, seed_users
+
+    with benchmark_database(verbosity=0):
+        print(f'Seeding {users} users, {projects} projects and {charges} charges...')
+        # Seeded first, so that it owns its share of the charges.
+        user = get_user_model().objects.create_superuser(
+            'benchmark', 'benchmark@example.com', 'benchmark')
+        seed_users(max(users - 1, 0))
+        seed_projects(projects)
+        seed_charges(charges)
+
+        client = Client()
+        client.force_login(user)
+        # Keeps the timezone warning from being added to every page.
+        set_user_timezone(user, 'UTC')
+
+        results = {
+            'environment': get_environment(),
+            'data': {'charges': charges, 'projects': projects, 'users': users},
+            'cases': {},
+        }
+        for name, run in get_cases(client, user).items():
+            if args.cases and not any(text in name for text in args.cases):
+                continue
+
+            result = measure(run, args.runs)
+            results['cases'][name] = result
+            print(f'{name:<48} {result["median_ms"]:>9.1f} ms '
+                  f'{result["queries"]:>4} queries')
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+            output_file.write('\n')
+        print(f'\nSaved the results to {args.output}')
+
+    if baseline and compare(results, baseline, args.max_slowdown):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
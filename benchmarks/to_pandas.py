@@ -0,0 +1,93 @@
+""" Compares the wall time and peak memory of converting charges to a
+    DataFrame with the original to_pandas implementation (a DataFrame built
+    from a list of named tuples) and with the chunked, typed implementation,
+    with and without pyarrow.
+
+    python -m benchmarks.to_pandas [--charges N] [--projects N] [--chunk-size N]
+
+Each conversion runs twice: once for the wall time, and once under
+tracemalloc for the peak memory, since tracing slows conversions down. Peak
+memory is that traced by tracemalloc (which includes NumPy buffers) plus the
+peak of the pyarrow memory pool, and does not include the memory held by the
+database driver.
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+from . import benchmark_database, setup
+
+VALUES = ('id', 'project__name', 'start_time', 'end_time', 'closed',
+          'db_time_charged')
+
+
+def get_arrow_peak():
+    try:
+        import pyarrow as pa  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return 0
+
+    return pa.default_memory_pool().max_memory() or 0
+
+
+def measure(title, convert):
+    gc.collect()
+    started = time.perf_counter()
+    frame = convert()
+    elapsed = time.perf_counter() - started
+
+    del frame
+    gc.collect()
+    arrow_peak_before = get_arrow_peak()
+    tracemalloc.start()
+    frame = convert()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    peak += max(get_arrow_peak() - arrow_peak_before, 0)
+
+    print(f'{title:<32} {elapsed:>8.2f}s {peak / 2 ** 20:>10.1f} MiB peak '
+          f'{frame.memory_usage(deep=True).sum() / 2 ** 20:>10.1f} MiB result')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--charges', type=int, default=1_000_000)
+    parser.add_argument('--projects', type=int, default=200)
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    setup()
+
+    # pylint: disable=import-outside-toplevel
+    import pandas as pd
+
+    from ProjectTime.project.models import Charge
+
+    from .data import seed_charges, seed_projects
+
+    with benchmark_database():
+        print(f'Seeding {args.projects} projects and {args.charges} charges...')
+        seed_projects(args.projects)
+        seed_charges(args.charges)
+
+        charges = Charge.objects.annotate_time_charged()
+
+        measure('Named tuples (original)',
+                lambda: pd.DataFrame(list(charges.values_list(*VALUES, named=True))))
+        measure('Chunked with dtypes',
+                lambda: charges.to_pandas(*VALUES, chunk_size=args.chunk_size))
+        try:
+            import pyarrow  # pylint: disable=unused-import
+        except ImportError:
+            print('Chunked with pyarrow: skipped, pyarrow is not installed')
+        else:
+            measure('Chunked with pyarrow',
+                    lambda: charges.to_pandas(*VALUES, chunk_size=args.chunk_size,
+                                              arrow=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -36,6 +36,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'django_tables2',
     'django_filters',
     'ProjectTime.project.apps.ProjectAdminConfig',
@@ -45,6 +46,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # First, so that the time and queries of the middleware below count too.
+    'ProjectTime.project.middleware.ProjectTimeInstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -94,6 +97,19 @@ DATABASES = {
 }
 
 
+# Sessions
+# https://docs.djangoproject.com/en/3.2/topics/http/sessions/#configuring-the-session-engine
+#
+# Sessions only identify the logged in user (the timezone of a user is kept
+# on their profile), so any engine can be used. The database engine queries
+# django_session on every request. 'django.contrib.sessions.backends.cached_db'
+# reads sessions from the cache first, and
+# 'django.contrib.sessions.backends.signed_cookies' keeps them in the cookie,
+# so that neither queries the database to read a session.
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -131,3 +147,45 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
 
 STATIC_URL = '/static/'
+
+
+# ProjectTime
+
+# How long (in seconds) a rendered dashboard chart may be cached for. Charts
+# are invalidated in every server process whenever a charge or project is
+# written, as the generation they are cached under is kept in the database,
+# so this only bounds how long superseded charts linger in the cache. Each
+# process renders and caches its own charts, unless a shared cache is
+# configured.
+PROJECTTIME_CHART_CACHE_TIMEOUT = 60 * 60
+
+# When enabled, the dashboard is rendered without waiting on the monthly
+# summary report, and its chart loads the report as JSON once on the page.
+PROJECTTIME_DASHBOARD_ASYNC_CHART = False
+
+# When enabled, the project and charge lists are paginated by keyset rather
+# than by page number: each page links to the next and previous pages with an
+# opaque cursor, so deep pages load as quickly as the first, and the matching
+# rows are not counted.
+PROJECTTIME_KEYSET_PAGINATION = False
+
+# Above this many (estimated) rows, the admin changelists estimate the
+# unfiltered row count from the table statistics rather than counting it,
+# cache filtered row counts, and stop showing the unfiltered total. None
+# always counts exactly.
+PROJECTTIME_APPROXIMATE_COUNT_THRESHOLD = 100000
+
+# How long (in seconds) the row estimates and cached row counts of the admin
+# changelists may be reused for.
+PROJECTTIME_COUNT_CACHE_TIMEOUT = 60
+
+# When enabled, the time and SQL queries of every request are recorded: they
+# are sent back in a Server-Timing header, logged as JSON to the
+# ProjectTime.instrumentation logger, and totalled per view at /metrics in the
+# Prometheus text format (for staff users, and for INTERNAL_IPS).
+PROJECTTIME_INSTRUMENTATION = False
+
+# How long (in seconds) the timezone of a user is cached for. The default
+# cache is in-process, so a timezone changed in one server process is only
+# seen by the others once this expires, unless a shared cache is configured.
+PROJECTTIME_TIMEZONE_CACHE_TIMEOUT = 5 * 60
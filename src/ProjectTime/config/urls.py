@@ -27,6 +27,7 @@ urlpatterns = [
     path('dashboard', project_views.DashboardView.as_view(), name='dashboard'),
     path('ui/', include(('project.urls', 'ProjectTime'), namespace='project')),
     path('admin/', admin_site.urls),
+    path('metrics', project_views.MetricsView.as_view(), name='metrics'),
 ]
 
 if settings.DEBUG:
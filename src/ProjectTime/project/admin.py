@@ -1,26 +1,91 @@
 """ Registers custom ModelAdmin's for Django models in this app.
 """
 
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import PAGE_VAR
 from django.utils import timezone
 
 from .models import Charge, Project
+from .pagination import ApproximateCountPaginator, is_count_approximate
 from .site import admin_site
 
 
+class ApproximateCountAdminMixin:
+    """ A mixin for ModelAdmin's of models with large tables. The changelist
+        is paginated with ApproximateCountPaginator, and does not count the
+        unfiltered rows for the "Show all" link once the table is too large
+        to count exactly.
+    """
+    paginator = ApproximateCountPaginator
+
+    @property
+    def show_full_result_count(self):
+        return not is_count_approximate(self.model)
+
+
+class UserScopedAdminMixin:
+    """ A mixin for ModelAdmin's of models with a for_user queryset method.
+        Users other than superusers only see what for_user gives them.
+    """
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if request.user.is_superuser:
+            return queryset
+
+        return queryset.for_user(request.user)
+
+
+class SearchListFilter(admin.FieldListFilter):
+    """ A list filter for a text field (which may be on a related model, e.g.
+        project__name) that searches it, ignoring case, instead of listing
+        every value as a choice.
+    """
+    template = 'admin/search_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f'{field_path}__icontains'
+        self.lookup_val = params.get(self.lookup_kwarg, '')
+        # Submitted along with the search, so that the other filters stay.
+        self.hidden_params = [(name, value) for name, value in request.GET.items()
+                              if name not in (self.lookup_kwarg, PAGE_VAR)]
+        super().__init__(field, request, params, model, model_admin, field_path)
+        self.title = field_path.replace('__', ' ')
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def choices(self, changelist):
+        yield {
+            'selected': not self.lookup_val,
+            'query_string': changelist.get_query_string(remove=[self.lookup_kwarg]),
+            'display': 'All',
+        }
+
+
 @admin.register(Charge, site=admin_site)
-class ChargeAdmin(admin.ModelAdmin):
-    """ A ModelAdmin for charges.
+class ChargeAdmin(ApproximateCountAdminMixin, UserScopedAdminMixin, admin.ModelAdmin):
+    """ A ModelAdmin for charges. Charges are owned by the user that adds
+        them. Selected charges can be closed together. Projects are searched
+        rather than listed, both to pick the project of a charge (from the
+        active projects) and to filter charges by project.
     """
+    actions = ('close_charges',)
+    autocomplete_fields = ('project',)
     date_hierarchy = 'start_time'
     list_display = ('project', 'start_time', 'end_time',
                     'time_spent', 'closed',)
     list_editable = ('closed',)
-    list_filter = ('project', 'start_time', 'closed',)
+    list_filter = (('project__name', SearchListFilter), 'start_time', 'closed',)
+    list_select_related = ('project',)
     ordering = ('start_time',)
 
     def get_queryset(self, request):
-        return super().get_queryset(request).annotate_time_charged()
+        # The project is displayed in the changelist, and consulted by
+        # get_readonly_fields for the change form.
+        return (super().get_queryset(request)
+                .select_related('project')
+                .annotate_time_charged())
 
     def get_readonly_fields(self, request, obj=None):
         if obj is None:
@@ -34,23 +99,83 @@ class ChargeAdmin(admin.ModelAdmin):
 
         return ()
 
-    @admin.display(ordering='db_time_charged')
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'project' and not request.user.is_superuser:
+            kwargs['queryset'] = Project.objects.for_user(request.user)
+
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_form(self, request, obj=None, change=False, **kwargs):
+        form_class = super().get_form(request, obj, change, **kwargs)
+        if obj is not None:
+            return form_class
+
+        class ChargeAddForm(form_class):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                # Before validation, which checks the running charges of the
+                # owner.
+                self.instance.owner = request.user
+
+        return ChargeAddForm
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.owner = request.user
+
+        super().save_model(request, obj, form, change)
+
+    @admin.display(ordering='duration_seconds')
     def time_spent(self, obj):
         return obj.db_time_charged
 
+    @admin.action(description='Close selected %(verbose_name_plural)s')
+    def close_charges(self, request, queryset):
+        closed_count, skipped_count = queryset.close()
+
+        self.message_user(request, f'Closed {closed_count} time increment(s).',
+                          messages.SUCCESS)
+        if skipped_count:
+            self.message_user(
+                request,
+                f'Skipped {skipped_count} time increment(s) that were already closed, '
+                'have no end time or are on an inactive project.',
+                messages.WARNING)
+
 
 @admin.register(Project, site=admin_site)
-class ProjectAdmin(admin.ModelAdmin):
+class ProjectAdmin(ApproximateCountAdminMixin, UserScopedAdminMixin, admin.ModelAdmin):
     """ A ModelAdmin for projects. The latest charge made on each project is
-        displayed alongside the project information.
+        displayed alongside the project information (of the charges of the
+        user, for users other than superusers). The user that adds a
+        project is made a member of it. Projects are searched by name, best
+        matches first.
     """
     list_display = ('name', 'last_time_increment', 'active',)
     list_editable = ('active',)
     list_filter = ('active',)
     ordering = ('name',)
+    filter_horizontal = ('members',)
+    search_fields = ('name',)
 
     def get_queryset(self, request):
-        return super().get_queryset(request).annotate_latest_charge()
+        queryset = super().get_queryset(request)
+        # Superusers see the latest charge of any user.
+        return queryset.annotate_latest_charge(
+            owner=None if request.user.is_superuser else request.user)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Charges can only be made on active projects, so the autocomplete of
+        # the project of a charge only offers those.
+        if (request.GET.get('model_name'), request.GET.get('field_name')) == ('charge', 'project'):
+            queryset = queryset.filter(active=True)
+
+        if not search_term.strip():
+            return queryset, False
+
+        # The changelist re-sorts the results by its columns, while the
+        # autocomplete widgets of other admins keep the ranking.
+        return queryset.search(search_term), False
 
     def get_readonly_fields(self, request, obj=None):
         if obj is None or obj.active:
@@ -58,6 +183,12 @@ class ProjectAdmin(admin.ModelAdmin):
 
         return ('name',)
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+
+        if not change:
+            form.instance.members.add(request.user)
+
     @admin.display(ordering='db_latest_charge')
     def last_time_increment(self, obj):
         if not obj.db_latest_charge:
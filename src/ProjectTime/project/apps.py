@@ -10,6 +10,9 @@ class ProjectAppConfig(AppConfig):
     """
     name = 'ProjectTime.project'
 
+    def ready(self):
+        from . import signals  # pylint: disable=import-outside-toplevel,unused-import
+
 
 class ProjectAdminConfig(AdminConfig):
     """ Custom admin for the project Django app
@@ -1,9 +1,123 @@
 """ Defines the filters used by views in this app
 """
 
+from datetime import datetime, time, timedelta
+
 import django_filters as filters
+from django.utils import timezone
+from django_filters.constants import EMPTY_VALUES
 
 from ProjectTime.project.models import Charge, Project
+from ProjectTime.project.widgets import ProjectAutocompleteSelect
+
+DATE_PERIODS = (
+    ('today', 'Today'),
+    ('yesterday', 'Yesterday'),
+    ('this_week', 'This week'),
+    ('last_week', 'Last week'),
+    ('this_month', 'This month'),
+    ('last_month', 'Last month'),
+    ('this_year', 'This year'),
+    ('last_year', 'Last year'),
+)
+
+
+def get_start_of_date(date):
+    """ Returns the moment a date starts in the current timezone (the session
+        timezone, when TimezoneMiddleware activated it).
+    """
+    # Days that start on a skipped hour start at the end of it.
+    return timezone.make_aware(datetime.combine(date, time.min), is_dst=False)
+
+
+def get_period_dates(period, today=None):
+    """ Returns the first date of a period (one of DATE_PERIODS) and the first
+        date after it, relative to today in the current timezone. Weeks start
+        on Monday.
+    """
+    today = today or timezone.localdate()
+    start_of_week = today - timedelta(days=today.weekday())
+    start_of_month = today.replace(day=1)
+    start_of_year = today.replace(month=1, day=1)
+
+    if period == 'today':
+        return today, today + timedelta(days=1)
+    if period == 'yesterday':
+        return today - timedelta(days=1), today
+    if period == 'this_week':
+        return start_of_week, start_of_week + timedelta(days=7)
+    if period == 'last_week':
+        return start_of_week - timedelta(days=7), start_of_week
+    if period == 'this_month':
+        return start_of_month, (start_of_month + timedelta(days=31)).replace(day=1)
+    if period == 'last_month':
+        return (start_of_month - timedelta(days=1)).replace(day=1), start_of_month
+    if period == 'this_year':
+        return start_of_year, start_of_year.replace(year=today.year + 1)
+    if period == 'last_year':
+        return start_of_year.replace(year=today.year - 1), start_of_year
+
+    raise ValueError(f'Unknown period {period!r}, expected one of '
+                     f'{", ".join(name for name, _ in DATE_PERIODS)}.')
+
+
+def filter_dates(queryset, field_name, start_date=None, end_date=None, distinct=False):
+    """ Filters a datetime field to the dates from start_date up to (but not
+        including) end_date in the current timezone, as a half-open range of
+        moments. Unlike casting the field to a date, the range can be served
+        by an index on the field.
+    """
+    lookups = {}
+    if start_date is not None:
+        lookups[f'{field_name}__gte'] = get_start_of_date(start_date)
+    if end_date is not None:
+        lookups[f'{field_name}__lt'] = get_start_of_date(end_date)
+
+    queryset = queryset.filter(**lookups)
+    return queryset.distinct() if distinct else queryset
+
+
+class LocalDateFilter(filters.DateFilter):
+    """ Filters a datetime field to the moments in a date.
+    """
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+
+        return filter_dates(qs, self.field_name, value, value + timedelta(days=1),
+                            distinct=self.distinct)
+
+
+class LocalDateRangeFilter(filters.DateFromToRangeFilter):
+    """ Filters a datetime field to the moments from the start of one date to
+        the end of another. Either date may be left out.
+    """
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+
+        return filter_dates(qs, self.field_name, value.start,
+                            value.stop + timedelta(days=1) if value.stop else None,
+                            distinct=self.distinct)
+
+
+class LocalDatePeriodFilter(filters.ChoiceFilter):
+    """ Filters a datetime field to the moments in a period relative to today,
+        such as this week or last month.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('choices', DATE_PERIODS)
+        super().__init__(*args, **kwargs)
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+
+        return filter_dates(qs, self.field_name, *get_period_dates(value),
+                            distinct=self.distinct)
 
 
 class ProjectFilter(filters.FilterSet):
@@ -15,13 +129,31 @@ class ProjectFilter(filters.FilterSet):
         }
 
 
+def get_user_projects(request):
+    # Filtersets are also used without a request, e.g. by export_charges.
+    if request is None:
+        return Project.objects.all()
+
+    return Project.objects.for_user(request.user)
+
+
 class ChargeFilter(filters.FilterSet):
+    """ Filters charges. Dates are those of the current timezone, and are
+        filtered as ranges of moments so the time indexes can serve them.
+    """
+    project = filters.ModelChoiceFilter(queryset=get_user_projects,
+                                        widget=ProjectAutocompleteSelect())
+    start_time__date = LocalDateFilter(field_name='start_time', label='Start time date')
+    start_time__range = LocalDateRangeFilter(field_name='start_time',
+                                             label='Start time date range')
+    start_time__period = LocalDatePeriodFilter(field_name='start_time',
+                                               label='Start time period')
+    end_time__date = LocalDateFilter(field_name='end_time', label='End time date')
+
     class Meta:
         model = Charge
         fields = {
             'project': ['exact'],
             'project__name': ['icontains'],
-            'start_time': ['date__exact'],
-            'end_time': ['date__exact'],
             'closed': ['exact'],
         }
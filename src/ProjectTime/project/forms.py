@@ -1,13 +1,36 @@
 """ Defines the forms used by views in this app
 """
 
+from django.db.models import Q
 from django.forms import ModelForm
 
 from ProjectTime.project.fields import HTML5SplitDateTimeField
-from ProjectTime.project.models import Charge
+from ProjectTime.project.models import Charge, Project
+from ProjectTime.project.widgets import ProjectAutocompleteSelect
 
 
 class ChargeModelForm(ModelForm):
+    """ A form for charges. Only active projects (and the current project of
+        the charge) can be selected, and are searched as the user types
+        rather than listed. Given a user, only the projects that the user is
+        a member of can be selected, and new charges are owned by the user.
+    """
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        projects = Project.objects.all()
+        if user is not None:
+            projects = projects.for_user(user)
+            # Before validation, which checks the running charges of the owner.
+            if self.instance.pk is None:
+                self.instance.owner = user
+
+        selectable = Q(active=True)
+        if self.instance.project_id is not None:
+            selectable |= Q(pk=self.instance.project_id)
+        self.fields['project'].queryset = projects.filter(selectable)
+
     class Meta:
         model = Charge
         fields = ('project', 'start_time', 'end_time', 'closed',)
@@ -15,3 +38,6 @@ class ChargeModelForm(ModelForm):
             'start_time': HTML5SplitDateTimeField,
             'end_time': HTML5SplitDateTimeField
         }
+        widgets = {
+            'project': ProjectAutocompleteSelect(active_only=True)
+        }
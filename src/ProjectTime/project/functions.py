@@ -0,0 +1,14 @@
+""" Defines the database functions used by models in this app
+"""
+
+from django.contrib.postgres.fields import DateTimeRangeField
+from django.db import models
+
+
+class TimeRange(models.Func):  # pylint: disable=abstract-method
+    """ The PostgreSQL tstzrange of a start and an end time, including the
+        start time and excluding the end time. A null end time leaves the
+        range unbounded.
+    """
+    function = 'tstzrange'
+    output_field = DateTimeRangeField()
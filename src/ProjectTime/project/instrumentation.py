@@ -0,0 +1,148 @@
+""" Defines the per-request instrumentation of this app: the number of SQL
+queries a request runs, the time spent running them, and the time spent in
+named phases of the request such as rendering templates or Bokeh charts.
+
+Metrics are only collected within collect_request_metrics, which
+ProjectTimeInstrumentationMiddleware enters for each request when the
+PROJECTTIME_INSTRUMENTATION setting is enabled. Elsewhere, timing a phase is
+a no-op.
+"""
+
+import contextvars
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+_current_metrics = contextvars.ContextVar('projecttime_request_metrics', default=None)
+
+
+class RequestMetrics:
+    """ The metrics collected for a single request.
+    """
+
+    def __init__(self):
+        self.query_count = 0
+        self.db_time = 0.0
+        self.timings = defaultdict(float)
+
+    def __call__(self, execute, sql, params, many, context):
+        # A database execute wrapper, see Django's connection.execute_wrapper.
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.query_count += 1
+
+
+@contextmanager
+def collect_request_metrics():
+    """ Collects the metrics of the queries run and the phases timed within
+        the block, in the RequestMetrics that the block is given.
+    """
+    metrics = RequestMetrics()
+    token = _current_metrics.set(metrics)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(metrics))
+            yield metrics
+    finally:
+        _current_metrics.reset(token)
+
+
+def start_timer(phase):
+    """ Starts timing the named phase of the current request, if metrics are
+        being collected, and returns a function that stops timing it.
+    """
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return lambda: None
+
+    started = time.perf_counter()
+
+    def stop():
+        metrics.timings[phase] += time.perf_counter() - started
+
+    return stop
+
+
+@contextmanager
+def timed(phase):
+    """ Adds the time spent within the block (or decorated function) to the
+        named phase of the current request, if metrics are being collected.
+    """
+    stop = start_timer(phase)
+    try:
+        yield
+    finally:
+        stop()
+
+
+class MetricsRegistry:
+    """ Totals of the metrics of the requests handled by this process, per
+        view, which can be rendered in the Prometheus text format. Each
+        server process keeps its own totals.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def observe(self, view_name, metrics, total_time):
+        with self._lock:
+            totals = self._views.setdefault(view_name, {
+                'requests': 0,
+                'seconds': 0.0,
+                'queries': 0,
+                'db_seconds': 0.0,
+                'phases': defaultdict(float),
+            })
+            totals['requests'] += 1
+            totals['seconds'] += total_time
+            totals['queries'] += metrics.query_count
+            totals['db_seconds'] += metrics.db_time
+            for phase, seconds in metrics.timings.items():
+                totals['phases'][phase] += seconds
+
+    def clear(self):
+        with self._lock:
+            self._views.clear()
+
+    def render_prometheus(self):
+        with self._lock:
+            views = sorted(self._views.items())
+            lines = []
+            for name, help_text, key in (
+                    ('projecttime_requests_total', 'Requests handled.', 'requests'),
+                    ('projecttime_request_seconds_total',
+                     'Time spent handling requests.', 'seconds'),
+                    ('projecttime_db_queries_total', 'SQL queries run.', 'queries'),
+                    ('projecttime_db_seconds_total',
+                     'Time spent running SQL queries.', 'db_seconds')):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                lines.extend(f'{name}{{view="{_escape(view)}"}} {totals[key]}'
+                             for view, totals in views)
+
+            name = 'projecttime_phase_seconds_total'
+            lines.append(f'# HELP {name} Time spent in timed phases of requests.')
+            lines.append(f'# TYPE {name} counter')
+            lines.extend(f'{name}{{view="{_escape(view)}",phase="{_escape(phase)}"}} {seconds}'
+                         for view, totals in views
+                         for phase, seconds in sorted(totals['phases'].items()))
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def _escape(label_value):
+    return (label_value
+            .replace('\\', '\\\\')
+            .replace('"', '\\"')
+            .replace('\n', '\\n'))
@@ -0,0 +1,72 @@
+""" Defines the check_charge_totals management command
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ProjectTime.project.models import ChargeTotal, Project
+
+
+class Command(BaseCommand):
+    help = ('Checks the latest charge and total time stored for each user and '
+            'project against the charges, and optionally repairs the projects '
+            'that do not match, e.g. after loading charges from a fixture.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--project',
+            type=int,
+            action='append',
+            dest='project_ids',
+            help='Only check the project with this ID. May be given more '
+                 'than once.')
+        parser.add_argument(
+            '--repair',
+            action='store_true',
+            help='Recompute the totals of the projects that do not match.')
+
+    def handle(self, *args, **options):
+        project_ids = options['project_ids']
+        stored_totals = ChargeTotal.objects.all()
+        if project_ids:
+            stored_totals = stored_totals.filter(project__in=project_ids)
+
+        stored = {
+            (total['owner'], total['project']): (total['latest_charge_at'],
+                                                 total['total_seconds'])
+            for total in stored_totals.values('owner', 'project', 'latest_charge_at',
+                                              'total_seconds')
+        }
+        expected = {
+            (total['owner'], total['project']): (total['db_latest_charge'],
+                                                 total['db_total_seconds'])
+            for total in ChargeTotal.objects.from_charges(project_ids)
+        }
+
+        # A user whose only charge on a project is running has an empty total.
+        inconsistent = sorted(
+            (project_id, owner_id)
+            for owner_id, project_id in stored.keys() | expected.keys()
+            if stored.get((owner_id, project_id), (None, 0)) !=
+            expected.get((owner_id, project_id), (None, 0))
+        )
+        project_names = dict(Project.objects
+                             .filter(pk__in={project_id for project_id, _ in inconsistent})
+                             .values_list('pk', 'name'))
+
+        for project_id, owner_id in inconsistent:
+            stored_latest, stored_seconds = stored.get((owner_id, project_id), (None, 0))
+            latest, seconds = expected.get((owner_id, project_id), (None, 0))
+            self.stderr.write(
+                f'{project_names[project_id]} (ID {project_id}), user ID {owner_id}: '
+                f'stored latest charge {stored_latest} and {stored_seconds} '
+                f'second(s), expected {latest} and {seconds} second(s).')
+
+        if not inconsistent:
+            self.stdout.write(self.style.SUCCESS('All project totals are consistent.'))
+            return
+
+        if not options['repair']:
+            raise CommandError(f'Found {len(project_names)} inconsistent project(s).')
+
+        ChargeTotal.objects.rebuild(list(project_names))
+        self.stdout.write(self.style.SUCCESS(f'Repaired {len(project_names)} project(s).'))
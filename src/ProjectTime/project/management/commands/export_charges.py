@@ -0,0 +1,83 @@
+""" Defines the export_charges management command
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.http import QueryDict
+
+from ProjectTime.project.filters import ChargeFilter
+from ProjectTime.project.management.commands.import_charges import get_owner
+from ProjectTime.project.models import Charge
+from ProjectTime.project.utils import exporting as export_helpers
+
+
+class Command(BaseCommand):
+    help = ('Exports charges to a CSV or Parquet file, reading them in chunks '
+            'so that memory use does not grow with the number of charges.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='The file to export to, or - to write CSV to standard output.')
+        parser.add_argument(
+            '--format',
+            choices=('csv', 'parquet'),
+            help='The format of the file. Defaults to parquet for .parquet '
+                 'files, and to csv otherwise. Parquet requires pyarrow.')
+        parser.add_argument(
+            '--filter',
+            default='',
+            dest='filters',
+            help='Only export the charges matching these filters, given as a '
+                 'query string as on the time increments page, e.g. '
+                 '"project=1&closed=false".')
+        parser.add_argument(
+            '--owner',
+            help='Only export the charges of the user with this username.')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=export_helpers.DEFAULT_CHUNK_SIZE,
+            help='The number of charges to read (and write per Parquet row '
+                 'group) at a time.')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('The chunk size must be at least 1.')
+
+        path = options['path']
+        file_format = options['format'] or (
+            'parquet' if path.endswith('.parquet') else 'csv')
+
+        charges = (Charge.objects.for_user(get_owner(options['owner']))
+                   if options['owner'] else Charge.objects.all())
+
+        filterset = ChargeFilter(QueryDict(options['filters']), queryset=charges)
+        if not filterset.is_valid():
+            raise CommandError(f'Invalid filters: {filterset.errors.as_text()}')
+
+        if file_format == 'parquet':
+            if path == '-':
+                raise CommandError('Parquet cannot be written to standard output.')
+
+            try:
+                exported = export_helpers.write_charge_parquet(
+                    filterset.qs, path, chunk_size=options['chunk_size'])
+            except ImportError as error:
+                raise CommandError('Exporting to Parquet requires pyarrow.') from error
+        else:
+            exported = self.write_csv(filterset.qs, path, options['chunk_size'])
+
+        self.stderr.write(self.style.SUCCESS(f'Exported {exported} charge(s).'))
+
+    def write_csv(self, charges, path, chunk_size):
+        exported = -1
+        file = self.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+        try:
+            for line in export_helpers.iter_charge_csv(charges, chunk_size):
+                file.write(line)
+                exported += 1
+        finally:
+            if file is not self.stdout:
+                file.close()
+
+        return exported
@@ -0,0 +1,135 @@
+""" Defines the import_charges management command
+"""
+
+import csv
+import sys
+import time
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from ProjectTime.project.utils import importing as import_helpers
+
+
+def get_owner(username):
+    """ Returns the user with the given username.
+    """
+    try:
+        return get_user_model().objects.get_by_natural_key(username)
+    except get_user_model().DoesNotExist as error:
+        raise CommandError(f'There is no user named {username}.') from error
+
+
+class Command(BaseCommand):
+    help = ('Imports charges in bulk for a user (--owner) from a CSV or JSON '
+            'Lines file with project (name), start_time, end_time and closed '
+            'columns. Rows that fail validation are reported and skipped, the '
+            'rest are loaded in batches.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='The file to import, or - to read from standard input.')
+        parser.add_argument(
+            '--format',
+            choices=('csv', 'jsonl'),
+            help='The format of the file. Defaults to jsonl for .jsonl and '
+                 '.json files, and to csv otherwise.')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='The number of rows to validate and load at a time.')
+        parser.add_argument(
+            '--method',
+            choices=('copy', 'bulk'),
+            default='copy',
+            help='Load with PostgreSQL COPY (the default) or with bulk_create.')
+        parser.add_argument(
+            '--rejects',
+            help='Write rejected rows to this CSV file instead of standard error.')
+        parser.add_argument(
+            '--owner',
+            required=True,
+            help='The username of the user that the charges are imported for, '
+                 'as users only see their own charges. Only projects that the '
+                 'user is a member of are accepted.')
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only validate the file, without loading any charges.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('The batch size must be at least 1.')
+
+        path = options['path']
+        file_format = options['format'] or (
+            'jsonl' if path.endswith(('.jsonl', '.json')) else 'csv')
+        options['owner'] = get_owner(options['owner'])
+
+        try:
+            stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        except OSError as error:
+            raise CommandError(f'Cannot open {path}: {error}') from error
+
+        rejects_file = (open(options['rejects'], 'w', newline='', encoding='utf-8')
+                        if options['rejects'] else None)
+        try:
+            imported, rejected, elapsed = self.import_charges(
+                stream, file_format, options, rejects_file or self.stderr)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if rejects_file:
+                rejects_file.close()
+
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {imported} charge(s) and rejected {rejected} row(s) in '
+            f'{elapsed:.1f}s ({(imported + rejected) / max(elapsed, 1e-6):.0f} rows/s).'))
+
+    def import_charges(self, stream, file_format, options, rejects_file):
+        projects = import_helpers.get_project_map(options['owner'])
+        records = import_helpers.read_charge_records(stream, file_format)
+        rejects_writer = csv.writer(rejects_file)
+        rejects_writer.writerow(('line', 'code', 'message'))
+
+        owner_has_running_charge = import_helpers.has_running_charge(options['owner'])
+
+        imported = rejected = 0
+        started = time.monotonic()
+        while True:
+            batch = list(islice(records, options['batch_size']))
+            if not batch:
+                break
+
+            charges, rejects = import_helpers.validate_charge_batch(
+                batch, projects, owner_has_running_charge)
+            if not owner_has_running_charge:
+                owner_has_running_charge = bool(charges['end_time'].isna().any())
+
+            if not options['dry_run']:
+                try:
+                    import_helpers.load_charges(charges, options['owner'],
+                                                method=options['method'])
+                except IntegrityError as error:
+                    # E.g. a running charge (one without an end time) that
+                    # the owner started during the import. The batch is
+                    # rolled back.
+                    raise CommandError(
+                        f'Cannot load the batch ending on line {batch[-1][0]}, after '
+                        f'importing {imported} charge(s): {error}') from error
+
+            rejects_writer.writerows(rejects.itertuples())
+            imported += len(charges)
+            rejected += len(rejects)
+
+            if options['verbosity'] > 1:
+                elapsed = time.monotonic() - started
+                self.stdout.write(f'{imported + rejected} row(s) processed '
+                                  f'({(imported + rejected) / max(elapsed, 1e-6):.0f} rows/s).')
+
+        return imported, rejected, time.monotonic() - started
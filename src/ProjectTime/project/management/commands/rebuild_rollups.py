@@ -0,0 +1,26 @@
+""" Defines the rebuild_rollups management command
+"""
+
+from django.core.management.base import BaseCommand
+
+from ProjectTime.project.models import ChargeRollup
+from ProjectTime.project.utils import reporting as report_helpers
+
+
+class Command(BaseCommand):
+    help = ('Rebuilds the hourly time rollups used for reporting from the '
+            'recorded charges, e.g. after loading charges from a fixture.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--project',
+            type=int,
+            action='append',
+            dest='project_ids',
+            help='Only rebuild the rollups of the project with this ID. '
+                 'May be given more than once.')
+
+    def handle(self, *args, **options):
+        created = ChargeRollup.objects.rebuild(options['project_ids'])
+        report_helpers.invalidate_monthly_summary_charts()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {created} rollup(s).'))
@@ -1,10 +1,22 @@
 """ Defines app middleware
 """
 
+import json
+import logging
+import time
+
+from django.conf import settings
 from django.contrib import messages
+from django.core.exceptions import MiddlewareNotUsed
 from django.urls import reverse, reverse_lazy
 from django.utils.safestring import mark_safe
 
+from ProjectTime.timezone.utils import get_request_timezone
+
+from . import instrumentation
+
+logger = logging.getLogger('ProjectTime.instrumentation')
+
 
 class ProjectTimeTimezoneWarningMiddleware:  # pylint: disable=too-few-public-methods
     """ Middleware that uses the Django messages framework to display a warning
@@ -28,7 +40,7 @@ class ProjectTimeTimezoneWarningMiddleware:  # pylint: disable=too-few-public-me
         if 'text/html' not in request.headers.get('Accept', ''):
             return self.get_response(request)
 
-        if 'timezone' in request.session:
+        if get_request_timezone(request):
             return self.get_response(request)
 
         if request.path_info in self.message_whitelist:
@@ -54,3 +66,61 @@ class ProjectTimeTimezoneWarningMiddleware:  # pylint: disable=too-few-public-me
         )
 
         return self.get_response(request)
+
+
+class ProjectTimeInstrumentationMiddleware:
+    """ Middleware that records the number of SQL queries, the time spent in
+        the database, templates and Bokeh, and the total time of every
+        request. These are sent back in a Server-Timing header, logged as
+        JSON to the ProjectTime.instrumentation logger, and totalled per
+        view for the metrics endpoint. It is only installed when the
+        PROJECTTIME_INSTRUMENTATION setting is enabled.
+
+        Queries run while a streaming response is consumed, after the view
+        has returned, are not included.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROJECTTIME_INSTRUMENTATION', False):
+            # Removes the middleware from the chain, so it costs nothing.
+            raise MiddlewareNotUsed()
+
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with instrumentation.collect_request_metrics() as metrics:
+            response = self.get_response(request)
+        total_time = time.perf_counter() - started
+
+        match = request.resolver_match
+        view_name = match.view_name if match else '<unresolved>'
+
+        response['Server-Timing'] = ', '.join([
+            f'total;dur={total_time * 1000:.1f}',
+            f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.query_count} queries"',
+            *(f'{phase};dur={seconds * 1000:.1f}'
+              for phase, seconds in sorted(metrics.timings.items())),
+        ])
+
+        instrumentation.registry.observe(view_name, metrics, total_time)
+        logger.info(json.dumps({
+            'view': view_name,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'query_count': metrics.query_count,
+            'db_ms': round(metrics.db_time * 1000, 1),
+            'total_ms': round(total_time * 1000, 1),
+            **{f'{phase}_ms': round(seconds * 1000, 1)
+               for phase, seconds in sorted(metrics.timings.items())},
+        }))
+
+        return response
+
+    def process_template_response(self, request, response):  # pylint: disable=unused-argument
+        # Template responses are rendered after the middleware hooks, so the
+        # template time runs from here to the end of rendering.
+        stop = instrumentation.start_timer('template')
+        response.add_post_render_callback(lambda _: stop())
+        return response
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.25 on 2026-10-18 08:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0003_alter_charge_options'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='charge',
+            index=models.Index(fields=['project', 'start_time'], name='charge_project_start_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='charge',
+            index=models.Index(fields=['project', 'end_time'], name='charge_project_end_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='charge',
+            index=models.Index(condition=models.Q(('closed', False)), fields=['start_time'], name='charge_open_start_time_idx'),
+        ),
+    ]
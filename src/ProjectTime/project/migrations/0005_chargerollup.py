@@ -0,0 +1,56 @@
+# Generated by Django 3.2.25 on 2026-10-18 08:30
+
+from django.db import migrations, models
+from django.db.models.functions import Trunc
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def backfill_rollups(apps, schema_editor):
+    Charge = apps.get_model('project', 'Charge')
+    ChargeRollup = apps.get_model('project', 'ChargeRollup')
+
+    rows = (Charge.objects
+            .filter(end_time__isnull=False)
+            .annotate(bucket=Trunc('start_time', 'hour', tzinfo=timezone.utc))
+            .order_by()
+            .values('project', 'bucket')
+            .annotate(total_time_charged=models.Sum(
+                          models.F('end_time') - models.F('start_time')),
+                      charge_count=models.Count('pk')))
+
+    ChargeRollup.objects.bulk_create((
+        ChargeRollup(project_id=row['project'],
+                     bucket=row['bucket'],
+                     total_seconds=int(row['total_time_charged'].total_seconds()),
+                     charge_count=row['charge_count'])
+        for row in rows.iterator()
+    ), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0004_charge_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChargeRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField(help_text='The start of the hour that the rolled up charges began in.')),
+                ('total_seconds', models.BigIntegerField(default=0, help_text='The total time charged in the bucket, in seconds.')),
+                ('charge_count', models.PositiveIntegerField(default=0, help_text='The number of charges rolled up into the bucket.')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='project.project')),
+            ],
+            options={
+                'verbose_name': 'time rollup',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='chargerollup',
+            constraint=models.UniqueConstraint(fields=('project', 'bucket'), name='one_rollup_per_project_and_bucket'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:07
+
+import ProjectTime.project.functions
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+# Rollups used to count each charge in the hour it started in. Recompute them
+# with charges split into the hours they overlap.
+REBUILD_ROLLUPS_SQL = """
+DELETE FROM project_chargerollup;
+INSERT INTO project_chargerollup (project_id, bucket, total_seconds, charge_count)
+SELECT charge.project_id, bucket,
+       floor(extract(epoch FROM sum(
+           least(charge.end_time, bucket + interval '1 hour') -
+           greatest(charge.start_time, bucket))))::bigint,
+       count(*)
+FROM project_charge AS charge
+CROSS JOIN LATERAL generate_series(
+    date_trunc('hour', charge.start_time AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+    date_trunc('hour', greatest(charge.start_time,
+                                charge.end_time - interval '1 microsecond')
+               AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+    interval '1 hour') AS bucket
+WHERE charge.end_time IS NOT NULL
+GROUP BY charge.project_id, bucket;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0005_chargerollup'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chargerollup',
+            name='bucket',
+            field=models.DateTimeField(help_text='The start of the hour that the rolled up time was charged in.'),
+        ),
+        migrations.AddIndex(
+            model_name='charge',
+            index=django.contrib.postgres.indexes.GistIndex(ProjectTime.project.functions.TimeRange('start_time', 'end_time'), condition=models.Q(('end_time__isnull', False)), name='charge_time_range_idx'),
+        ),
+        migrations.RunSQL(REBUILD_ROLLUPS_SQL, migrations.RunSQL.noop),
+    ]
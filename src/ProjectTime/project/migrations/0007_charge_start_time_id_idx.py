@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0006_charge_time_range'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='charge',
+            index=models.Index(fields=['start_time', 'id'], name='charge_start_time_id_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:22
+
+from django.db import migrations, models
+
+# Fill in the charge totals of the existing projects from their charges.
+BACKFILL_CHARGE_TOTALS_SQL = """
+UPDATE project_project AS project
+SET latest_charge_at = totals.latest_charge_at,
+    total_seconds = totals.total_seconds
+FROM (SELECT project_id,
+             max(end_time) AS latest_charge_at,
+             sum(floor(extract(epoch FROM end_time - start_time)))::bigint AS total_seconds
+      FROM project_charge
+      WHERE end_time IS NOT NULL
+      GROUP BY project_id) AS totals
+WHERE project.id = totals.project_id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0007_charge_start_time_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='latest_charge_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='The latest end time of the charges made on the project.', null=True),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='total_seconds',
+            field=models.BigIntegerField(default=0, editable=False, help_text='The total time charged to the project, in seconds.'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['latest_charge_at'], name='project_latest_charge_at_idx'),
+        ),
+        migrations.RunSQL(BACKFILL_CHARGE_TOTALS_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:25
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def assign_existing_charges_and_projects(apps, schema_editor):
+    """ Charges and projects used to be shared by all users. Keep them
+        visible: the charges are given to the first superuser (or user), and
+        every user is made a member of every project.
+    """
+    user_model = apps.get_model(settings.AUTH_USER_MODEL)
+    charge_model = apps.get_model('project', 'Charge')
+    project_model = apps.get_model('project', 'Project')
+
+    users = list(user_model.objects.order_by('-is_superuser', 'pk'))
+    if not users:
+        return
+
+    charge_model.objects.filter(owner__isnull=True).update(owner=users[0])
+    project_model.members.through.objects.bulk_create([
+        project_model.members.through(project_id=project_id, user_id=user.pk)
+        for project_id in project_model.objects.values_list('pk', flat=True)
+        for user in users
+    ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('project', '0008_project_charge_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='charge',
+            name='owner',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, help_text='The user that made the time increment.', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='charges', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='members',
+            field=models.ManyToManyField(blank=True, help_text='The users that can see and charge time to the project.', related_name='projects', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='charge',
+            index=models.Index(fields=['owner', 'start_time', 'id'], name='charge_owner_start_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='charge',
+            index=models.Index(condition=models.Q(('closed', False)), fields=['owner', 'start_time'], name='charge_owner_open_idx'),
+        ),
+        migrations.RunPython(assign_existing_charges_and_projects,
+                             migrations.RunPython.noop),
+    ]
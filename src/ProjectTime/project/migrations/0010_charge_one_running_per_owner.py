@@ -0,0 +1,59 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:38
+
+from django.db import migrations, models
+from django.db.models import Count
+
+# The number of conflicting charges listed when the migration stops.
+MAX_LISTED_CHARGES = 50
+
+
+def check_running_charges(apps, schema_editor):  # pylint: disable=unused-argument
+    """ Users may already have several charges without an end time, which the
+        constraint does not allow. Their end times cannot be guessed, so the
+        migration stops and lists the charges for an operator to end (or
+        delete) all but one of each user's, before migrating again.
+    """
+    charge_model = apps.get_model('project', 'Charge')
+    running_charges = charge_model.objects.filter(end_time__isnull=True,
+                                                  owner__isnull=False)
+    owner_ids = (running_charges
+                 .values('owner_id')
+                 .annotate(running_count=Count('id'))
+                 .filter(running_count__gt=1)
+                 .values('owner_id'))
+    conflicts = list(running_charges
+                     .filter(owner_id__in=owner_ids)
+                     .order_by('owner_id', 'start_time', 'id')
+                     .values_list('id', 'owner_id', 'project_id', 'start_time'))
+    if not conflicts:
+        return
+
+    lines = [
+        f'  charge {charge_id}: owner {owner_id}, project {project_id}, '
+        f'started {start_time.isoformat()}'
+        for charge_id, owner_id, project_id, start_time in conflicts[:MAX_LISTED_CHARGES]
+    ]
+    if len(conflicts) > MAX_LISTED_CHARGES:
+        lines.append(f'  ... and {len(conflicts) - MAX_LISTED_CHARGES} more.')
+
+    raise RuntimeError(
+        'Users can now have only one running time increment (without an end '
+        f'time), but {len(conflicts)} running time increments conflict:\n'
+        + '\n'.join(lines) +
+        '\nEnter an end time for (or delete) all but one of the running time '
+        'increments of each user, then migrate again.')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0009_charge_owner_project_members'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_running_charges, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='charge',
+            constraint=models.UniqueConstraint(condition=models.Q(('end_time__isnull', True)), fields=('owner',), name='one_running_charge_per_owner'),
+        ),
+    ]
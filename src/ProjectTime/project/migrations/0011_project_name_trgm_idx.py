@@ -0,0 +1,48 @@
+# Generated by Django 3.2.25 on 2026-10-18 16:05
+
+from django.db import DatabaseError, migrations, transaction
+
+# An index on the expression that icontains filters project names by
+# (UPPER("name"::text) LIKE UPPER('%...%')), so that the pg_trgm operator
+# class can serve those filters and project search without scanning every
+# project.
+CREATE_INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS project_name_trgm_idx
+ON project_project USING gin (UPPER(name::text) gin_trgm_ops);
+"""
+
+DROP_INDEX_SQL = 'DROP INDEX IF EXISTS project_name_trgm_idx;'
+
+
+def create_name_trgm_index(apps, schema_editor):  # pylint: disable=unused-argument
+    with schema_editor.connection.cursor() as cursor:
+        # pg_trgm ships with PostgreSQL's contrib modules, which some
+        # installations do not include. Searches then work unindexed.
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+
+        try:
+            with transaction.atomic(using=schema_editor.connection.alias):
+                cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        except DatabaseError:
+            # The user is not allowed to create the extension (before
+            # PostgreSQL 13, only superusers can).
+            return
+
+        cursor.execute(CREATE_INDEX_SQL)
+
+
+def drop_name_trgm_index(apps, schema_editor):  # pylint: disable=unused-argument
+    schema_editor.execute(DROP_INDEX_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0010_charge_one_running_per_owner'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_name_trgm_index, drop_name_trgm_index),
+    ]
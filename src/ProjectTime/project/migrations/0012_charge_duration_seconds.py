@@ -0,0 +1,55 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:55
+
+from django.db import migrations, models
+
+# Keeps duration_seconds current on every write of a charge, including
+# update(), COPY and raw SQL. A stored generated column would do the same,
+# but Django writes every column on INSERT and UPDATE, which PostgreSQL
+# rejects for generated columns.
+CREATE_DURATION_TRIGGER_SQL = """
+CREATE FUNCTION project_charge_set_duration_seconds() RETURNS trigger AS $$
+BEGIN
+    NEW.duration_seconds := floor(extract(epoch FROM NEW.end_time - NEW.start_time))::bigint;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER project_charge_duration_seconds
+BEFORE INSERT OR UPDATE OF start_time, end_time, duration_seconds ON project_charge
+FOR EACH ROW EXECUTE PROCEDURE project_charge_set_duration_seconds();
+"""
+
+DROP_DURATION_TRIGGER_SQL = """
+DROP TRIGGER project_charge_duration_seconds ON project_charge;
+DROP FUNCTION project_charge_set_duration_seconds();
+"""
+
+# Fill in the duration of the existing charges (through the trigger).
+BACKFILL_DURATION_SQL = """
+UPDATE project_charge SET duration_seconds = NULL WHERE end_time IS NOT NULL;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0011_project_name_trgm_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='charge',
+            name='duration_seconds',
+            field=models.BigIntegerField(blank=True, editable=False, help_text='The whole seconds from the start to the end time of the time increment, if it has ended.', null=True),
+        ),
+        migrations.RunSQL(CREATE_DURATION_TRIGGER_SQL, DROP_DURATION_TRIGGER_SQL),
+        migrations.RunSQL(BACKFILL_DURATION_SQL, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='charge',
+            index=models.Index(fields=['owner', 'duration_seconds', 'id'], name='charge_owner_duration_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='charge',
+            index=models.Index(fields=['project', 'duration_seconds'], name='charge_project_duration_idx'),
+        ),
+    ]
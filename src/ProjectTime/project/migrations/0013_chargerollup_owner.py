@@ -0,0 +1,68 @@
+# Generated by Django 3.2.25 on 2026-10-18 14:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Rollups are rebuilt from the charges, split by owner. Charges without an
+# owner are not rolled up, as no user sees them. The statements follow
+# ChargeRollupQuerySet.rebuild, and are kept apart from the schema changes,
+# as PostgreSQL cannot alter a table with pending foreign key checks.
+DELETE_ROLLUPS_SQL = """
+DELETE FROM project_chargerollup;
+"""
+
+ROLLUP_CHARGES_SQL = """
+INSERT INTO project_chargerollup ({owner_column}project_id, bucket, total_seconds, charge_count)
+SELECT {owner_value}charge.project_id, bucket,
+       floor(extract(epoch FROM sum(
+           least(charge.end_time, bucket + interval '1 hour') -
+           greatest(charge.start_time, bucket))))::bigint,
+       count(*)
+FROM project_charge AS charge
+CROSS JOIN LATERAL generate_series(
+    date_trunc('hour', charge.start_time AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+    date_trunc('hour', greatest(charge.start_time, charge.end_time - interval '1 microsecond')
+               AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+    interval '1 hour') AS bucket
+WHERE charge.end_time IS NOT NULL {owner_filter}
+GROUP BY {owner_value}charge.project_id, bucket;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('project', '0012_charge_duration_seconds'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            DELETE_ROLLUPS_SQL,
+            ROLLUP_CHARGES_SQL.format(owner_column='', owner_value='', owner_filter=''),
+        ),
+        migrations.RemoveConstraint(
+            model_name='chargerollup',
+            name='one_rollup_per_project_and_bucket',
+        ),
+        migrations.AddField(
+            model_name='chargerollup',
+            name='owner',
+            field=models.ForeignKey(db_index=False, help_text='The user whose charges are rolled up.', on_delete=django.db.models.deletion.CASCADE, related_name='charge_rollups', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='chargerollup',
+            constraint=models.UniqueConstraint(fields=('owner', 'project', 'bucket'), name='one_rollup_per_owner_project_and_bucket'),
+        ),
+        migrations.AddIndex(
+            model_name='charge',
+            index=models.Index(fields=['owner', 'project', 'end_time'], name='charge_owner_project_end_idx'),
+        ),
+        migrations.RunSQL(
+            ROLLUP_CHARGES_SQL.format(owner_column='owner_id, ',
+                                      owner_value='charge.owner_id, ',
+                                      owner_filter='AND charge.owner_id IS NOT NULL'),
+            DELETE_ROLLUPS_SQL,
+        ),
+    ]
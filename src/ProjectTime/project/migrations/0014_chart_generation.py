@@ -0,0 +1,27 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:20
+
+from django.db import migrations
+
+# The generation of the cached dashboard charts, advanced whenever a charge
+# or project is written. It is kept in the database rather than in the cache,
+# which may be per process, so that a write invalidates the charts of every
+# server process. A sequence is advanced without locking, so concurrent
+# writers do not wait on each other. It is set once, so that last_value is
+# the current generation from the start.
+CREATE_SEQUENCE_SQL = """
+CREATE SEQUENCE project_chart_generation;
+SELECT setval('project_chart_generation', 1);
+"""
+
+DROP_SEQUENCE_SQL = 'DROP SEQUENCE project_chart_generation;'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0013_chargerollup_owner'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_SEQUENCE_SQL, DROP_SEQUENCE_SQL),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# The latest charge and total time of projects are replaced by those of each
+# user on a project, which the listings of the projects of a user read. The
+# totals are computed from the charges as ChargeTotalQuerySet.rebuild does,
+# once the schema changes are done, as PostgreSQL cannot alter a table with
+# pending foreign key checks.
+TOTAL_CHARGES_SQL = """
+INSERT INTO project_chargetotal (owner_id, project_id, latest_charge_at, total_seconds)
+SELECT owner_id, project_id, max(end_time), sum(duration_seconds)
+FROM project_charge
+WHERE end_time IS NOT NULL AND owner_id IS NOT NULL
+GROUP BY owner_id, project_id;
+"""
+
+# Reverses the migration, once the fields of projects are added back.
+TOTAL_PROJECT_CHARGES_SQL = """
+UPDATE project_project AS project
+SET latest_charge_at = charge.latest_charge_at, total_seconds = charge.total_seconds
+FROM (SELECT project_id, max(end_time) AS latest_charge_at,
+             sum(duration_seconds) AS total_seconds
+      FROM project_charge
+      WHERE end_time IS NOT NULL
+      GROUP BY project_id) AS charge
+WHERE project.id = charge.project_id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('project', '0014_chart_generation'),
+    ]
+
+    operations = [
+        migrations.RunSQL(migrations.RunSQL.noop, TOTAL_PROJECT_CHARGES_SQL),
+        migrations.RemoveIndex(
+            model_name='project',
+            name='project_latest_charge_at_idx',
+        ),
+        migrations.RemoveField(
+            model_name='project',
+            name='latest_charge_at',
+        ),
+        migrations.RemoveField(
+            model_name='project',
+            name='total_seconds',
+        ),
+        migrations.CreateModel(
+            name='ChargeTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('latest_charge_at', models.DateTimeField(help_text='The latest end time of the charges of the user on the project.', null=True)),
+                ('total_seconds', models.BigIntegerField(default=0, help_text='The total time charged by the user to the project, in seconds.')),
+                ('owner', models.ForeignKey(db_index=False, help_text='The user whose charges are totalled.', on_delete=django.db.models.deletion.CASCADE, related_name='charge_totals', to=settings.AUTH_USER_MODEL)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='charge_totals', to='project.project')),
+            ],
+            options={
+                'verbose_name': 'time total',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='chargetotal',
+            constraint=models.UniqueConstraint(fields=('owner', 'project'), name='one_total_per_owner_and_project'),
+        ),
+        migrations.RunSQL(TOTAL_CHARGES_SQL, migrations.RunSQL.noop),
+    ]
@@ -1,6 +1,10 @@
 """ Defines mixins used in this app.
 """
+from itertools import islice
+
 import pandas as pd
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models, transaction
 
 
 class ValidateModelMixin:  # pylint: disable=too-few-public-methods
@@ -9,23 +13,301 @@ class ValidateModelMixin:  # pylint: disable=too-few-public-methods
         before saving changes.
     """
 
-    def validate_and_save(self, *args, **kwargs):
+    def validate_and_save(self, *args, lock=False, **kwargs):
         """ Validate and save changes to the model instance.
             Returns the model instance afterwards, so can be used like so:
 
             model_instance = AModel(field=value, f2=v2).validate_and_save()
+
+            Validation compares against the values the instance was loaded
+            with. For models with TrackOriginalValuesMixin, pass lock=True to
+            instead compare against the stored row, locked with
+            SELECT ... FOR UPDATE until the changes are saved.
         """
-        self.full_clean()
-        self.save(*args, **kwargs)
+        if not lock:
+            self.full_clean()
+            self.save(*args, **kwargs)
+            return self
+
+        with transaction.atomic():
+            self.refresh_original_values(for_update=True)
+            self.full_clean()
+            self.save(*args, **kwargs)
+
         return self
 
 
-class PandasQuerySetMixin:  # pylint: disable=too-few-public-methods
+class TrackOriginalValuesMixin:
+    """ A mixin for classes that inherit from django.db.models.Model, which
+        must precede Model in the bases of the class. It remembers the values
+        of the fields named (by attname) in `tracked_fields` as they were
+        last loaded from or saved to the database, so that changes can be
+        validated without querying for the stored row.
+    """
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._original_values = {
+            name: value for name, value in zip(field_names, values)
+            if name in cls.tracked_fields and value is not models.DEFERRED
+        }
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+
+        update_fields = kwargs.get('update_fields')
+        self._original_values = {
+            **getattr(self, '_original_values', {}),
+            **{
+                name: getattr(self, name) for name in self.tracked_fields
+                if update_fields is None or self._is_field_in(name, update_fields)
+            }
+        }
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+
+        # The reloaded values are the stored ones, e.g. after set-based writes
+        # like ChargeQuerySet.close() that bypass save().
+        deferred_fields = self.get_deferred_fields()
+        self._original_values = {
+            **getattr(self, '_original_values', {}),
+            **{
+                name: getattr(self, name) for name in self.tracked_fields
+                if name not in deferred_fields
+                and (fields is None or self._is_field_in(name, fields))
+            }
+        }
+
+    def get_original_value(self, name):
+        """ Returns the value of a tracked field as it was last loaded from or
+            saved to the database. Only queries the database if the value is
+            not known, e.g. for instances constructed with a primary key.
+            Returns None when there is no stored row.
+        """
+        original_values = getattr(self, '_original_values', {})
+        if name not in original_values and self.pk is not None:
+            self.refresh_original_values()
+            original_values = self._original_values
+
+        return original_values.get(name)
+
+    def refresh_original_values(self, for_update=False):
+        """ Reloads the values of the tracked fields from the database. With
+            for_update, the row stays locked until the end of the transaction.
+        """
+        queryset = type(self)._base_manager.filter(pk=self.pk)
+        if for_update:
+            queryset = queryset.select_for_update()
+
+        self._original_values = queryset.values(*self.tracked_fields).first() or {}
+
+    def _is_field_in(self, name, field_names):
+        field = self._meta.get_field(name)
+        return field.name in field_names or field.attname in field_names
+
+
+class PandasQuerySetMixin:
     """ A mixin for classes that inherit from django.db.models.QuerySet.
-        It augments the queryset with a method that refines the queryset
-        similarly to values_list, then evaluates and outputs a Pandas
-        DataFrame.
+        It augments the queryset with methods that refine the queryset
+        similarly to values_list, then evaluate it and output Pandas
+        DataFrames whose column dtypes are derived from the model fields.
+    """
+
+    def to_pandas(self, *values, chunk_size=10000, dtypes=None, arrow=False):
+        """ Returns a DataFrame of the given values (by default, the concrete
+            fields and annotations) of the queryset. Rows are read with a
+            server-side cursor, chunk_size at a time, and converted to their
+            dtypes per chunk. `dtypes` overrides the dtype of a column.
+
+            With arrow=True, rows are converted through pyarrow (an optional
+            dependency) instead, which is faster and uses less memory for
+            large querysets.
+        """
+        if arrow:
+            return self._to_pandas_with_arrow(values, chunk_size, dtypes)
+
+        chunks = list(self.iter_pandas(*values, chunk_size=chunk_size, dtypes=dtypes))
+        if len(chunks) == 1:
+            return chunks[0]
+
+        frame = pd.concat(chunks, ignore_index=True)
+        for name, chunk_column in chunks[0].items():
+            # Categoricals only survive concatenation with equal categories.
+            if isinstance(chunk_column.dtype, pd.CategoricalDtype):
+                frame[name] = union_categoricals(
+                    [chunk[name] for chunk in chunks])
+
+        return frame
+
+    def iter_pandas(self, *values, chunk_size=10000, dtypes=None):
+        """ Yields DataFrames of (at most) chunk_size rows each, see to_pandas.
+            There is always at least one, possibly empty, DataFrame.
+        """
+        rows_queryset = self.values_list(*values)
+        columns = get_values_list_names(rows_queryset)
+        column_dtypes = {**get_values_list_dtypes(rows_queryset, columns),
+                         **(dtypes or {})}
+
+        for chunk in _iter_chunks(rows_queryset, chunk_size):
+            yield _to_typed_frame(chunk, columns, column_dtypes)
+
+    def _to_pandas_with_arrow(self, values, chunk_size, dtypes):
+        import pyarrow as pa  # pylint: disable=import-outside-toplevel
+
+        rows_queryset = self.values_list(*values)
+        columns = get_values_list_names(rows_queryset)
+        column_dtypes = {**get_values_list_dtypes(rows_queryset, columns),
+                         **(dtypes or {})}
+
+        batches = [
+            pa.RecordBatch.from_arrays(
+                [_to_arrow_array(pa, column, column_dtypes.get(name))
+                 for name, column in zip(columns, _to_columns(chunk, columns))],
+                names=columns)
+            for chunk in _iter_chunks(rows_queryset, chunk_size)
+        ]
+
+        # Dictionary encoded columns are converted to categoricals, with their
+        # categories in order of appearance rather than sorted.
+        frame = pa.Table.from_batches(batches).to_pandas()
+        for name, dtype in column_dtypes.items():
+            if dtype == 'category':
+                frame[name] = frame[name].cat.reorder_categories(
+                    sorted(frame[name].cat.categories))
+
+        return frame.astype({name: dtype for name, dtype in column_dtypes.items()
+                             if dtype != 'category' and name in frame.columns})
+
+
+def get_values_list_names(queryset):
+    """ Returns the column names of the rows of a values_list queryset.
+    """
+    # pylint: disable=protected-access
+    query = queryset.query
+    return list(queryset._fields or
+                (*query.extra_select, *query.values_select, *query.annotation_select))
+
+
+def get_values_list_dtypes(queryset, columns):
+    """ Returns the Pandas dtypes of the given values_list columns, derived
+        from the model fields (or annotation output fields) they are read
+        from. Columns of unrecognized fields are left out.
     """
+    column_dtypes = {}
+    for name in columns:
+        field, through_relation = _resolve_field(queryset, name)
+        dtype = _get_field_dtype(field, through_relation) if field else None
+        if dtype:
+            column_dtypes[name] = dtype
+
+    return column_dtypes
+
+
+def union_categoricals(columns):
+    """ Concatenates categorical Series, unioning their categories.
+    """
+    return pd.Series(pd.api.types.union_categoricals(
+        [pd.Categorical(column) for column in columns],
+        sort_categories=True))
+
+
+def _resolve_field(queryset, name):
+    annotation = queryset.query.annotation_select.get(name)
+    if annotation is not None:
+        return annotation.output_field, False
+
+    model = queryset.model
+    field = None
+    parts = name.split('__')
+    for index, part in enumerate(parts):
+        if part == 'pk':
+            field = model._meta.pk
+        else:
+            try:
+                field = model._meta.get_field(part)
+            except FieldDoesNotExist:
+                return None, False
+
+        if index < len(parts) - 1:
+            if not field.is_relation:
+                return None, False
+            model = field.related_model
+
+    return field, len(parts) > 1
+
+
+def _get_field_dtype(field, through_relation):
+    # The target of a foreign key is stored, so type by the target field.
+    if field.is_relation:
+        if not field.many_to_one and not field.one_to_one:
+            return None
+        null = field.null
+        field = field.target_field
+    else:
+        null = field.null
+
+    if isinstance(field, models.DateTimeField):
+        return 'datetime64[ns, UTC]'
+    if isinstance(field, models.DurationField):
+        return 'timedelta64[ns]'
+    if isinstance(field, models.BooleanField):
+        return 'boolean' if null else 'bool'
+    if isinstance(field, (models.AutoField, models.IntegerField)):
+        return 'Int64' if null else 'int64'
+    if isinstance(field, models.FloatField):
+        return 'float64'
+    # Text reached through a relation (e.g. project names of charges)
+    # repeats across rows, so is stored once per distinct value.
+    if isinstance(field, (models.CharField, models.TextField)) and through_relation:
+        return 'category'
+
+    return None
+
+
+def _iter_chunks(rows_queryset, chunk_size):
+    # Always yields at least one (possibly empty) chunk, so that the result
+    # of an empty queryset still has its columns.
+    rows = rows_queryset.iterator(chunk_size=chunk_size)
+    chunk = list(islice(rows, chunk_size))
+    while True:
+        yield chunk
+
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+
+
+def _to_columns(rows, columns):
+    return list(zip(*rows)) if rows else [()] * len(columns)
+
+
+def _to_typed_frame(rows, columns, column_dtypes):
+    # Pandas already infers most dtypes from the Python objects (and does so
+    # faster than converting them explicitly), so only convert the others.
+    frame = pd.DataFrame.from_records(rows, columns=columns)
+    for name, dtype in column_dtypes.items():
+        if name not in frame.columns or str(frame[name].dtype) == dtype:
+            continue
+        if dtype.startswith('datetime64'):
+            frame[name] = pd.to_datetime(frame[name], utc=True)
+        elif dtype.startswith('timedelta64'):
+            frame[name] = pd.to_timedelta(frame[name])
+        else:
+            frame[name] = frame[name].astype(dtype)
+
+    return frame
+
+
+def _to_arrow_array(pa, values, dtype):  # pylint: disable=invalid-name
+    if dtype and dtype.startswith('datetime64'):
+        return pa.array(values, type=pa.timestamp('us', tz='UTC'))
+    if dtype and dtype.startswith('timedelta64'):
+        return pa.array(values, type=pa.duration('us'))
+    if dtype == 'category':
+        return pa.array(values, type=pa.string()).dictionary_encode()
 
-    def to_pandas(self, *values):
-        return pd.DataFrame(list(self.values_list(*values, named=True)))
+    return pa.array(values)
@@ -3,23 +3,33 @@
 
 from datetime import timedelta
 
+from django.conf import settings
+from django.contrib.postgres.indexes import GistIndex
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
 from django.utils import formats, timezone
 
-from .mixins import ValidateModelMixin
-from .querysets import ChargeQuerySet, ProjectQuerySet
+from .functions import TimeRange
+from .mixins import TrackOriginalValuesMixin, ValidateModelMixin
+from .querysets import (ChargeQuerySet, ChargeRollupQuerySet,
+                        ChargeTotalQuerySet, ProjectQuerySet)
 
 # Create your models here.
 
 
-class Project(models.Model, ValidateModelMixin):
+class Project(TrackOriginalValuesMixin, models.Model, ValidateModelMixin):
     """ A model for projects. Projects have unique names and can marked
         active/inactive. A project cannot be modified while it is marked
-        inactive.
+        inactive. Users only see the projects that they are members of. The
+        latest charge and the total time charged by each user to a project
+        are stored as charge totals (see ChargeTotal).
     """
     objects = ProjectQuerySet.as_manager()
+    tracked_fields = ('active',)
 
+    # The pg_trgm index that serves name searches, project_name_trgm_idx, is
+    # created by a migration where the extension is available, so it is not
+    # declared here.
     name = models.CharField(
         unique=True,
         max_length=255,
@@ -31,15 +41,20 @@ class Project(models.Model, ValidateModelMixin):
         help_text='An inactive project is disabled for modification.'
     )
 
+    members = models.ManyToManyField(
+        settings.AUTH_USER_MODEL,
+        blank=True,
+        related_name='projects',
+        help_text='The users that can see and charge time to the project.')
+
     def clean_fields(self, exclude=None):
         super().clean_fields(exclude=exclude)
 
         if self.pk:
-            previously_active = (Project.objects.values_list('active', flat=True)
-                                 .get(pk=self.pk))
+            previously_active = self.get_original_value('active')
             currently_active = self.active
 
-            if not previously_active and not currently_active:
+            if previously_active is False and not currently_active:
                 raise ValidationError(
                     'Cannot modify when marked as inactive.',
                     code='cannot_modify_when_inactive'
@@ -51,14 +66,17 @@ class Project(models.Model, ValidateModelMixin):
             status='' if self.active else ' (Inactive)')
 
 
-class Charge(models.Model, ValidateModelMixin):
+class Charge(TrackOriginalValuesMixin, models.Model, ValidateModelMixin):
     """ A model for charges. Charges are associated with projects, and have a
         start and end time. When the charge has been recorded in the canonical
         timekeeping system, it should be marked as closed. A charge cannot be
         modified while it is marked as closed. A charge cannot be created for a
-        project when the project is not active.
+        project when the project is not active. Charges are owned by the user
+        that made them, and users only see their own charges. A user can have
+        only one running charge, i.e. one without an end time.
     """
     objects = ChargeQuerySet.as_manager()
+    tracked_fields = ('project_id', 'start_time', 'end_time', 'closed',)
 
     class Meta:  # pylint: disable=too-few-public-methods
         verbose_name = 'time increment'
@@ -72,6 +90,66 @@ class Charge(models.Model, ValidateModelMixin):
                 name='cannot_close_without_end_time',
                 check=~((models.Q(closed__exact=True)) &
                         (models.Q(end_time__exact=None)))
+            ),
+            # Lets the timer start a charge with a single INSERT, rather than
+            # checking for a running charge first (see ChargeQuerySet.start).
+            models.UniqueConstraint(
+                name='one_running_charge_per_owner',
+                fields=('owner',),
+                condition=models.Q(end_time__isnull=True)
+            )
+        )
+        indexes = (
+            models.Index(
+                name='charge_project_start_time_idx',
+                fields=('project', 'start_time')
+            ),
+            models.Index(
+                name='charge_project_end_time_idx',
+                fields=('project', 'end_time')
+            ),
+            models.Index(
+                name='charge_open_start_time_idx',
+                fields=('start_time',),
+                condition=models.Q(closed=False)
+            ),
+            # Serves the keyset pagination of the charge list.
+            models.Index(
+                name='charge_start_time_id_idx',
+                fields=('start_time', 'id')
+            ),
+            # Serve the charges of a user (see ChargeQuerySet.for_user): the
+            # charge list and time ranges, and the open charges.
+            models.Index(
+                name='charge_owner_start_time_idx',
+                fields=('owner', 'start_time', 'id')
+            ),
+            models.Index(
+                name='charge_owner_open_idx',
+                fields=('owner', 'start_time'),
+                condition=models.Q(closed=False)
+            ),
+            # Serves the latest charge of a user on each project, as charge
+            # totals are refreshed (see ChargeRollupQuerySet.refresh).
+            models.Index(
+                name='charge_owner_project_end_idx',
+                fields=('owner', 'project', 'end_time')
+            ),
+            # Serve sorting charges by the time charged (see
+            # ChargeQuerySet.annotate_time_charged), of a user and of a project.
+            models.Index(
+                name='charge_owner_duration_idx',
+                fields=('owner', 'duration_seconds', 'id')
+            ),
+            models.Index(
+                name='charge_project_duration_idx',
+                fields=('project', 'duration_seconds')
+            ),
+            # Serves ChargeQuerySet.overlapping, for reports over intervals.
+            GistIndex(
+                TimeRange('start_time', 'end_time'),
+                name='charge_time_range_idx',
+                condition=models.Q(end_time__isnull=False)
             )
         )
 
@@ -80,6 +158,17 @@ class Charge(models.Model, ValidateModelMixin):
         on_delete=models.PROTECT,
         help_text='*Required: Select the project this time increment will be associated with.')
 
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        editable=False,
+        # Covered by the indexes leading with the owner.
+        db_index=False,
+        related_name='charges',
+        help_text='The user that made the time increment.')
+
     start_time = models.DateTimeField(
         help_text='*Required: Enter the date and time that work began on.')
 
@@ -93,6 +182,15 @@ class Charge(models.Model, ValidateModelMixin):
         default=False,
         help_text='A closed charge is disabled for modification.')
 
+    # Maintained by a trigger (see migration 0012), so that it is current
+    # after any write, including update() and raw SQL, and can be indexed.
+    duration_seconds = models.BigIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text='The whole seconds from the start to the end time of the '
+                  'time increment, if it has ended.')
+
     @property
     def time_charged(self):
         if not self.end_time:
@@ -134,8 +232,7 @@ class Charge(models.Model, ValidateModelMixin):
             raise ValidationError({'closed': error})
 
         if self.pk:
-            previously_closed = (Charge.objects.values_list('closed', flat=True)
-                                 .get(pk=self.pk))
+            previously_closed = self.get_original_value('closed')
             currently_closed = self.closed
 
             if previously_closed and currently_closed:
@@ -144,6 +241,41 @@ class Charge(models.Model, ValidateModelMixin):
                     code='cannot_modify_when_closed'
                 )
 
+    def validate_unique(self, exclude=None):
+        super().validate_unique(exclude=exclude)
+
+        # Django does not validate conditional unique constraints itself.
+        if self.owner_id is None or self.end_time is not None:
+            return
+
+        running_charges = (Charge.objects
+                           .filter(owner_id=self.owner_id, end_time__isnull=True)
+                           .exclude(pk=self.pk))
+        if running_charges.exists():
+            error = ValidationError(
+                'Another time increment is already running. Enter an end time, '
+                'or stop the running time increment first.',
+                code='one_running_charge_per_owner'
+            )
+
+            if exclude and 'end_time' in exclude:
+                raise error
+
+            raise ValidationError({'end_time': error})
+
+    def save(self, *args, **kwargs):
+        # Charge writes also update the reporting rollups (see signals.py),
+        # which must commit or roll back together with the charge itself.
+        with transaction.atomic():
+            # As the trigger will store it.
+            self.duration_seconds = (int(self.time_charged.total_seconds())
+                                     if self.end_time else None)
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
     def __str__(self):
         charged = self.time_charged
 
@@ -156,3 +288,129 @@ class Charge(models.Model, ValidateModelMixin):
             units='hours' if charged.total_seconds() >= 3600 else 'minutes',
             status='Closed' if self.closed else 'Open'
         )
+
+
+class ChargeRollup(models.Model):
+    """ A model for the time charged by a user to a project, summed per hour.
+        Rollups are derived from charges with an end time and an owner (as
+        users only see their own charges) and are kept current as charges
+        are saved and deleted, so reports read a handful of rows per project
+        instead of aggregating every charge. A charge is split into the hours
+        that it overlaps, and counted in each of them. Hourly buckets (rather
+        than daily or monthly ones) let day and month totals be summed in
+        whichever timezone the user session is in; where it is offset from UTC
+        by part of an hour, the partial hours at either end are read from the
+        charges.
+    """
+    objects = ChargeRollupQuerySet.as_manager()
+
+    class Meta:  # pylint: disable=too-few-public-methods
+        verbose_name = 'time rollup'
+        constraints = (
+            models.UniqueConstraint(
+                name='one_rollup_per_owner_project_and_bucket',
+                fields=('owner', 'project', 'bucket')
+            ),
+        )
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        # Covered by the one_rollup_per_owner_project_and_bucket constraint.
+        db_index=False,
+        related_name='charge_rollups',
+        help_text='The user whose charges are rolled up.')
+
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE)
+
+    bucket = models.DateTimeField(
+        help_text='The start of the hour that the rolled up time was charged in.')
+
+    total_seconds = models.BigIntegerField(
+        default=0,
+        help_text='The total time charged in the bucket, in seconds.')
+
+    charge_count = models.PositiveIntegerField(
+        default=0,
+        help_text='The number of charges rolled up into the bucket.')
+
+    @staticmethod
+    def get_bucket(moment):
+        """ Returns the bucket (the start of the hour, in UTC) of a moment.
+        """
+        return moment.astimezone(timezone.utc).replace(minute=0,
+                                                       second=0,
+                                                       microsecond=0)
+
+    @classmethod
+    def get_buckets(cls, start_time, end_time):
+        """ Returns the buckets that the time from start_time to end_time is
+            split into, none if there is no end time.
+        """
+        if end_time is None:
+            return []
+
+        last_moment = max(start_time, end_time - timedelta(microseconds=1))
+        bucket = cls.get_bucket(start_time)
+        buckets = []
+        while bucket <= last_moment:
+            buckets.append(bucket)
+            bucket += timedelta(hours=1)
+
+        return buckets
+
+    def __str__(self):
+        return '{project}, {bucket} ({total_seconds} seconds)'.format(
+            project=self.project.name,
+            bucket=formats.localize(timezone.localtime(self.bucket)),
+            total_seconds=self.total_seconds
+        )
+
+
+class ChargeTotal(models.Model):
+    """ A model for the latest charge and the total time charged by a user to
+        a project. Like rollups, totals are derived from charges with an
+        owner and are kept current as charges are saved and deleted, so that
+        listing the projects of a user with their latest charge joins one row
+        per project instead of searching the charges of each.
+    """
+    objects = ChargeTotalQuerySet.as_manager()
+
+    class Meta:  # pylint: disable=too-few-public-methods
+        verbose_name = 'time total'
+        constraints = (
+            models.UniqueConstraint(
+                name='one_total_per_owner_and_project',
+                fields=('owner', 'project')
+            ),
+        )
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        # Covered by the one_total_per_owner_and_project constraint.
+        db_index=False,
+        related_name='charge_totals',
+        help_text='The user whose charges are totalled.')
+
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE,
+        related_name='charge_totals')
+
+    latest_charge_at = models.DateTimeField(
+        null=True,
+        help_text='The latest end time of the charges of the user on the project.')
+
+    total_seconds = models.BigIntegerField(
+        default=0,
+        help_text='The total time charged by the user to the project, in seconds.')
+
+    def __str__(self):
+        return '{project}, {owner} ({total_seconds} seconds)'.format(
+            project=self.project.name,
+            owner=self.owner,
+            total_seconds=self.total_seconds
+        )
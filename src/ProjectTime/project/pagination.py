@@ -0,0 +1,280 @@
+""" Defines keyset (also known as seek) pagination for the table views in
+this app, and an approximately counting paginator for the admin site.
+
+Offset pagination counts every matching row, and then reads and discards
+all of the rows before the requested page, so it slows down the deeper a
+user pages. Keyset pagination instead remembers the sort key of the row a
+page ends at, in an opaque cursor token, and filters the next page to the
+rows after it, which an index on the sort key can seek to directly.
+"""
+
+import hashlib
+import operator
+from datetime import date, datetime, timedelta
+from functools import reduce
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import Paginator
+from django.db import connection, models
+from django.utils.functional import cached_property
+from django.utils.duration import duration_iso_string
+from django_tables2.paginators import LazyPaginator
+
+CURSOR_SALT = 'ProjectTime.project.pagination.cursor'
+COUNT_CACHE_PREFIX = 'project:count'
+
+
+class KeysetPaginationMixin:
+    """ A mixin for views that inherit from django_tables2's
+        SingleTableMixin. When the PROJECTTIME_KEYSET_PAGINATION setting is
+        enabled, it paginates the table by keyset rather than by offset,
+        on whichever column the table is sorted by (and then the primary
+        key), without counting the rows. The table gets next_cursor and
+        previous_cursor attributes, which are None when there is no such
+        page and empty for the first page, and is rendered with previous and
+        next links only.
+    """
+    cursor_field = 'cursor'
+    keyset_table_template_name = 'project/keyset_table.html'
+
+    def is_keyset_paginated(self):
+        return getattr(settings, 'PROJECTTIME_KEYSET_PAGINATION', False)
+
+    def get_table_pagination(self, table):
+        if self.is_keyset_paginated():
+            # The table is paginated in get_table, once it is sorted.
+            return False
+
+        return super().get_table_pagination(table)
+
+    def get_table(self, **kwargs):
+        table = super().get_table(**kwargs)
+        if not self.is_keyset_paginated():
+            return table
+
+        pagination = super().get_table_pagination(table)
+        per_page = (pagination or {}).get('per_page') or table._meta.per_page
+
+        queryset = table.data.data
+        ordering = get_keyset_ordering(queryset)
+        cursor = load_cursor(self.request.GET.get(self.cursor_field), ordering)
+
+        page_queryset = queryset.order_by(*ordering)
+        if cursor:
+            page_queryset = page_queryset.filter(
+                get_keyset_filter(queryset, ordering, *cursor))
+
+        table.data.data = page_queryset
+        table.paginate(paginator_class=LazyPaginator, per_page=per_page, page=1)
+        table.template_name = self.keyset_table_template_name
+
+        records = [row.record for row in table.page.object_list]
+        table.next_cursor = (
+            dump_cursor(ordering, get_keyset_values(records[-1], ordering))
+            if table.page.has_next() else None
+        )
+        table.previous_cursor = (
+            get_previous_cursor(queryset, ordering,
+                                get_keyset_values(records[0], ordering), per_page)
+            if cursor and records else None
+        )
+
+        return table
+
+
+def get_keyset_ordering(queryset):
+    """ Returns the ordering of the queryset, ending with the primary key so
+        that every row has a distinct sort key.
+    """
+    ordering = [name for name in queryset.query.order_by if isinstance(name, str)]
+    if not ordering or ordering[-1].lstrip('-') not in ('pk', 'id'):
+        descending = bool(ordering) and ordering[-1].startswith('-')
+        ordering.append('-pk' if descending else 'pk')
+
+    return ordering
+
+
+def get_keyset_values(instance, ordering):
+    """ Returns the sort key of a model instance for the given ordering.
+    """
+    values = []
+    for name in ordering:
+        value = instance
+        for part in name.lstrip('-').split('__'):
+            value = getattr(value, part) if value is not None else None
+
+        values.append(value.pk if isinstance(value, models.Model) else value)
+
+    return values
+
+
+def get_keyset_filter(queryset, ordering, values, inclusive=False):
+    """ Returns a Q object matching the rows after the given sort key (or
+        starting at it, if inclusive) in the given ordering. As in
+        PostgreSQL, nulls sort after other values in ascending order and
+        before them in descending order.
+    """
+    conditions = []
+    equal = models.Q()
+    for name, value in zip(ordering, values):
+        field = name.lstrip('-')
+        descending = name.startswith('-')
+
+        if value is None:
+            after = models.Q(**{f'{field}__isnull': False}) if descending else None
+            is_equal = models.Q(**{f'{field}__isnull': True})
+        else:
+            after = models.Q(**{f'{field}__{"lt" if descending else "gt"}': value})
+            if not descending:
+                after |= models.Q(**{f'{field}__isnull': True})
+            is_equal = models.Q(**{field: value})
+
+        # A row is after the key if it equals the key on the columns before
+        # this one, and is after it on this one.
+        if after is not None:
+            conditions.append(equal & after)
+        equal &= is_equal
+
+    if inclusive:
+        conditions.append(equal)
+
+    keyset_filter = reduce(operator.or_, conditions, models.Q(pk__in=[]))
+
+    # A redundant bound on a leading non-null column lets the database seek
+    # to the start of the page with an index, rather than test every row.
+    leading_field = _get_concrete_field(queryset, ordering[0].lstrip('-'))
+    if values[0] is not None and leading_field and not leading_field.null:
+        lookup = 'lte' if ordering[0].startswith('-') else 'gte'
+        keyset_filter &= models.Q(**{f'{ordering[0].lstrip("-")}__{lookup}': values[0]})
+
+    return keyset_filter
+
+
+def get_previous_cursor(queryset, ordering, first_values, per_page):
+    """ Returns the cursor of the page before the page starting at the given
+        sort key: None if there is none, or empty for the first page.
+    """
+    reversed_ordering = [name[1:] if name.startswith('-') else f'-{name}'
+                         for name in ordering]
+    names = [name.lstrip('-') for name in ordering]
+    previous_keys = list(queryset
+                         .filter(get_keyset_filter(queryset, reversed_ordering,
+                                                   first_values))
+                         .order_by(*reversed_ordering)
+                         .values_list(*names)[:per_page + 1])
+
+    if not previous_keys:
+        return None
+    if len(previous_keys) <= per_page:
+        return ''
+
+    return dump_cursor(ordering, list(previous_keys[per_page - 1]), inclusive=True)
+
+
+def dump_cursor(ordering, values, inclusive=False):
+    """ Returns an opaque, signed cursor token for a sort key.
+    """
+    return signing.dumps(
+        {'o': ordering, 'k': [_encode(value) for value in values], 'i': inclusive},
+        salt=CURSOR_SALT, compress=True)
+
+
+def load_cursor(token, ordering):
+    """ Returns the sort key values and inclusive flag of a cursor token,
+        or None if there is no valid cursor for the given ordering (e.g.
+        because the table was sorted differently since).
+    """
+    if not token:
+        return None
+
+    try:
+        cursor = signing.loads(token, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        return None
+
+    if cursor.get('o') != ordering or len(cursor.get('k', ())) != len(ordering):
+        return None
+
+    return cursor['k'], bool(cursor.get('i'))
+
+
+def _get_concrete_field(queryset, name):
+    if '__' in name or name in queryset.query.annotations:
+        return None
+
+    try:
+        return queryset.model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return queryset.model._meta.pk if name == 'pk' else None
+
+
+def _encode(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return duration_iso_string(value)
+
+    return value
+
+
+class ApproximateCountPaginator(Paginator):
+    """ A paginator that avoids counting the rows of large tables exactly.
+        Once the table of the paginated model is estimated to have more rows
+        than the PROJECTTIME_APPROXIMATE_COUNT_THRESHOLD setting, unfiltered
+        querysets are counted with the planner's row estimate, and filtered
+        querysets are counted exactly but cached for the
+        PROJECTTIME_COUNT_CACHE_TIMEOUT setting. Smaller tables are always
+        counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, models.QuerySet) or not is_count_approximate(queryset.model):
+            return super().count
+
+        if not queryset.query.where and not queryset.query.distinct:
+            return get_estimated_count(queryset.model)
+
+        return get_cached_count(queryset)
+
+
+def is_count_approximate(model):
+    """ Returns whether the rows of the model are too many to count exactly.
+    """
+    threshold = getattr(settings, 'PROJECTTIME_APPROXIMATE_COUNT_THRESHOLD', None)
+    return threshold is not None and get_estimated_count(model) > threshold
+
+
+def get_estimated_count(model):
+    """ Returns the planner's estimate of the number of rows in the table of a
+        model, as of when it was last vacuumed or analyzed, or -1 if it has
+        not been yet. The estimate is cached for the
+        PROJECTTIME_COUNT_CACHE_TIMEOUT setting.
+    """
+    def estimate():
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                           (connection.ops.quote_name(model._meta.db_table),))
+            return cursor.fetchone()[0]
+
+    return cache.get_or_set(f'{COUNT_CACHE_PREFIX}:estimate:{model._meta.label_lower}',
+                            estimate, _get_count_cache_timeout())
+
+
+def get_cached_count(queryset):
+    """ Returns the exact number of rows in a queryset, cached for the
+        PROJECTTIME_COUNT_CACHE_TIMEOUT setting.
+    """
+    sql, params = queryset.query.sql_with_params()
+    fingerprint = hashlib.md5(repr((sql, params)).encode()).hexdigest()
+
+    return cache.get_or_set(f'{COUNT_CACHE_PREFIX}:{fingerprint}',
+                            queryset.count, _get_count_cache_timeout())
+
+
+def _get_count_cache_timeout():
+    return getattr(settings, 'PROJECTTIME_COUNT_CACHE_TIMEOUT', 60)
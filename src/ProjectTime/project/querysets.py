@@ -1,26 +1,117 @@
 """ Defines custom QuerySet's used by models in this app
 """
 
-from django.db import models
+from datetime import timedelta
 
+from django.apps import apps
+from django.contrib.postgres.search import TrigramSimilarity
+from django.core.exceptions import EmptyResultSet
+from django.db import connection, models, transaction
+from django.db.models.functions import Greatest, Least, Trunc
+from django.utils import timezone
+from psycopg2.extras import DateTimeTZRange
+
+from .functions import TimeRange
 from .mixins import PandasQuerySetMixin
 
+ROLLUP_BUCKET_SIZE = timedelta(hours=1)
+BUCKET_PERIODS = ('hour', 'day', 'week', 'month', 'year')
+
+
+_trigram_extension_installed = {}
+
+
+def has_trigram_extension():
+    """ Whether the pg_trgm extension is installed in the database, which
+        the project_name_trgm_idx index and similarity ranking need. Checked
+        once per database.
+    """
+    database = connection.settings_dict['NAME']
+    if database not in _trigram_extension_installed:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _trigram_extension_installed[database] = cursor.fetchone() is not None
+
+    return _trigram_extension_installed[database]
+
 
 class ProjectQuerySet(models.QuerySet, PandasQuerySetMixin):
     """ Extra queryset methods for projects
     """
 
-    def annotate_latest_charge(self):
-        return self.annotate(
-            db_latest_charge=models.Max('charge__end_time')
-        )
+    def for_user(self, user):
+        """ The projects that the user is a member of.
+        """
+        if not user.is_authenticated:
+            return self.none()
+
+        return self.filter(members=user)
+
+    def search(self, text):
+        """ The projects whose names contain the text, ignoring case, best
+            matches first. Matches are ranked by trigram similarity when
+            pg_trgm is installed, and otherwise names starting with the text
+            come first. The rank is annotated as db_rank.
+        """
+        text = text.strip()
+        if not text:
+            return self.annotate(db_rank=models.Value(0.0)).order_by('name')
+
+        # Served by project_name_trgm_idx, which indexes the same expression.
+        projects = self.filter(name__icontains=text)
+        if has_trigram_extension():
+            rank = TrigramSimilarity('name', text)
+        else:
+            rank = models.Case(models.When(name__istartswith=text, then=models.Value(1.0)),
+                               default=models.Value(0.0))
+
+        return (projects
+                .annotate(db_rank=models.ExpressionWrapper(
+                    rank, output_field=models.FloatField()))
+                .order_by('-db_rank', 'name'))
+
+    def annotate_latest_charge(self, owner=None):
+        """ Annotate the end time of the latest charge on each project as
+            db_latest_charge, of the charges of the owner if given. It is read
+            from the charge totals (see ChargeTotal): for an owner, by joining
+            their total of each project on the one_total_per_owner_and_project
+            constraint, and otherwise from the latest of the totals of each
+            project. Charges without an owner are not counted.
+        """
+        if owner is not None:
+            return self.annotate(
+                owner_charge_total=models.FilteredRelation(
+                    'charge_totals', condition=models.Q(charge_totals__owner=owner)),
+                db_latest_charge=models.F('owner_charge_total__latest_charge_at'))
+
+        charge_totals = self.model._meta.get_field('charge_totals').related_model
+        latest_charges = (charge_totals.objects
+                          .filter(project=models.OuterRef('pk'),
+                                  latest_charge_at__isnull=False)
+                          .order_by('-latest_charge_at')
+                          .values('latest_charge_at')[:1])
+
+        return self.annotate(db_latest_charge=models.Subquery(latest_charges))
 
 
 class ChargeQuerySet(models.QuerySet, PandasQuerySetMixin):
     """ Extra queryset methods for charges
     """
 
+    def for_user(self, user):
+        """ The charges that the user owns. Filtering on the owner first lets
+            the owner indexes limit queries to the rows of the user.
+        """
+        if not user.is_authenticated:
+            return self.none()
+
+        return self.filter(owner=user)
+
     def annotate_time_charged(self):
+        """ Annotate the exact time charged by each charge as db_time_charged.
+            Sort by the stored duration_seconds instead, which is indexed,
+            though only counts whole seconds.
+        """
         return self.annotate(
             db_time_charged=models.F('end_time') - models.F('start_time')
         )
@@ -29,3 +120,426 @@ class ChargeQuerySet(models.QuerySet, PandasQuerySetMixin):
         return self.annotate_time_charged().aggregate(
             total_time_charged=models.Sum('db_time_charged')
         ).get('total_time_charged')
+
+    def annotate_total_time_charged(self):
+        """ Like annotate_time_charged, but also annotates every row with the
+            total time charged of all of the rows (db_total_time_charged),
+            summed by a window over the same query. This spares a separate
+            aggregate_time_charged query when the rows are read anyway.
+        """
+        return self.annotate_time_charged().annotate(
+            db_total_time_charged=models.Window(models.Sum('db_time_charged'))
+        )
+
+    def start(self, owner, project_id, start_time):
+        """ Start a running charge (one without an end time) for the owner on
+            an active project that the owner is a member of, with a single
+            INSERT. Returns the charge, or None if the project cannot be
+            charged or the owner already has a running charge, which the
+            one_running_charge_per_owner constraint decides without reading
+            it first.
+        """
+        project_field = self.model._meta.get_field('project')
+        members = project_field.related_model.members.through._meta.db_table
+
+        return self._get_returned_charge(
+            f'INSERT INTO {self.model._meta.db_table} '
+            '(project_id, owner_id, start_time, end_time, closed) '
+            'SELECT project.id, %(owner_id)s, %(start_time)s, NULL, false '
+            f'FROM {project_field.related_model._meta.db_table} AS project '
+            f'JOIN {members} AS member ON member.project_id = project.id '
+            'WHERE project.id = %(project_id)s AND project.active '
+            '  AND member.user_id = %(owner_id)s '
+            'ON CONFLICT (owner_id) WHERE end_time IS NULL DO NOTHING',
+            {'owner_id': owner.pk, 'project_id': project_id, 'start_time': start_time})
+
+    def stop(self, owner, end_time):
+        """ Stop the running charge of the owner at end_time (or when it
+            started, if that is later), with a single conditional UPDATE.
+            Returns the charge, or None if there was no running charge or its
+            project is no longer active, as Charge.clean_fields requires.
+
+            Like update(), this does not send the post_save signal; see
+            utils/timer.py for keeping derived data current.
+        """
+        table = self.model._meta.db_table
+        project_table = self.model._meta.get_field('project').related_model._meta.db_table
+
+        return self._get_returned_charge(
+            f'UPDATE {table} '
+            'SET end_time = greatest(%(end_time)s, start_time) '
+            'WHERE owner_id = %(owner_id)s AND end_time IS NULL '
+            f'  AND EXISTS (SELECT 1 FROM {project_table} AS project '
+            f'              WHERE project.id = {table}.project_id AND project.active)',
+            {'owner_id': owner.pk, 'end_time': end_time})
+
+    def close(self):
+        """ Close the charges of the queryset that can be closed, i.e. those
+            that are open, have an end time and are on an active project,
+            in a single UPDATE. Returns the number of charges closed and the
+            number skipped (because they were already closed or cannot be).
+        """
+        try:
+            charges_sql, params = self.order_by().values('pk').query.sql_with_params()
+        except EmptyResultSet:
+            return 0, 0
+
+        project_model = self.model._meta.get_field('project').related_model
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'WITH matched AS ({charges_sql}), closed AS ('
+                f'    UPDATE {self.model._meta.db_table} AS charge SET closed = true '
+                f'    FROM {project_model._meta.db_table} AS project '
+                '    WHERE charge.id IN (SELECT id FROM matched) '
+                '      AND project.id = charge.project_id '
+                '      AND NOT charge.closed '
+                '      AND charge.end_time IS NOT NULL '
+                '      AND project.active '
+                '    RETURNING charge.id'
+                ') '
+                'SELECT (SELECT count(*) FROM closed), (SELECT count(*) FROM matched)',
+                params)
+            closed_count, matched_count = cursor.fetchone()
+
+        return closed_count, matched_count - closed_count
+
+    def _get_returned_charge(self, sql, params):
+        fields = list(self.model._meta.concrete_fields)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                sql + ' RETURNING {}'.format(
+                    ', '.join(connection.ops.quote_name(field.column) for field in fields)),
+                params)
+            row = cursor.fetchone()
+
+        if row is None:
+            return None
+
+        return self.model.from_db(self.db, [field.attname for field in fields], row)
+
+    def bucket_time_charged(self, period, tz=None):
+        """ Sum the time charged per project and period ('hour', 'day',
+            'week', 'month' or 'year') that charges started in, in a single
+            grouped query. Periods begin at midnight (and weeks on Monday) in
+            the given timezone, by default the current one. Charges without
+            an end time are left out.
+
+            Returns one row per project and bucket, with the project (id),
+            the bucket (the start of the period), total_time_charged and
+            charge_count. See time_charged_between for totals that clip
+            charges to an interval instead.
+        """
+        if period not in BUCKET_PERIODS:
+            raise ValueError(f'Cannot bucket time charged by {period!r}, expected one of '
+                             f'{", ".join(BUCKET_PERIODS)}.')
+
+        return (self
+                .filter(end_time__isnull=False)
+                .annotate(bucket=Trunc(
+                    'start_time', period,
+                    tzinfo=tz or timezone.get_current_timezone()))
+                .order_by()
+                .values('project', 'bucket')
+                .annotate(total_time_charged=models.Sum(
+                              models.F('end_time') - models.F('start_time')),
+                          charge_count=models.Count('pk'))
+                .order_by('project', 'bucket'))
+
+    def overlapping(self, start, end):
+        """ Filter to the charges with an end time that overlap the interval
+            from start (inclusive) to end (exclusive), including charges of
+            no time within it, as rollups count them. The filter is served
+            by the charge_time_range_idx index.
+        """
+        # The time range of a charge of no time is empty, and overlaps
+        # nothing, so those charges are matched by their start time.
+        return (self
+                .filter(end_time__isnull=False)
+                .alias(db_time_range=TimeRange('start_time', 'end_time'))
+                .filter(models.Q(db_time_range__overlap=DateTimeTZRange(start, end)) |
+                        models.Q(start_time=models.F('end_time'),
+                                 start_time__gte=start,
+                                 start_time__lt=end)))
+
+    def annotate_time_charged_between(self, start, end):
+        """ Like annotate_time_charged, but for the charges overlapping the
+            interval from start to end, and counting only the time charged
+            within it.
+        """
+        return self.overlapping(start, end).annotate(
+            db_time_charged=(Least('end_time', models.Value(end)) -
+                             Greatest('start_time', models.Value(start)))
+        )
+
+    def time_charged_between(self, start, end):
+        """ Sum the time charged per project in the interval from start to
+            end, in a single grouped query. Charges that only partly overlap
+            the interval are clipped to it, rather than attributed to the
+            interval that they started in.
+        """
+        return (self
+                .annotate_time_charged_between(start, end)
+                .order_by()
+                .values('project')
+                .annotate(total_time_charged=models.Sum('db_time_charged'),
+                          charge_count=models.Count('pk'))
+                .order_by('project'))
+
+
+class ChargeRollupQuerySet(models.QuerySet):
+    """ Extra queryset methods for charge rollups
+    """
+
+    def refresh(self, buckets, totals=()):
+        """ Recompute the given (owner id, project id, bucket) rollups from the
+            charges, and add (owner id, project id, seconds) rows to the
+            charge totals (see ChargeTotal), recomputing their latest charge
+            too. This is done in a single statement (after locking the
+            projects), as charges are saved and deleted. The seconds may be
+            negative, for charges that were removed.
+        """
+        buckets = sorted(set(buckets))
+        totals = list(totals)
+        if not buckets and not totals:
+            return
+
+        bucket_owner_ids, bucket_project_ids, bucket_starts = (
+            zip(*buckets) if buckets else ((), (), ()))
+        owner_ids, project_ids, seconds = zip(*totals) if totals else ((), (), ())
+
+        charge_table = self._get_charge_model()._meta.db_table
+        total_table = apps.get_model(self.model._meta.app_label, 'ChargeTotal')._meta.db_table
+        table = self.model._meta.db_table
+
+        with transaction.atomic(savepoint=False):
+            self._lock_projects(set(bucket_project_ids) | set(project_ids))
+            with connection.cursor() as cursor:
+                # The charges are matched to the buckets as overlapping()
+                # matches them, so the charge_time_range_idx index serves
+                # the join. Buckets without any charges left are deleted.
+                cursor.execute(
+                    'WITH affected AS ('
+                    '    SELECT DISTINCT owner_id, project_id, bucket '
+                    '    FROM unnest(%s::integer[], %s::integer[], %s::timestamptz[]) '
+                    '         AS affected (owner_id, project_id, bucket)'
+                    '), computed AS ('
+                    '    SELECT affected.owner_id, affected.project_id, affected.bucket, '
+                    '           floor(extract(epoch FROM sum('
+                    "               least(charge.end_time, affected.bucket + interval '1 hour') - "
+                    '               greatest(charge.start_time, affected.bucket))))::bigint '
+                    '               AS total_seconds, '
+                    '           count(*) AS charge_count '
+                    '    FROM affected '
+                    f'    JOIN {charge_table} AS charge '
+                    '      ON charge.owner_id = affected.owner_id '
+                    '     AND charge.project_id = affected.project_id '
+                    '     AND charge.end_time IS NOT NULL '
+                    '     AND (tstzrange(charge.start_time, charge.end_time) && '
+                    "          tstzrange(affected.bucket, affected.bucket + interval '1 hour') "
+                    '          OR charge.start_time = charge.end_time '
+                    '             AND charge.start_time >= affected.bucket '
+                    "             AND charge.start_time < affected.bucket + interval '1 hour') "
+                    '    GROUP BY affected.owner_id, affected.project_id, affected.bucket'
+                    '), deleted AS ('
+                    f'    DELETE FROM {table} AS rollup USING affected '
+                    '    WHERE rollup.owner_id = affected.owner_id '
+                    '      AND rollup.project_id = affected.project_id '
+                    '      AND rollup.bucket = affected.bucket '
+                    '      AND NOT EXISTS (SELECT 1 FROM computed '
+                    '                      WHERE computed.owner_id = affected.owner_id '
+                    '                        AND computed.project_id = affected.project_id '
+                    '                        AND computed.bucket = affected.bucket)'
+                    '), upserted AS ('
+                    f'    INSERT INTO {table} '
+                    '    (owner_id, project_id, bucket, total_seconds, charge_count) '
+                    '    SELECT * FROM computed '
+                    '    ON CONFLICT (owner_id, project_id, bucket) DO UPDATE SET '
+                    '    total_seconds = excluded.total_seconds, '
+                    '    charge_count = excluded.charge_count'
+                    ') '
+                    f'INSERT INTO {total_table} AS total '
+                    '(owner_id, project_id, total_seconds, latest_charge_at) '
+                    'SELECT delta.owner_id, delta.project_id, delta.seconds, ('
+                    f'    SELECT charge.end_time FROM {charge_table} AS charge '
+                    '    WHERE charge.owner_id = delta.owner_id '
+                    '      AND charge.project_id = delta.project_id '
+                    '      AND charge.end_time IS NOT NULL '
+                    '    ORDER BY charge.end_time DESC LIMIT 1) '
+                    'FROM (SELECT owner_id, project_id, sum(seconds) AS seconds '
+                    '      FROM unnest(%s::integer[], %s::integer[], %s::bigint[]) '
+                    '           AS delta (owner_id, project_id, seconds) '
+                    '      GROUP BY owner_id, project_id) AS delta '
+                    'ON CONFLICT (owner_id, project_id) DO UPDATE SET '
+                    'total_seconds = total.total_seconds + excluded.total_seconds, '
+                    'latest_charge_at = excluded.latest_charge_at',
+                    [list(bucket_owner_ids), list(bucket_project_ids), list(bucket_starts),
+                     list(owner_ids), list(project_ids), list(seconds)])
+
+    def add(self, rollups):
+        """ Add (owner id, project id, bucket, total seconds, charge count) rows
+            to the stored rollups, e.g. for charges that were bulk created. Unlike
+            refresh, this does not need to re-read the charges.
+        """
+        rollups = list(rollups)
+        if not rollups:
+            return
+
+        owner_ids, project_ids, buckets, total_seconds, charge_counts = zip(*rollups)
+        table = self.model._meta.db_table
+
+        with transaction.atomic():
+            self._lock_projects(set(project_ids))
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {table} '
+                    '(owner_id, project_id, bucket, total_seconds, charge_count) '
+                    'SELECT * FROM unnest(%s::integer[], %s::integer[], %s::timestamptz[], '
+                    '                     %s::bigint[], %s::integer[]) '
+                    'ON CONFLICT (owner_id, project_id, bucket) DO UPDATE SET '
+                    f'total_seconds = {table}.total_seconds + excluded.total_seconds, '
+                    f'charge_count = {table}.charge_count + excluded.charge_count',
+                    [list(owner_ids), list(project_ids), list(buckets),
+                     list(total_seconds), list(charge_counts)])
+
+    def rebuild(self, project_ids=None):
+        """ Recompute all rollups (or those of the given projects) from the
+            charges. Returns the number of rollups created.
+        """
+        charges = self._get_charge_model().objects.all()
+        rollups = self.all()
+        if project_ids:
+            charges = charges.filter(project__in=project_ids)
+            rollups = rollups.filter(project__in=project_ids)
+
+        with transaction.atomic():
+            self._lock_projects(project_ids)
+            rollups.delete()
+            return self._insert_from_charges(charges)
+
+    def _insert_from_charges(self, charges):
+        # Each charge is split into the hours that it overlaps, and clipped
+        # to each of them, in a single INSERT ... SELECT. Charges without an
+        # owner are left out, as no user sees them.
+        charges_sql, params = (charges
+                               .filter(end_time__isnull=False, owner__isnull=False)
+                               .order_by()
+                               .values('owner_id', 'project_id', 'start_time', 'end_time')
+                               .query.sql_with_params())
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {self.model._meta.db_table} '
+                '(owner_id, project_id, bucket, total_seconds, charge_count) '
+                'SELECT charge.owner_id, charge.project_id, bucket, '
+                '       floor(extract(epoch FROM sum('
+                "           least(charge.end_time, bucket + interval '1 hour') - "
+                '           greatest(charge.start_time, bucket))))::bigint, '
+                '       count(*) '
+                f'FROM ({charges_sql}) AS charge '
+                'CROSS JOIN LATERAL generate_series('
+                "    date_trunc('hour', charge.start_time AT TIME ZONE 'UTC') AT TIME ZONE 'UTC', "
+                "    date_trunc('hour', greatest(charge.start_time, "
+                "                                charge.end_time - interval '1 microsecond') "
+                "               AT TIME ZONE 'UTC') AT TIME ZONE 'UTC', "
+                "    interval '1 hour') AS bucket "
+                'GROUP BY charge.owner_id, charge.project_id, bucket',
+                params)
+
+            return cursor.rowcount
+
+    def _lock_projects(self, project_ids):
+        # Serializes rollup writes per project, so that concurrent charge
+        # writes cannot each overwrite a bucket with their own stale total.
+        projects = self.model._meta.get_field('project').related_model.objects
+        if project_ids:
+            projects = projects.filter(pk__in=project_ids)
+
+        list(projects.select_for_update().order_by('pk').values_list('pk', flat=True))
+
+    def _get_charge_model(self):
+        return apps.get_model(self.model._meta.app_label, 'Charge')
+
+
+class ChargeTotalQuerySet(models.QuerySet):
+    """ Extra queryset methods for charge totals
+    """
+
+    def add(self, totals):
+        """ Add (owner id, project id, seconds, end time) rows to the stored
+            totals, e.g. for charges that were bulk created. The end time may
+            be None. Unlike ChargeRollupQuerySet.refresh, this does not need
+            to re-read the charges.
+        """
+        totals = list(totals)
+        if not totals:
+            return
+
+        owner_ids, project_ids, seconds, end_times = zip(*totals)
+        table = self.model._meta.db_table
+
+        with transaction.atomic():
+            self._lock_projects(set(project_ids))
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {table} AS total '
+                    '(owner_id, project_id, total_seconds, latest_charge_at) '
+                    'SELECT owner_id, project_id, sum(seconds), max(end_time) '
+                    'FROM unnest(%s::integer[], %s::integer[], %s::bigint[], '
+                    '            %s::timestamptz[]) '
+                    '     AS delta (owner_id, project_id, seconds, end_time) '
+                    'GROUP BY owner_id, project_id '
+                    'ON CONFLICT (owner_id, project_id) DO UPDATE SET '
+                    'total_seconds = total.total_seconds + excluded.total_seconds, '
+                    'latest_charge_at = greatest(total.latest_charge_at, '
+                    '                            excluded.latest_charge_at)',
+                    [list(owner_ids), list(project_ids), list(seconds), list(end_times)])
+
+    def from_charges(self, project_ids=None):
+        """ The totals that the charges (of the given projects) add up to, as
+            owner, project, db_latest_charge and db_total_seconds values.
+            These are what the stored totals should hold.
+        """
+        charges = self._get_charge_model().objects.filter(end_time__isnull=False,
+                                                          owner__isnull=False)
+        if project_ids:
+            charges = charges.filter(project__in=project_ids)
+
+        return (charges
+                .order_by()
+                .values('owner', 'project')
+                .annotate(db_latest_charge=models.Max('end_time'),
+                          db_total_seconds=models.Sum('duration_seconds')))
+
+    def rebuild(self, project_ids=None):
+        """ Recompute all totals (or those of the given projects) from the
+            charges. Returns the number of totals created.
+        """
+        totals = self.all()
+        if project_ids:
+            totals = totals.filter(project__in=project_ids)
+
+        charges_sql, params = self.from_charges(project_ids).query.sql_with_params()
+
+        with transaction.atomic():
+            self._lock_projects(project_ids)
+            totals.delete()
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {self.model._meta.db_table} '
+                    '(owner_id, project_id, latest_charge_at, total_seconds) '
+                    f'{charges_sql}',
+                    params)
+
+                return cursor.rowcount
+
+    def _lock_projects(self, project_ids):
+        # Serializes total writes per project, as for rollups.
+        projects = self.model._meta.get_field('project').related_model.objects
+        if project_ids:
+            projects = projects.filter(pk__in=project_ids)
+
+        list(projects.select_for_update().order_by('pk').values_list('pk', flat=True))
+
+    def _get_charge_model(self):
+        return apps.get_model(self.model._meta.app_label, 'Charge')
@@ -0,0 +1,148 @@
+""" Defines the signal receivers for this app
+"""
+
+import pandas as pd
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from .models import Charge, ChargeRollup, ChargeTotal, Project
+from .utils import reporting as report_helpers
+
+
+# Sent (with sender=Charge) after charges were created without saving each
+# model instance, e.g. by the import_charges command. The `charges` argument
+# is a DataFrame with owner_id, project_id, start_time, end_time and closed
+# columns.
+charges_bulk_created = Signal()
+
+# Sent (with sender=Charge) after charges without an end time were given one
+# without saving each model instance, e.g. when a timer is stopped. Their
+# time had not been counted, so it is added as for created charges. The
+# `charges` argument is a DataFrame like that of charges_bulk_created.
+charges_bulk_ended = Signal()
+
+
+def refresh_charge_data(*charge_keys):
+    """ Refresh the rollup buckets and the charge totals of the given
+        (owner id, project id, start time, end time, sign) charges, a sign of
+        1 for charges that were added and of -1 for those that were removed.
+        Charges without an owner are neither rolled up nor totalled.
+    """
+    buckets = [
+        (owner_id, project_id, bucket)
+        for owner_id, project_id, start_time, end_time, _ in charge_keys
+        if owner_id is not None
+        for bucket in ChargeRollup.get_buckets(start_time, end_time)
+    ]
+    totals = [
+        (owner_id, project_id, sign * get_time_charged(start_time, end_time))
+        for owner_id, project_id, start_time, end_time, sign in charge_keys
+        if owner_id is not None
+    ]
+
+    ChargeRollup.objects.refresh(buckets, totals)
+
+
+def get_time_charged(start_time, end_time):
+    """ Returns the whole seconds charged from start_time to end_time, as
+        counted in the total_seconds of charge totals.
+    """
+    return int((end_time - start_time).total_seconds()) if end_time else 0
+
+
+@receiver(pre_save, sender=Charge)
+def remember_stored_charge(sender, instance, raw, **kwargs):  # pylint: disable=unused-argument
+    # A saved charge may move out of its previous rollup buckets, which then
+    # need refreshing too, and its previous time is taken off its project.
+    instance._stored_charge_key = (  # pylint: disable=protected-access
+        (instance.get_original_value('project_id'),
+         instance.get_original_value('start_time'),
+         instance.get_original_value('end_time'))
+        if instance.pk and not raw else None
+    )
+
+
+@receiver(post_save, sender=Charge)
+def update_charge_data_on_save(sender, instance, raw, **kwargs):  # pylint: disable=unused-argument
+    if raw:
+        return
+
+    # The owner of a charge does not change once it is made.
+    charge_keys = [(instance.owner_id, instance.project_id,
+                    instance.start_time, instance.end_time, 1)]
+    stored_key = getattr(instance, '_stored_charge_key', None)
+    if stored_key and None not in stored_key[:2]:
+        charge_keys.append((instance.owner_id, *stored_key, -1))
+
+    refresh_charge_data(*charge_keys)
+
+
+@receiver(post_delete, sender=Charge)
+def update_charge_data_on_delete(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    refresh_charge_data((instance.owner_id, instance.project_id,
+                         instance.start_time, instance.end_time, -1))
+
+
+@receiver(charges_bulk_created, sender=Charge)
+@receiver(charges_bulk_ended, sender=Charge)
+def update_rollups_on_bulk_create(sender, charges, **kwargs):  # pylint: disable=unused-argument
+    # Split each charge into the hours that it overlaps, as rollups are.
+    ended = charges[charges['end_time'].notna() &
+                    charges['owner_id'].notna()].reset_index(drop=True)
+    first_buckets = ended['start_time'].dt.floor('H')
+    last_moments = (ended['end_time'] - pd.Timedelta(microseconds=1)).where(
+        ended['end_time'] > ended['start_time'], ended['start_time'])
+    hour_counts = ((last_moments.dt.floor('H') - first_buckets) // pd.Timedelta(hours=1)) + 1
+
+    pieces = ended.loc[ended.index.repeat(hour_counts)]
+    pieces = pieces.assign(bucket=(
+        first_buckets.loc[pieces.index] +
+        pieces.groupby(level=0).cumcount() * pd.Timedelta(hours=1)
+    ))
+    pieces = pieces.assign(seconds=(
+        pieces['end_time'].where(pieces['end_time'] < pieces['bucket'] + pd.Timedelta(hours=1),
+                                 pieces['bucket'] + pd.Timedelta(hours=1)) -
+        pieces['start_time'].where(pieces['start_time'] > pieces['bucket'], pieces['bucket'])
+    ).dt.total_seconds())
+
+    rollups = (pieces
+               .groupby(['owner_id', 'project_id', 'bucket'])
+               .agg(total_seconds=('seconds', 'sum'),
+                    charge_count=('seconds', 'size')))
+
+    ChargeRollup.objects.add(
+        (int(owner_id), int(project_id), bucket.to_pydatetime(),
+         int(total_seconds), int(charge_count))
+        for (owner_id, project_id, bucket), total_seconds, charge_count
+        in zip(rollups.index, rollups['total_seconds'], rollups['charge_count'])
+    )
+
+
+@receiver(charges_bulk_created, sender=Charge)
+@receiver(charges_bulk_ended, sender=Charge)
+def update_charge_totals_on_bulk_create(sender, charges, **kwargs):  # pylint: disable=unused-argument
+    ended = charges[charges['end_time'].notna() & charges['owner_id'].notna()]
+    totals = (ended
+              .assign(seconds=(ended['end_time'] - ended['start_time'])
+                      .dt.total_seconds().astype('int64'))
+              .groupby(['owner_id', 'project_id'])
+              .agg(seconds=('seconds', 'sum'), end_time=('end_time', 'max')))
+
+    ChargeTotal.objects.add(
+        (int(owner_id), int(project_id), int(seconds), end_time.to_pydatetime())
+        for (owner_id, project_id), seconds, end_time
+        in zip(totals.index, totals['seconds'], totals['end_time'])
+    )
+
+
+@receiver(post_save, sender=Charge)
+@receiver(post_delete, sender=Charge)
+@receiver(charges_bulk_created, sender=Charge)
+@receiver(charges_bulk_ended, sender=Charge)
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def invalidate_cached_charts(sender, **kwargs):  # pylint: disable=unused-argument
+    # Only once committed, so that a concurrent request cannot cache a chart
+    # of the data as it was before this write.
+    transaction.on_commit(report_helpers.invalidate_monthly_summary_charts)
@@ -2,12 +2,14 @@
 """
 
 from django.contrib import admin
+from django.http import JsonResponse
 from django.template.response import TemplateResponse
 from django.urls import path, reverse_lazy
 from django.utils import timezone
 
 from ProjectTime.project.models import Project
 from ProjectTime.project.utils import reporting as report_helpers
+from ProjectTime.timezone.utils import get_request_timezone
 from ProjectTime.timezone.views import TimezoneView
 
 
@@ -25,7 +27,7 @@ class ProjectTimeAdminSite(admin.AdminSite):
             raise ValueError('Timezone context key would conflict with an '
                              'existing key in the Django admin context.')
 
-        context['timezone'] = request.session.get('timezone') or 'N/A'
+        context['timezone'] = get_request_timezone(request) or 'N/A'
 
         return context
 
@@ -40,32 +42,40 @@ class ProjectTimeAdminSite(admin.AdminSite):
                  name='select-timezone'),
             path('dashboard',
                  self.admin_view(self.dashboard_view),
-                 name='dashboard')
+                 name='dashboard'),
+            path('dashboard/chart-cache',
+                 self.admin_view(self.chart_cache_view),
+                 name='dashboard-chart-cache')
         ]
 
         return extra_urls + urls
 
     def dashboard_view(self, request):
-        project_ids = request.GET.getlist('project')
+        # No project parameter selects every project.
+        project_ids = request.GET.getlist('project') or None
+
+        # Users other than superusers only see their own projects and charges.
+        projects = Project.objects.all()
+        owner = None
+        if not request.user.is_superuser:
+            projects = projects.for_user(request.user)
+            owner = request.user
 
         projects = ([
             {
                 **project,
                 'selected': not project_ids or str(project['id']) in project_ids
             }
-            for project in Project.objects.values('id', 'name').order_by('name')
+            for project in projects.values('id', 'name').order_by('name')
         ])
 
-        series = report_helpers.get_monthly_summary_series(
+        script, div = report_helpers.get_cached_monthly_summary_chart_components(
             timezone.localtime(),
-            project_ids
-        )
-        script, div = report_helpers.get_monthly_summary_chart_components(
-            series,
+            project_ids,
+            owner,
             sizing_mode="stretch_width",
             width_policy="max",
             max_width=1400
-
         )
 
         context = {
@@ -81,5 +91,10 @@ class ProjectTimeAdminSite(admin.AdminSite):
             context=context
         )
 
+    def chart_cache_view(self, request):  # pylint: disable=no-self-use,unused-argument
+        """ Reports the hit rate of the dashboard chart cache.
+        """
+        return JsonResponse(report_helpers.get_monthly_summary_chart_cache_stats())
+
 
 admin_site = ProjectTimeAdminSite()
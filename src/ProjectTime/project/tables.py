@@ -14,6 +14,7 @@ class ProjectTable(tables.Table):
             args=(record.pk,))
     )
 
+    # Of the charges of the user (see ProjectQuerySet.annotate_latest_charge).
     db_latest_charge = tables.DateTimeColumn(verbose_name='Latest Charge')
 
     class Meta:
@@ -30,7 +31,8 @@ class ChargeTable(tables.Table):
             args=(record.pk,))
     )
 
-    db_time_charged = tables.Column(verbose_name='Time Spent')
+    # Sorted by the stored duration, which is indexed.
+    db_time_charged = tables.Column(verbose_name='Time Spent', order_by=('duration_seconds',))
 
     class Meta:
         model = Charge
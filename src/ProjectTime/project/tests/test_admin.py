@@ -3,27 +3,49 @@
 import types
 from datetime import timedelta
 
+from django.contrib.auth.models import Permission, User
+from django.db import connection
 from django.http import HttpRequest
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from django.utils import timezone
 
 from ProjectTime.project.admin import ChargeAdmin, ProjectAdmin
 from ProjectTime.project.models import Charge, Project
 from ProjectTime.project.site import admin_site
+from ProjectTime.project.tests.utils.general import get_start_of_today
+from ProjectTime.project.tests.utils.testcase import AdminUserTestCase
+
+
+def get_request(user):
+    request = HttpRequest()
+    request.user = user
+    return request
 
 
 class ProjectModelAdminTestCase(TestCase):
     def setUp(self):
         self.model_admin = ProjectAdmin(model=Project, admin_site=admin_site)
 
-    def test_project_admin_queryset_is_annotated_with_latest_charge(self):
+    def test_project_admin_search_ranks_best_matches_first(self):
+        for name in ('Acme Corp', 'Acme', 'Unrelated'):
+            Project(name=name).validate_and_save()
+
+        queryset, may_have_duplicates = self.model_admin.get_search_results(
+            get_request(User(is_superuser=True)), Project.objects.all(), 'acme')
+
+        self.assertFalse(may_have_duplicates)
+        self.assertEqual([project.name for project in queryset], ['Acme', 'Acme Corp'])
+
+    def test_project_admin_queryset_does_not_read_charges(self):
         Project(name='Test').validate_and_save()
         Project(name='Test 2').validate_and_save()
 
-        queryset = self.model_admin.get_queryset(HttpRequest())
+        queryset = self.model_admin.get_queryset(get_request(User(is_superuser=True)))
 
-        for project in queryset:
-            self.assertTrue(hasattr(project, 'db_latest_charge'))
+        self.assertNotIn('"project_charge"', str(queryset.query))
+        self.assertEqual(len(queryset), 2)
 
     def test_project_admin_list_display_contains_latest_charge(self):
         self.assertTrue('last_time_increment' in self.model_admin.list_display)
@@ -81,7 +103,7 @@ class ChargeModelAdminTestCase(TestCase):
         Charge(project=self.project,
                start_time=timezone.now()).validate_and_save()
 
-        queryset = self.model_admin.get_queryset(HttpRequest())
+        queryset = self.model_admin.get_queryset(get_request(User(is_superuser=True)))
 
         for charge in queryset:
             self.assertTrue(hasattr(charge, 'db_time_charged'))
@@ -96,7 +118,7 @@ class ChargeModelAdminTestCase(TestCase):
         self.assertTrue(hasattr(self.model_admin.time_spent,
                                 'admin_order_field'))
         self.assertEqual(
-            self.model_admin.time_spent.admin_order_field, 'db_time_charged'
+            self.model_admin.time_spent.admin_order_field, 'duration_seconds'
         )
 
     def test_charge_admin_has_all_fields_editable_when_creating_new_charge(self):
@@ -160,3 +182,228 @@ class ChargeModelAdminTestCase(TestCase):
 
         self.assertSequenceEqual(readonly_fields,
                                  ('start_time', 'end_time', 'closed',))
+
+
+class ChargeModelAdminQueryCountTestCase(AdminUserTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        start_of_today = get_start_of_today()
+
+        projects = [Project(name=f'Test {index}').validate_and_save()
+                    for index in range(10)]
+        Charge.objects.bulk_create([
+            Charge(project=projects[index % len(projects)],
+                   start_time=start_of_today + timedelta(minutes=index),
+                   end_time=start_of_today + timedelta(minutes=index + 1))
+            for index in range(100)
+        ])
+
+    def test_charge_admin_changelist_query_count_does_not_depend_on_page_size(self):
+        self.performLogin()
+
+        # Includes the row estimate of the charge table and the timezone
+        # profile of the user, which are then cached. The project filter
+        # does not list the projects.
+        with self.assertNumQueries(9):
+            response = self.client.get(reverse('admin:project_charge_changelist'),
+                                       {'all': ''})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['cl'].result_list), 100)
+
+    def test_charge_admin_change_form_query_count_is_bounded(self):
+        self.performLogin()
+        charge = Charge.objects.earliest()
+
+        # Only the project of the charge is read for its picker. Includes the
+        # timezone profile of the user, which is then cached.
+        with self.assertNumQueries(7):
+            response = self.client.get(reverse('admin:project_charge_change',
+                                               args=(charge.pk,)))
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_charge_admin_change_form_does_not_list_projects(self):
+        self.performLogin()
+        charge = Charge.objects.earliest()
+
+        response = self.client.get(reverse('admin:project_charge_change', args=(charge.pk,)))
+
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertContains(response, '<option value=', count=1)
+
+    def test_charge_admin_changelist_filters_by_project_name(self):
+        self.performLogin()
+
+        response = self.client.get(reverse('admin:project_charge_changelist'),
+                                   {'project__name__icontains': 'test 1', 'closed__exact': '0'})
+
+        self.assertEqual(response.status_code, 200)
+        # Test 1 has 10 of the charges.
+        self.assertEqual(response.context['cl'].result_count, 10)
+        self.assertContains(response, 'name="closed__exact" value="0"')
+        self.assertContains(response, 'name="project__name__icontains" value="test 1"')
+
+
+class ChargeModelAdminCountTestCase(AdminUserTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        start_of_today = get_start_of_today()
+
+        projects = [Project(name=f'Test {index}').validate_and_save()
+                    for index in range(2)]
+        Charge.objects.bulk_create([
+            Charge(project=projects[index % len(projects)],
+                   start_time=start_of_today + timedelta(minutes=index),
+                   end_time=start_of_today + timedelta(minutes=index + 1))
+            for index in range(100)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE project_charge')
+
+    def get_changelist(self, params=None):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('admin:project_charge_changelist'),
+                                       params or {})
+
+        counts = [query['sql'] for query in context.captured_queries
+                  if query['sql'].startswith('SELECT COUNT(')]
+        return response.context['cl'], counts
+
+    def test_charge_admin_changelist_counts_exactly_below_threshold(self):
+        self.performLogin()
+
+        changelist, counts = self.get_changelist()
+
+        self.assertEqual(changelist.result_count, 100)
+        self.assertEqual(changelist.full_result_count, 100)
+        self.assertTrue(changelist.show_full_result_count)
+        # The page's rows, and then all rows for the "Show all" link.
+        self.assertEqual(len(counts), 2)
+
+    @override_settings(PROJECTTIME_APPROXIMATE_COUNT_THRESHOLD=10)
+    def test_charge_admin_changelist_estimates_unfiltered_count_above_threshold(self):
+        self.performLogin()
+
+        changelist, counts = self.get_changelist()
+
+        self.assertEqual(changelist.result_count, 100)
+        self.assertIsNone(changelist.full_result_count)
+        self.assertFalse(changelist.show_full_result_count)
+        self.assertEqual(counts, [])
+
+    @override_settings(PROJECTTIME_APPROXIMATE_COUNT_THRESHOLD=10)
+    def test_charge_admin_changelist_caches_filtered_count_above_threshold(self):
+        self.performLogin()
+        project = Project.objects.get(name='Test 0')
+
+        changelist, counts = self.get_changelist({'project__id__exact': project.pk})
+        self.assertEqual(changelist.result_count, 50)
+        self.assertEqual(len(counts), 1)
+
+        changelist, counts = self.get_changelist({'project__id__exact': project.pk})
+        self.assertEqual(changelist.result_count, 50)
+        self.assertEqual(counts, [])
+
+
+class UserScopedModelAdminTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user', is_staff=True)
+        cls.other_user = User.objects.create_user('other', is_staff=True)
+        cls.project = Project(name='Test').validate_and_save()
+        cls.other_project = Project(name='Other').validate_and_save()
+        cls.project.members.add(cls.user)
+        cls.other_project.members.add(cls.other_user)
+
+        start_of_today = get_start_of_today()
+        for owner, project in ((cls.user, cls.project),
+                               (cls.other_user, cls.other_project)):
+            Charge(project=project, owner=owner,
+                   start_time=start_of_today).validate_and_save()
+
+    def test_charge_admin_queryset_is_scoped_to_user(self):
+        model_admin = ChargeAdmin(model=Charge, admin_site=admin_site)
+
+        queryset = model_admin.get_queryset(get_request(self.user))
+
+        self.assertEqual([charge.owner for charge in queryset], [self.user])
+
+    def test_charge_admin_can_close_selected_charges(self):
+        self.user.user_permissions.add(*Permission.objects.filter(
+            codename__in=('view_charge', 'change_charge')))
+        self.client.force_login(self.user)
+        ended_charge = Charge(project=self.project, owner=self.user,
+                              start_time=get_start_of_today() - timedelta(hours=2),
+                              end_time=get_start_of_today() - timedelta(hours=1)
+                              ).validate_and_save()
+
+        response = self.client.post(reverse('admin:project_charge_changelist'), {
+            'action': 'close_charges',
+            '_selected_action': list(Charge.objects.values_list('pk', flat=True)),
+        }, follow=True)
+
+        ended_charge.refresh_from_db()
+        self.assertTrue(ended_charge.closed)
+        self.assertEqual(Charge.objects.filter(closed=True).count(), 1)
+        self.assertEqual([str(message) for message in response.context['messages']], [
+            'Closed 1 time increment(s).',
+            'Skipped 1 time increment(s) that were already closed, have no end '
+            'time or are on an inactive project.',
+        ])
+
+    def test_charge_admin_queryset_is_not_scoped_for_superuser(self):
+        model_admin = ChargeAdmin(model=Charge, admin_site=admin_site)
+
+        queryset = model_admin.get_queryset(get_request(User(is_superuser=True)))
+
+        self.assertEqual(queryset.count(), 2)
+
+    def test_charge_admin_project_choices_are_scoped_to_user(self):
+        model_admin = ChargeAdmin(model=Charge, admin_site=admin_site)
+
+        field = model_admin.formfield_for_foreignkey(Charge._meta.get_field('project'),
+                                                     get_request(self.user))
+
+        self.assertEqual(list(field.queryset), [self.project])
+
+    def test_charge_admin_project_autocomplete_offers_active_projects_of_user(self):
+        self.user.user_permissions.add(Permission.objects.get(codename='view_project'))
+        self.client.force_login(self.user)
+        Project(name='Test Inactive', active=False).validate_and_save().members.add(self.user)
+
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'term': 'test',
+            'app_label': 'project',
+            'model_name': 'charge',
+            'field_name': 'project',
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['text'] for result in response.json()['results']],
+                         ['Test'])
+
+    def test_project_admin_queryset_is_scoped_to_user(self):
+        model_admin = ProjectAdmin(model=Project, admin_site=admin_site)
+
+        queryset = model_admin.get_queryset(get_request(self.user))
+
+        self.assertEqual(list(queryset), [self.project])
+
+    def test_project_admin_shows_latest_charge_of_user(self):
+        model_admin = ProjectAdmin(model=Project, admin_site=admin_site)
+        self.project.members.add(self.other_user)
+        start_of_today = get_start_of_today()
+        Charge(project=self.project, owner=self.other_user,
+               start_time=start_of_today - timedelta(hours=2),
+               end_time=start_of_today - timedelta(hours=1)).validate_and_save()
+
+        project = model_admin.get_queryset(get_request(self.user)).get()
+        self.assertIsNone(model_admin.last_time_increment(project))
+
+        project = (model_admin.get_queryset(get_request(User(is_superuser=True)))
+                   .get(pk=self.project.pk))
+        self.assertEqual(model_admin.last_time_increment(project),
+                         timezone.localtime(start_of_today - timedelta(hours=1)).date())
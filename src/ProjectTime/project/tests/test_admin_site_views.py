@@ -1,13 +1,16 @@
 # pylint: disable=missing-function-docstring
 
+from datetime import timedelta
 from unittest.mock import MagicMock, patch
 
 import pandas as pd
 from django.contrib import admin
+from django.contrib.auth.models import User
 from django.shortcuts import reverse
 
 from ProjectTime.project.models import Project
 from ProjectTime.project.utils import reporting as report_helpers
+from ProjectTime.project.tests.utils.charge import ChargeFactory
 from ProjectTime.project.tests.utils.testcase import AdminUserTestCase
 
 
@@ -125,3 +128,63 @@ class ProjectTimeAdminSiteDashboardTemplateViewTestCase(AdminUserTestCase):
         self.assertEqual(response.context['chart_script'], 'script')
         self.assertIn('chart_div', response.context)
         self.assertEqual(response.context['chart_div'], '<div></div>')
+
+    def get_charted_hours(self, url):
+        with patch.object(
+            report_helpers,
+            'get_monthly_summary_chart_components',
+            wraps=report_helpers.get_monthly_summary_chart_components
+        ) as chart_components:
+            response = self.client.get(url)
+
+        series = chart_components.call_args[0][0]
+        return response, dict(zip(series['charge'], series['value']))
+
+    def test_dashboard_view_charts_all_projects_unless_otherwise_specified(self):
+        project_a = Project(name='Project A').validate_and_save()
+        project_b = Project(name='Project B').validate_and_save()
+        other_user = User.objects.create_user('other')
+        project_a.members.add(self.user)
+        project_b.members.add(other_user)
+        ChargeFactory.today(project_a, timedelta(hours=1), self.user).validate_and_save()
+        ChargeFactory.today(project_b, timedelta(hours=2), other_user).validate_and_save()
+
+        self.performLogin()
+        _, hours = self.get_charted_hours(reverse('admin:dashboard'))
+
+        self.assertEqual(hours, {'Project A': 1, 'Project B': 2})
+
+    def test_dashboard_view_only_shows_projects_and_charges_of_staff_user(self):
+        staff_user = User.objects.create_user('staff', password='staff', is_staff=True)
+        other_user = User.objects.create_user('other')
+        project_a = Project(name='Project A').validate_and_save()
+        project_b = Project(name='Project B').validate_and_save()
+        project_a.members.add(staff_user, other_user)
+        project_b.members.add(other_user)
+        ChargeFactory.today(project_a, timedelta(hours=1), staff_user).validate_and_save()
+        ChargeFactory.today(project_a, timedelta(hours=2), other_user).validate_and_save()
+        ChargeFactory.today(project_b, timedelta(hours=3), other_user).validate_and_save()
+
+        self.client.force_login(staff_user)
+        response, hours = self.get_charted_hours(reverse('admin:dashboard'))
+
+        self.assertEqual(response.context['projects'], [
+            {'id': project_a.pk, 'name': project_a.name, 'selected': True}
+        ])
+        self.assertEqual(hours, {'Project A': 1})
+
+
+class ProjectTimeAdminSiteChartCacheViewTestCase(AdminUserTestCase):
+    def test_chart_cache_view_redirects_when_user_is_not_admin(self):
+        response = self.client.get(reverse('admin:dashboard-chart-cache'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_chart_cache_view_reports_hit_rate(self):
+        self.performLogin()
+        self.client.get(reverse('admin:dashboard'))
+        self.client.get(reverse('admin:dashboard'))
+
+        response = self.client.get(reverse('admin:dashboard-chart-cache'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
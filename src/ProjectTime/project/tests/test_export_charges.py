@@ -0,0 +1,104 @@
+# pylint: disable=missing-function-docstring
+
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from ProjectTime.project.models import Charge, Project
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+
+class ExportChargesCommandTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.project = Project(name='Test').validate_and_save()
+        cls.other_project = Project(name='Other').validate_and_save()
+        cls.start_datetime = timezone.make_aware(
+            datetime(2019, 1, 1, hour=8, minute=0, second=0))
+
+        for hour in range(3):
+            Charge(
+                project=cls.project,
+                start_time=cls.start_datetime + timedelta(hours=hour),
+                end_time=cls.start_datetime + timedelta(hours=hour, minutes=30),
+                closed=hour == 0
+            ).validate_and_save()
+
+        Charge(
+            project=cls.other_project,
+            start_time=cls.start_datetime
+        ).validate_and_save()
+
+    def get_path(self, suffix):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_export_charges_writes_csv_in_chunks(self):
+        stdout = StringIO()
+        call_command('export_charges', '-', chunk_size=2, stdout=stdout, stderr=StringIO())
+
+        lines = stdout.getvalue().splitlines()
+        self.assertEqual(lines[0], 'id,project,start_time,end_time,closed')
+        self.assertEqual(len(lines), 5)
+        self.assertTrue(lines[-1].endswith(',Test,{},{},false'.format(
+            timezone.localtime(self.start_datetime + timedelta(hours=2)).isoformat(),
+            timezone.localtime(self.start_datetime + timedelta(hours=2, minutes=30)).isoformat()
+        )))
+
+    def test_export_charges_honours_charge_filters(self):
+        path = self.get_path('.csv')
+        stderr = StringIO()
+        call_command('export_charges', path, filters=f'project={self.project.pk}&closed=false',
+                     stdout=StringIO(), stderr=stderr)
+
+        self.assertIn('Exported 2 charge(s).', stderr.getvalue())
+        with open(path, encoding='utf-8') as file:
+            self.assertEqual(len(file.read().splitlines()), 3)
+
+    def test_export_charges_rejects_invalid_filters(self):
+        with self.assertRaises(CommandError):
+            call_command('export_charges', '-', filters='project=invalid',
+                         stdout=StringIO(), stderr=StringIO())
+
+    def test_exported_csv_can_be_imported(self):
+        path = self.get_path('.csv')
+        call_command('export_charges', path, stdout=StringIO(), stderr=StringIO())
+        expected_charges = list(Charge.objects.order_by('start_time', 'pk').values_list(
+            'project', 'start_time', 'end_time', 'closed'))
+        Charge.objects.all().delete()
+        owner = User.objects.create_user('owner')
+        for project in (self.project, self.other_project):
+            project.members.add(owner)
+
+        call_command('import_charges', path, owner='owner',
+                     stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(
+            list(Charge.objects.order_by('start_time', 'pk').values_list(
+                'project', 'start_time', 'end_time', 'closed')),
+            expected_charges
+        )
+
+    @unittest.skipIf(pq is None, 'pyarrow is not installed')
+    def test_export_charges_writes_parquet_row_group_per_chunk(self):
+        path = self.get_path('.parquet')
+        call_command('export_charges', path, chunk_size=3, stdout=StringIO(), stderr=StringIO())
+
+        parquet_file = pq.ParquetFile(path)
+        self.assertEqual(parquet_file.metadata.num_rows, 4)
+        self.assertEqual(parquet_file.num_row_groups, 2)
+        self.assertEqual(parquet_file.schema_arrow.names,
+                         ['id', 'project', 'start_time', 'end_time', 'closed'])
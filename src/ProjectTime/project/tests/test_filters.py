@@ -0,0 +1,129 @@
+# pylint: disable=missing-function-docstring
+
+from datetime import date, datetime, timedelta
+
+import pytz
+from django.http import QueryDict
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from ProjectTime.project.filters import (ChargeFilter, get_period_dates,
+                                         get_start_of_date)
+from ProjectTime.project.models import Charge, Project
+
+
+class DateHelpersTestCase(SimpleTestCase):
+    def test_get_start_of_date_is_in_current_timezone(self):
+        with timezone.override(pytz.timezone('America/New_York')):
+            start = get_start_of_date(date(2021, 1, 15))
+
+        self.assertEqual(start, pytz.utc.localize(datetime(2021, 1, 15, hour=5)))
+
+    def test_get_start_of_date_when_midnight_is_skipped(self):
+        # Sao Paulo skipped from midnight to 01:00 on the 4th of November 2018.
+        with timezone.override(pytz.timezone('America/Sao_Paulo')):
+            start = get_start_of_date(date(2018, 11, 4))
+
+        self.assertEqual(start, pytz.utc.localize(datetime(2018, 11, 4, hour=3)))
+
+    def test_get_period_dates(self):
+        # A Wednesday.
+        today = date(2021, 1, 6)
+
+        self.assertEqual(get_period_dates('today', today), (today, date(2021, 1, 7)))
+        self.assertEqual(get_period_dates('yesterday', today), (date(2021, 1, 5), today))
+        self.assertEqual(get_period_dates('this_week', today),
+                         (date(2021, 1, 4), date(2021, 1, 11)))
+        self.assertEqual(get_period_dates('last_week', today),
+                         (date(2020, 12, 28), date(2021, 1, 4)))
+        self.assertEqual(get_period_dates('this_month', today),
+                         (date(2021, 1, 1), date(2021, 2, 1)))
+        self.assertEqual(get_period_dates('last_month', today),
+                         (date(2020, 12, 1), date(2021, 1, 1)))
+        self.assertEqual(get_period_dates('this_year', today),
+                         (date(2021, 1, 1), date(2022, 1, 1)))
+        self.assertEqual(get_period_dates('last_year', today),
+                         (date(2020, 1, 1), date(2021, 1, 1)))
+
+    def test_get_period_dates_at_end_of_year(self):
+        self.assertEqual(get_period_dates('this_month', date(2020, 12, 31)),
+                         (date(2020, 12, 1), date(2021, 1, 1)))
+
+    def test_get_period_dates_rejects_unknown_period(self):
+        with self.assertRaises(ValueError):
+            get_period_dates('fortnight', date(2021, 1, 6))
+
+
+class ChargeFilterTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.project = Project(name='Test').validate_and_save()
+        cls.tz = pytz.timezone('America/New_York')
+
+        # Just before, at and just before the end of the 15th of January in
+        # New York, and at the start of the 16th.
+        cls.charges = [
+            Charge(project=cls.project,
+                   start_time=cls.tz.localize(start_time),
+                   end_time=cls.tz.localize(start_time) + timedelta(minutes=1)
+                   ).validate_and_save()
+            for start_time in (datetime(2021, 1, 14, 23, 59),
+                               datetime(2021, 1, 15, 0, 0),
+                               datetime(2021, 1, 15, 23, 58),
+                               datetime(2021, 1, 16, 0, 0))
+        ]
+
+    def filter(self, query):
+        filterset = ChargeFilter(QueryDict(query),
+                                 queryset=Charge.objects.order_by('start_time'))
+        self.assertTrue(filterset.is_valid(), filterset.errors)
+        return filterset.qs
+
+    def test_charge_filter_date_uses_range_predicate(self):
+        with timezone.override(self.tz):
+            sql = str(self.filter('start_time__date=2021-01-15&end_time__date=2021-01-15').query)
+
+        self.assertNotIn('::date', sql)
+        self.assertNotIn('AT TIME ZONE', sql)
+        self.assertIn('"project_charge"."start_time" >= 2021-01-15 00:00:00-05:00', sql)
+        self.assertIn('"project_charge"."start_time" < 2021-01-16 00:00:00-05:00', sql)
+        self.assertIn('"project_charge"."end_time" >= 2021-01-15 00:00:00-05:00', sql)
+        self.assertIn('"project_charge"."end_time" < 2021-01-16 00:00:00-05:00', sql)
+
+    def test_charge_filter_date_is_in_current_timezone(self):
+        with timezone.override(self.tz):
+            charges = list(self.filter('start_time__date=2021-01-15'))
+
+        self.assertEqual(charges, self.charges[1:3])
+
+    def test_charge_filter_date_range(self):
+        with timezone.override(self.tz):
+            self.assertEqual(
+                list(self.filter('start_time__range_after=2021-01-15'
+                                 '&start_time__range_before=2021-01-16')),
+                self.charges[1:])
+            self.assertEqual(
+                list(self.filter('start_time__range_before=2021-01-14')),
+                self.charges[:1])
+
+    def test_charge_filter_period_uses_range_predicate(self):
+        today = timezone.localdate()
+        start_of_week = today - timedelta(days=today.weekday())
+        this_week_charge = Charge(
+            project=self.project,
+            start_time=get_start_of_date(start_of_week)
+        ).validate_and_save()
+
+        charges = self.filter('start_time__period=this_week')
+
+        self.assertEqual(list(charges), [this_week_charge])
+        sql = str(charges.query)
+        self.assertIn('"project_charge"."start_time" >= ', sql)
+        self.assertIn('"project_charge"."start_time" < ', sql)
+
+    def test_charge_filter_rejects_unknown_period(self):
+        filterset = ChargeFilter(QueryDict('start_time__period=fortnight'),
+                                 queryset=Charge.objects.all())
+
+        self.assertFalse(filterset.is_valid())
+        self.assertIn('start_time__period', filterset.errors)
@@ -1,8 +1,11 @@
 # pylint: disable=missing-function-docstring
 
-from datetime import timedelta
+from datetime import datetime, timedelta
+from unittest.mock import patch
 
 import pandas as pd
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
 from django.utils import timezone
 
@@ -14,6 +17,10 @@ from .utils.general import get_start_of_today
 
 
 class ReportingHelpersTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner')
+
     def test_visualization_creation_whitebox(self):
         project_a = Project(name='Project A').validate_and_save()
         project_b = Project(name='Project B').validate_and_save()
@@ -33,12 +40,14 @@ class ReportingHelpersTestCase(TestCase):
         for charge in project_a_current_charges:
             ChargeFactory.today(
                 project=project_a,
+                owner=self.owner,
                 charge_time=charge
             ).validate_and_save()
 
         for charge in project_b_current_charges:
             ChargeFactory.today(
                 project=project_b,
+                owner=self.owner,
                 charge_time=charge
             ).validate_and_save()
 
@@ -57,11 +66,13 @@ class ReportingHelpersTestCase(TestCase):
 
         ChargeFactory.past_month(
             project=project_a,
+            owner=self.owner,
             charge_time=timedelta(hours=1)
         ).validate_and_save()
 
         ChargeFactory.past_month(
             project=project_b,
+            owner=self.owner,
             charge_time=timedelta(hours=1)
         ).validate_and_save()
 
@@ -69,11 +80,13 @@ class ReportingHelpersTestCase(TestCase):
 
         ChargeFactory.future_month(
             project=project_a,
+            owner=self.owner,
             charge_time=timedelta(hours=1)
         ).validate_and_save()
 
         ChargeFactory.future_month(
             project=project_b,
+            owner=self.owner,
             charge_time=timedelta(hours=1)
         ).validate_and_save()
 
@@ -132,3 +145,139 @@ class ReportingHelpersTestCase(TestCase):
             dataframe)
         self.assertGreater(len(div), 0)
         self.assertGreater(len(chart), 0)
+
+    def test_monthly_summary_splits_charges_across_months(self):
+        project = Project(name='Project A').validate_and_save()
+        Charge(
+            project=project,
+            owner=self.owner,
+            start_time=timezone.make_aware(datetime(2019, 1, 31, hour=22)),
+            end_time=timezone.make_aware(datetime(2019, 2, 1, hour=2, minute=30))
+        ).validate_and_save()
+
+        january = report_helpers.get_monthly_summary_series(
+            timezone.make_aware(datetime(2019, 1, 15)))
+        february = report_helpers.get_monthly_summary_series(
+            timezone.make_aware(datetime(2019, 2, 15)))
+
+        self.assertEqual(january.iloc[0].value, 2.0)
+        self.assertEqual(february.iloc[0].value, 2.5)
+
+    def test_monthly_summary_counts_only_charges_of_owner(self):
+        project = Project(name='Project A').validate_and_save()
+        other_owner = User.objects.create_user('other')
+        for owner, hours in ((self.owner, 2), (other_owner, 3)):
+            ChargeFactory.today(
+                project=project,
+                owner=owner,
+                charge_time=timedelta(hours=hours)
+            ).validate_and_save()
+
+        own = report_helpers.get_monthly_summary_series(timezone.localtime(),
+                                                        owner=self.owner)
+        everyone = report_helpers.get_monthly_summary_series(timezone.localtime())
+
+        self.assertEqual(list(own.value), [2.0])
+        self.assertEqual(list(everyone.value), [5.0])
+
+    def test_monthly_summary_splits_charges_across_months_in_partial_hour_timezones(self):
+        project = Project(name='Project A').validate_and_save()
+
+        for name in ('Asia/Kolkata', 'Australia/Adelaide'):
+            with self.subTest(timezone=name), timezone.override(name):
+                Charge.objects.all().delete()
+                # Within a single rollup bucket, which the month starts in the
+                # middle of.
+                Charge(
+                    project=project,
+                    owner=self.owner,
+                    start_time=timezone.make_aware(datetime(2019, 1, 31, hour=23, minute=45)),
+                    end_time=timezone.make_aware(datetime(2019, 2, 1, minute=15))
+                ).validate_and_save()
+                Charge(
+                    project=project,
+                    owner=self.owner,
+                    start_time=timezone.make_aware(datetime(2019, 2, 10, hour=8)),
+                    end_time=timezone.make_aware(datetime(2019, 2, 10, hour=9))
+                ).validate_and_save()
+
+                january = report_helpers.get_monthly_summary_series(
+                    timezone.make_aware(datetime(2019, 1, 15)))
+                february = report_helpers.get_monthly_summary_series(
+                    timezone.make_aware(datetime(2019, 2, 15)))
+
+                self.assertEqual(list(january.value), [0.25])
+                self.assertEqual(list(february.value), [1.25])
+
+
+class CachedReportingHelpersTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.project = Project(name='Project A').validate_and_save()
+
+    def get_chart(self, **kwargs):
+        return report_helpers.get_cached_monthly_summary_chart_components(
+            timezone.localtime(), **kwargs)
+
+    def test_chart_is_rendered_once_until_charges_change(self):
+        with patch.object(report_helpers, 'get_monthly_summary_chart_components',
+                          return_value=('script', '<div></div>')) as render:
+            self.assertEqual(self.get_chart(), ('script', '<div></div>'))
+            self.assertEqual(self.get_chart(), ('script', '<div></div>'))
+            self.assertEqual(render.call_count, 1)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                ChargeFactory.today(
+                    project=self.project,
+                    charge_time=timedelta(hours=1)
+                ).validate_and_save()
+
+            self.get_chart()
+            self.assertEqual(render.call_count, 2)
+
+    def test_chart_generation_is_kept_outside_of_cache(self):
+        # The cache may be per process, so another process does not see the
+        # generation advance in it; emptying the cache stands in for that.
+        key = report_helpers.get_monthly_summary_chart_cache_key(timezone.localtime())
+        report_helpers.invalidate_monthly_summary_charts()
+        cache.clear()
+
+        self.assertNotEqual(
+            report_helpers.get_monthly_summary_chart_cache_key(timezone.localtime()),
+            key
+        )
+
+    def test_chart_is_cached_per_project_selection_and_chart_options(self):
+        with patch.object(report_helpers, 'get_monthly_summary_chart_components',
+                          return_value=('script', '<div></div>')) as render:
+            self.get_chart()
+            self.get_chart(project_ids=[str(self.project.pk)])
+            self.get_chart(height=600)
+            self.get_chart(project_ids=[self.project.pk])
+
+            self.assertEqual(render.call_count, 3)
+
+    def test_chart_is_cached_per_owner(self):
+        owner = User.objects.create_user('owner')
+        other_owner = User.objects.create_user('other')
+        with patch.object(report_helpers, 'get_monthly_summary_chart_components',
+                          return_value=('script', '<div></div>')) as render:
+            self.get_chart(owner=owner)
+            self.get_chart(owner=other_owner)
+            self.get_chart(owner=owner)
+
+            self.assertEqual(render.call_count, 2)
+
+    def test_chart_cache_hit_rate_is_counted(self):
+        self.assertEqual(report_helpers.get_monthly_summary_chart_cache_stats(), {
+            'hits': 0, 'misses': 0, 'hit_rate': None
+        })
+
+        self.get_chart()
+        self.get_chart()
+        self.get_chart()
+
+        stats = report_helpers.get_monthly_summary_chart_cache_stats()
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 1)
+        self.assertAlmostEqual(stats['hit_rate'], 2 / 3)
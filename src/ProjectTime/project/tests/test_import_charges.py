@@ -0,0 +1,250 @@
+# pylint: disable=missing-function-docstring
+
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from ProjectTime.project.models import Charge, ChargeRollup, ChargeTotal, Project
+
+
+class ImportChargesCommandTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner')
+        cls.project = Project(name='Test').validate_and_save()
+        cls.inactive_project = Project(name='Inactive', active=False).validate_and_save()
+        for project in (cls.project, cls.inactive_project):
+            project.members.add(cls.owner)
+        cls.start_datetime = timezone.make_aware(
+            datetime(2019, 1, 1, hour=8, minute=0, second=0))
+
+    def write_file(self, suffix, content):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, 'w', encoding='utf-8') as file:
+            file.write(content)
+
+        self.addCleanup(os.remove, path)
+        return path
+
+    def import_charges(self, path, **options):
+        stdout, stderr = StringIO(), StringIO()
+        options.setdefault('owner', 'owner')
+        call_command('import_charges', path, stdout=stdout, stderr=stderr, **options)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_import_charges_loads_valid_rows_from_csv(self):
+        for method in ('copy', 'bulk'):
+            with self.subTest(method=method):
+                Charge.objects.all().delete()
+                path = self.write_file('.csv', (
+                    'project,start_time,end_time,closed\n'
+                    'Test,2019-01-01 08:00,2019-01-01 09:30,true\n'
+                    'Test,2019-01-01 10:00,,false\n'
+                ))
+
+                stdout, _ = self.import_charges(path, method=method)
+
+                self.assertIn('Imported 2 charge(s) and rejected 0 row(s)', stdout)
+                self.assertEqual(
+                    list(Charge.objects.order_by('start_time')
+                         .values_list('project', 'start_time', 'end_time', 'closed')),
+                    [(self.project.pk, self.start_datetime,
+                      self.start_datetime + timedelta(hours=1, minutes=30), True),
+                     (self.project.pk, self.start_datetime + timedelta(hours=2),
+                      None, False)]
+                )
+
+    def test_import_charges_reads_naive_times_in_current_timezone_among_offset_times(self):
+        path = self.write_file('.csv', (
+            'project,start_time,end_time,closed\n'
+            'Test,2019-01-01 08:00,2019-01-01 09:00+01:00,false\n'
+            'Test,2019-01-01T10:00Z,2019-01-01 16:00,false\n'
+        ))
+
+        with timezone.override('Asia/Kolkata'):
+            stdout, _ = self.import_charges(path)
+
+        self.assertIn('Imported 2 charge(s) and rejected 0 row(s)', stdout)
+        self.assertEqual(
+            list(Charge.objects.order_by('start_time').values_list('start_time', 'end_time')),
+            [(datetime(2019, 1, 1, 2, 30, tzinfo=timezone.utc),
+              datetime(2019, 1, 1, 8, tzinfo=timezone.utc)),
+             (datetime(2019, 1, 1, 10, tzinfo=timezone.utc),
+              datetime(2019, 1, 1, 10, 30, tzinfo=timezone.utc))]
+        )
+
+    def test_import_charges_reports_rejected_rows_without_aborting(self):
+        path = self.write_file('.csv', (
+            'project,start_time,end_time,closed\n'
+            'Missing,2019-01-01 08:00,2019-01-01 09:00,false\n'
+            'Inactive,2019-01-01 08:00,2019-01-01 09:00,false\n'
+            'Test,not a time,2019-01-01 09:00,false\n'
+            'Test,2019-01-01 08:00,2019-01-01 07:00,false\n'
+            'Test,2019-01-01 08:00,,true\n'
+            'Test,2019-01-01 08:00,2019-01-01 09:00,maybe\n'
+            'Test,2019-01-01 08:00,2019-01-01 09:00,false\n'
+        ))
+
+        stdout, stderr = self.import_charges(path)
+
+        self.assertIn('Imported 1 charge(s) and rejected 6 row(s)', stdout)
+        self.assertEqual(Charge.objects.count(), 1)
+        self.assertEqual(stderr.splitlines(), [
+            'line,code,message',
+            '2,unknown_project,The project does not exist.',
+            '3,project_must_be_active,The project must be active.',
+            '4,invalid_start_time,The start time is missing or not a valid date and time.',
+            '5,end_time_must_be_on_or_after_start_time,'
+            'The end time must not be before the start time.',
+            '6,cannot_close_without_end_time,'
+            'Cannot mark as closed without end time specified.',
+            '7,invalid_closed,The closed flag is not a valid boolean.',
+        ])
+
+    def test_import_charges_loads_json_lines_in_batches(self):
+        lines = [json.dumps({
+            'project': 'Test',
+            'start_time': (self.start_datetime + timedelta(minutes=i)).isoformat(),
+            'end_time': (self.start_datetime + timedelta(minutes=i + 1)).isoformat(),
+            'closed': False
+        }) for i in range(5)]
+        lines.insert(2, '{not json')
+        path = self.write_file('.jsonl', '\n'.join(lines) + '\n')
+
+        stdout, stderr = self.import_charges(path, batch_size=2)
+
+        self.assertIn('Imported 5 charge(s) and rejected 1 row(s)', stdout)
+        self.assertIn('3,invalid_record,The line is not a valid record.', stderr)
+        self.assertEqual(Charge.objects.count(), 5)
+
+    def test_import_charges_adds_to_rollups(self):
+        Charge(
+            project=self.project,
+            owner=self.owner,
+            start_time=self.start_datetime,
+            end_time=self.start_datetime + timedelta(minutes=15)
+        ).validate_and_save()
+
+        path = self.write_file('.csv', (
+            'project,start_time,end_time,closed\n'
+            'Test,2019-01-01 08:30,2019-01-01 09:00,false\n'
+            'Test,2019-01-01 09:00,2019-01-01 09:10,false\n'
+            'Test,2019-01-01 09:50,2019-01-01 11:05,false\n'
+        ))
+
+        self.import_charges(path)
+
+        self.assertEqual(
+            list(ChargeRollup.objects.order_by('bucket')
+                 .values_list('bucket', 'total_seconds', 'charge_count')),
+            [(self.start_datetime, 45 * 60, 2),
+             (self.start_datetime + timedelta(hours=1), 20 * 60, 2),
+             (self.start_datetime + timedelta(hours=2), 60 * 60, 1),
+             (self.start_datetime + timedelta(hours=3), 5 * 60, 1)]
+        )
+
+        expected_rollups = list(ChargeRollup.objects.order_by('bucket').values_list(
+            'bucket', 'total_seconds', 'charge_count'))
+        ChargeRollup.objects.rebuild()
+        self.assertEqual(
+            list(ChargeRollup.objects.order_by('bucket')
+                 .values_list('bucket', 'total_seconds', 'charge_count')),
+            expected_rollups
+        )
+
+    def test_import_charges_adds_to_charge_totals(self):
+        Charge(
+            project=self.project,
+            owner=self.owner,
+            start_time=self.start_datetime,
+            end_time=self.start_datetime + timedelta(minutes=15)
+        ).validate_and_save()
+
+        path = self.write_file('.csv', (
+            'project,start_time,end_time,closed\n'
+            'Test,2019-01-01 08:30,2019-01-01 09:00,false\n'
+            'Test,2019-01-01 09:50,2019-01-01 11:05,false\n'
+            'Test,2019-01-01 12:00,,false\n'
+        ))
+
+        self.import_charges(path)
+
+        self.assertEqual(
+            ChargeTotal.objects.values_list('owner', 'project', 'latest_charge_at',
+                                            'total_seconds').get(),
+            (self.owner.pk, self.project.pk,
+             self.start_datetime + timedelta(hours=3, minutes=5), (15 + 30 + 75) * 60)
+        )
+
+    def test_import_charges_for_owner(self):
+        Project(name='Other').validate_and_save()
+
+        path = self.write_file('.csv', (
+            'project,start_time,end_time,closed\n'
+            'Test,2019-01-01 08:00,2019-01-01 09:00,false\n'
+            'Other,2019-01-01 08:00,2019-01-01 09:00,false\n'
+        ))
+
+        for method in ('copy', 'bulk'):
+            with self.subTest(method=method):
+                _, stderr = self.import_charges(path, owner='owner', method=method)
+
+                self.assertIn('3,unknown_project,The project does not exist.', stderr)
+                self.assertEqual(Charge.objects.for_user(self.owner).filter(project=self.project)
+                                 .count(), 1 if method == 'copy' else 2)
+
+    def test_import_charges_for_owner_rejects_second_running_charge(self):
+        path = self.write_file('.csv', (
+            'project,start_time,end_time,closed\n'
+            'Test,2019-01-01 08:00,,false\n'
+            'Test,2019-01-01 09:00,2019-01-01 09:30,false\n'
+            'Test,2019-01-01 10:00,,false\n'
+        ))
+
+        for method in ('copy', 'bulk'):
+            with self.subTest(method=method):
+                Charge.objects.all().delete()
+                stdout, stderr = self.import_charges(path, owner='owner', method=method,
+                                                     batch_size=2)
+
+                self.assertIn('Imported 2 charge(s) and rejected 1 row(s)', stdout)
+                self.assertIn('4,one_running_charge_per_owner,', stderr)
+                self.assertEqual(Charge.objects.filter(end_time__isnull=True).count(), 1)
+
+    def test_import_charges_for_owner_rejects_running_charge_when_one_is_running(self):
+        Charge.objects.start(self.owner, self.project.pk, self.start_datetime)
+
+        path = self.write_file('.csv', (
+            'project,start_time,end_time,closed\n'
+            'Test,2019-01-02 08:00,,false\n'
+            'Test,2019-01-02 09:00,2019-01-02 09:30,false\n'
+        ))
+
+        stdout, stderr = self.import_charges(path, owner='owner', dry_run=True)
+
+        self.assertIn('Validated 1 charge(s) and rejected 1 row(s)', stdout)
+        self.assertIn('2,one_running_charge_per_owner,', stderr)
+
+    def test_import_charges_requires_owner(self):
+        path = self.write_file('.csv', 'project,start_time,end_time,closed\n')
+
+        with self.assertRaisesMessage(CommandError, '--owner'):
+            call_command('import_charges', path, stdout=StringIO(), stderr=StringIO())
+
+    def test_import_charges_dry_run_does_not_load_charges(self):
+        path = self.write_file('.csv', (
+            'project,start_time,end_time,closed\n'
+            'Test,2019-01-01 08:00,2019-01-01 09:00,false\n'
+        ))
+
+        stdout, _ = self.import_charges(path, dry_run=True)
+
+        self.assertIn('Validated 1 charge(s)', stdout)
+        self.assertFalse(Charge.objects.exists())
@@ -1,14 +1,20 @@
 # pylint: disable=missing-function-docstring
 
+import json
 from unittest.mock import MagicMock, patch
 
 from django.contrib import messages
 from django.contrib.auth.models import AnonymousUser, User
 from django.contrib.messages.storage.base import Message
-from django.test import SimpleTestCase
+from django.core.exceptions import MiddlewareNotUsed
+from django.test import SimpleTestCase, override_settings
 from django.test.client import RequestFactory
+from django.urls import reverse
 
-from ProjectTime.project.middleware import ProjectTimeTimezoneWarningMiddleware
+from ProjectTime.project import instrumentation
+from ProjectTime.project.middleware import (ProjectTimeInstrumentationMiddleware,
+                                            ProjectTimeTimezoneWarningMiddleware)
+from ProjectTime.project.tests.utils.testcase import AdminUserTestCase
 
 
 def mock_add_warning_message():
@@ -130,3 +136,71 @@ class ProjectTimeTimezoneWarningMiddlewareTestCase(SimpleTestCase):
 
         middleware.__call__(mock_request)
         self.assertFalse(mock_method.called)
+
+
+class ProjectTimeInstrumentationMiddlewareTestCase(AdminUserTestCase):
+    def setUp(self):
+        super().setUp()
+        instrumentation.registry.clear()
+
+    def test_instrumentation_middleware_is_not_used_when_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ProjectTimeInstrumentationMiddleware(lambda request: None)
+
+        self.performLogin()
+        response = self.client.get(reverse('project:charge-list'))
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(PROJECTTIME_INSTRUMENTATION=True)
+    def test_instrumentation_middleware_sets_server_timing_header(self):
+        self.performLogin()
+        response = self.client.get(reverse('project:charge-list'))
+
+        phases = [metric.split(';')[0] for metric in response['Server-Timing'].split(', ')]
+        self.assertEqual(phases[:2], ['total', 'db'])
+        self.assertIn('template', phases)
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ queries"')
+
+    @override_settings(PROJECTTIME_INSTRUMENTATION=True)
+    def test_instrumentation_middleware_logs_request_metrics(self):
+        self.performLogin()
+        with self.assertLogs('ProjectTime.instrumentation', 'INFO') as logs:
+            self.client.get(reverse('project:charge-list'))
+
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record['view'], 'project:charge-list')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['query_count'], 0)
+        self.assertIn('template_ms', record)
+
+    @override_settings(PROJECTTIME_INSTRUMENTATION=True)
+    def test_instrumentation_middleware_times_bokeh_charts(self):
+        self.performLogin()
+        with self.assertLogs('ProjectTime.instrumentation', 'INFO') as logs:
+            self.client.get(reverse('dashboard'))
+
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record['view'], 'dashboard')
+        self.assertIn('bokeh_ms', record)
+
+    @override_settings(PROJECTTIME_INSTRUMENTATION=True)
+    def test_metrics_view_totals_requests_per_view(self):
+        self.performLogin()
+        self.client.get(reverse('project:charge-list'))
+        self.client.get(reverse('project:charge-list'))
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('projecttime_requests_total{view="project:charge-list"} 2',
+                      response.content.decode())
+
+    @override_settings(PROJECTTIME_INSTRUMENTATION=True)
+    def test_metrics_view_is_forbidden_to_other_users(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_metrics_view_is_not_found_when_disabled(self):
+        self.performLogin()
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 404)
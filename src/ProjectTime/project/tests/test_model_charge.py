@@ -2,6 +2,7 @@
 
 from datetime import datetime, timedelta
 
+from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.db import IntegrityError
 from django.db.models import ProtectedError
@@ -324,6 +325,71 @@ class ChargeModelTestCase(ValidationMixin, TestCase):
         charge.validate_and_save()
         self.assertEqual(charge.closed, False)
 
+    def test_charge_validation_uses_values_it_was_loaded_with(self):
+        start_datetime = timezone.make_aware(
+            datetime(2019, 1, 1, hour=8, minute=0, second=0))
+
+        charge_id = Charge(
+            project=self.project,
+            start_time=start_datetime,
+            end_time=start_datetime + timedelta(hours=1),
+            closed=True
+        ).validate_and_save().pk
+
+        charge = Charge.objects.select_related('project').get(pk=charge_id)
+
+        # Only the foreign key check on the project should hit the database
+        with self.assertNumQueries(1):
+            with self.assertRaises(ValidationError):
+                charge.full_clean()
+
+    def test_charge_validation_can_recheck_stored_charge_with_lock(self):
+        start_datetime = timezone.make_aware(
+            datetime(2019, 1, 1, hour=8, minute=0, second=0))
+
+        charge = Charge(
+            project=self.project,
+            start_time=start_datetime,
+            end_time=start_datetime + timedelta(hours=1)
+        ).validate_and_save()
+
+        # Closed by someone else after the charge was loaded
+        Charge.objects.filter(pk=charge.pk).update(closed=True)
+        charge.closed = True
+
+        with self.assertRaises(ValidationError) as context_manager:
+            charge.validate_and_save(lock=True)
+
+        self.assertValidationMessagePresent(
+            context_manager.exception.error_dict,
+            field='__all__',
+            error_code='cannot_modify_when_closed'
+        )
+
+    def test_charge_cannot_be_modified_when_closed_after_refresh(self):
+        start_datetime = timezone.make_aware(
+            datetime(2019, 1, 1, hour=8, minute=0, second=0))
+
+        charge = Charge(
+            project=self.project,
+            start_time=start_datetime,
+            end_time=start_datetime + timedelta(hours=1)
+        ).validate_and_save()
+
+        # Closed in bulk, which bypasses save()
+        Charge.objects.filter(pk=charge.pk).close()
+        charge.refresh_from_db()
+        charge.end_time = start_datetime + timedelta(hours=2)
+
+        with self.assertRaises(ValidationError) as context_manager:
+            charge.validate_and_save()
+
+        self.assertValidationMessagePresent(
+            context_manager.exception.error_dict,
+            field='__all__',
+            error_code='cannot_modify_when_closed'
+        )
+
     def test_cannot_delete_project_with_associated_charge(self):
         start_datetime = timezone.make_aware(
             datetime(2019, 1, 1, hour=8, minute=0, second=0))
@@ -357,3 +423,98 @@ class ChargeModelTestCase(ValidationMixin, TestCase):
 
         self.assertEqual(Charge.objects.earliest(), earlier_charge)
         self.assertEqual(Charge.objects.latest(), later_charge)
+
+    def test_charge_owner_can_only_have_one_running_charge(self):
+        owner = User.objects.create_user('owner')
+        start_datetime = timezone.make_aware(datetime(2019, 1, 1, hour=8))
+
+        Charge(
+            project=self.project,
+            owner=owner,
+            start_time=start_datetime
+        ).validate_and_save()
+
+        with self.assertRaises(ValidationError) as context:
+            Charge(
+                project=self.project,
+                owner=owner,
+                start_time=start_datetime + timedelta(hours=1)
+            ).validate_and_save()
+        self.assertEqual(context.exception.error_dict['end_time'][0].code,
+                         'one_running_charge_per_owner')
+
+        # Charges with an end time, and those of other owners, are not running
+        # charges of the owner.
+        Charge(
+            project=self.project,
+            owner=owner,
+            start_time=start_datetime + timedelta(hours=1),
+            end_time=start_datetime + timedelta(hours=2)
+        ).validate_and_save()
+        Charge(
+            project=self.project,
+            owner=User.objects.create_user('other'),
+            start_time=start_datetime
+        ).validate_and_save()
+
+    def test_charge_owner_running_charge_is_enforced_by_database(self):
+        owner = User.objects.create_user('owner')
+        start_datetime = timezone.make_aware(datetime(2019, 1, 1, hour=8))
+
+        Charge(project=self.project, owner=owner, start_time=start_datetime).save()
+        with self.assertRaises(IntegrityError):
+            Charge(project=self.project, owner=owner, start_time=start_datetime).save()
+
+    def test_charge_duration_seconds_is_set_on_save(self):
+        start_datetime = timezone.make_aware(datetime(2019, 1, 1, hour=8))
+        charge = Charge(project=self.project, start_time=start_datetime).validate_and_save()
+        self.assertIsNone(charge.duration_seconds)
+
+        charge.end_time = start_datetime + timedelta(minutes=90, microseconds=500)
+        charge.validate_and_save()
+
+        self.assertEqual(charge.duration_seconds, 5400)
+        charge.refresh_from_db()
+        self.assertEqual(charge.duration_seconds, 5400)
+
+    def test_charge_time_charged_is_not_truncated_to_duration_seconds(self):
+        start_datetime = timezone.make_aware(datetime(2019, 1, 1, hour=8))
+        time_charged = timedelta(minutes=90, microseconds=500)
+        Charge(project=self.project, start_time=start_datetime,
+               end_time=start_datetime + time_charged).validate_and_save()
+
+        self.assertEqual(Charge.objects.annotate_time_charged().get().db_time_charged,
+                         time_charged)
+        self.assertEqual(Charge.objects.aggregate_time_charged(), time_charged)
+
+    def test_charge_duration_seconds_is_maintained_by_database(self):
+        start_datetime = timezone.make_aware(datetime(2019, 1, 1, hour=8))
+        Charge.objects.bulk_create([
+            Charge(project=self.project, start_time=start_datetime,
+                   end_time=start_datetime + timedelta(hours=1), duration_seconds=1)
+        ])
+        self.assertEqual(Charge.objects.get().duration_seconds, 3600)
+
+        Charge.objects.update(end_time=start_datetime + timedelta(hours=2))
+        self.assertEqual(Charge.objects.get().duration_seconds, 7200)
+
+        Charge.objects.update(end_time=None)
+        self.assertIsNone(Charge.objects.get().duration_seconds)
+
+    def test_charge_save_updates_derived_data_in_one_statement(self):
+        start_datetime = timezone.make_aware(datetime(2019, 1, 1, hour=8))
+        charge = Charge(project=self.project, owner=User.objects.create_user('owner'),
+                        start_time=start_datetime,
+                        end_time=start_datetime + timedelta(minutes=90))
+
+        # The savepoint, the charge, the lock on its project, the rollups and
+        # charge totals, and the savepoint release.
+        with self.assertNumQueries(5):
+            charge.save()
+
+        charge.end_time = start_datetime + timedelta(hours=3)
+        with self.assertNumQueries(5):
+            charge.save()
+
+        with self.assertNumQueries(5):
+            charge.delete()
@@ -0,0 +1,227 @@
+# pylint: disable=missing-function-docstring
+
+from datetime import datetime, timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from ProjectTime.project.models import Charge, ChargeRollup, ChargeTotal, Project
+from ProjectTime.project.utils.timer import stop_charge
+
+
+class SimpleChargeRollupModelTestCase(SimpleTestCase):
+    def test_charge_rollup_bucket_is_start_of_hour_in_utc(self):
+        moment = timezone.make_aware(datetime(2019, 1, 1, hour=8, minute=45, second=10),
+                                     timezone=timezone.get_fixed_timezone(-300))
+
+        self.assertEqual(
+            ChargeRollup.get_bucket(moment),
+            timezone.make_aware(datetime(2019, 1, 1, hour=13), timezone=timezone.utc)
+        )
+
+
+class ChargeRollupModelTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner')
+        cls.project = Project(name='Test').validate_and_save()
+        cls.start_datetime = timezone.make_aware(
+            datetime(2019, 1, 1, hour=8, minute=0, second=0),
+            timezone=timezone.utc)
+
+    def get_rollups(self):
+        return list(ChargeRollup.objects
+                    .order_by('bucket')
+                    .values_list('bucket', 'total_seconds', 'charge_count'))
+
+    def test_charge_rollup_is_created_when_charge_is_saved(self):
+        Charge(
+            project=self.project,
+            owner=self.owner,
+            start_time=self.start_datetime,
+            end_time=self.start_datetime + timedelta(minutes=30)
+        ).validate_and_save()
+
+        Charge(
+            project=self.project,
+            owner=self.owner,
+            start_time=self.start_datetime + timedelta(minutes=40),
+            end_time=self.start_datetime + timedelta(hours=2)
+        ).validate_and_save()
+
+        self.assertEqual(self.get_rollups(), [
+            (self.start_datetime, 30 * 60 + 20 * 60, 2),
+            (self.start_datetime + timedelta(hours=1), 60 * 60, 1)
+        ])
+
+    def test_charge_rollup_splits_charge_across_hours(self):
+        Charge(
+            project=self.project,
+            owner=self.owner,
+            start_time=self.start_datetime + timedelta(minutes=45),
+            end_time=self.start_datetime + timedelta(hours=2, minutes=10)
+        ).validate_and_save()
+
+        self.assertEqual(self.get_rollups(), [
+            (self.start_datetime, 15 * 60, 1),
+            (self.start_datetime + timedelta(hours=1), 60 * 60, 1),
+            (self.start_datetime + timedelta(hours=2), 10 * 60, 1)
+        ])
+
+    def test_charge_rollup_is_updated_when_charge_end_time_is_modified(self):
+        charge = Charge(
+            project=self.project,
+            owner=self.owner,
+            start_time=self.start_datetime,
+            end_time=self.start_datetime + timedelta(hours=2, minutes=30)
+        ).validate_and_save()
+
+        charge.end_time = self.start_datetime + timedelta(minutes=30)
+        charge.validate_and_save()
+
+        self.assertEqual(self.get_rollups(), [
+            (self.start_datetime, 30 * 60, 1)
+        ])
+
+    def test_charge_rollup_is_updated_when_charge_stopped_by_timer_is_modified(self):
+        charge = Charge(
+            project=self.project,
+            owner=self.owner,
+            start_time=self.start_datetime
+        ).validate_and_save()
+        stop_charge(self.owner, self.start_datetime + timedelta(minutes=30))
+
+        charge.refresh_from_db()
+        charge.end_time = self.start_datetime + timedelta(minutes=20)
+        charge.validate_and_save()
+
+        self.assertEqual(self.get_rollups(), [
+            (self.start_datetime, 20 * 60, 1)
+        ])
+        self.assertEqual(
+            ChargeTotal.objects.values_list('total_seconds', flat=True).get(),
+            20 * 60
+        )
+
+    def test_charge_rollup_excludes_charges_without_end_time(self):
+        Charge(
+            project=self.project,
+            owner=self.owner,
+            start_time=self.start_datetime
+        ).validate_and_save()
+
+        self.assertEqual(self.get_rollups(), [])
+
+    def test_charge_rollup_is_updated_when_charge_is_modified(self):
+        charge = Charge(
+            project=self.project,
+            owner=self.owner,
+            start_time=self.start_datetime,
+            end_time=self.start_datetime + timedelta(minutes=30)
+        ).validate_and_save()
+
+        charge.start_time = self.start_datetime + timedelta(hours=1)
+        charge.end_time = self.start_datetime + timedelta(hours=2)
+        charge.validate_and_save()
+
+        self.assertEqual(self.get_rollups(), [
+            (self.start_datetime + timedelta(hours=1), 60 * 60, 1)
+        ])
+
+    def test_charge_rollup_is_updated_when_charge_is_deleted(self):
+        charge = Charge(
+            project=self.project,
+            owner=self.owner,
+            start_time=self.start_datetime,
+            end_time=self.start_datetime + timedelta(minutes=30)
+        ).validate_and_save()
+
+        charge.delete()
+
+        self.assertEqual(self.get_rollups(), [])
+
+    def test_charge_rollups_are_kept_per_owner(self):
+        other_owner = User.objects.create_user('other')
+        for owner, minutes in ((self.owner, 15), (other_owner, 30)):
+            Charge(
+                project=self.project,
+                owner=owner,
+                start_time=self.start_datetime,
+                end_time=self.start_datetime + timedelta(minutes=minutes)
+            ).validate_and_save()
+
+        self.assertEqual(
+            list(ChargeRollup.objects.order_by('owner')
+                 .values_list('owner', 'bucket', 'total_seconds', 'charge_count')),
+            [(self.owner.pk, self.start_datetime, 15 * 60, 1),
+             (other_owner.pk, self.start_datetime, 30 * 60, 1)]
+        )
+
+    def test_charge_rollup_excludes_charges_without_owner(self):
+        Charge(
+            project=self.project,
+            start_time=self.start_datetime,
+            end_time=self.start_datetime + timedelta(minutes=30)
+        ).validate_and_save()
+
+        self.assertEqual(self.get_rollups(), [])
+        self.assertEqual(ChargeRollup.objects.rebuild(), 0)
+
+    def test_charge_rollups_can_be_rebuilt_from_charges(self):
+        for hour in range(3):
+            Charge(
+                project=self.project,
+                owner=self.owner,
+                start_time=self.start_datetime + timedelta(hours=hour),
+                end_time=self.start_datetime + timedelta(hours=hour, minutes=15)
+            ).validate_and_save()
+
+        expected_rollups = self.get_rollups()
+        ChargeRollup.objects.all().delete()
+
+        created = ChargeRollup.objects.rebuild()
+
+        self.assertEqual(created, 3)
+        self.assertEqual(self.get_rollups(), expected_rollups)
+
+    def test_charge_rollup_counts_charge_of_no_time_as_rebuild_does(self):
+        Charge(
+            project=self.project,
+            owner=self.owner,
+            start_time=self.start_datetime + timedelta(minutes=20),
+            end_time=self.start_datetime + timedelta(minutes=20)
+        ).validate_and_save()
+        charge = Charge(
+            project=self.project,
+            owner=self.owner,
+            start_time=self.start_datetime + timedelta(minutes=30),
+            end_time=self.start_datetime + timedelta(minutes=45)
+        ).validate_and_save()
+        # Refreshes the bucket, which must still count the charge of no time.
+        charge.end_time = self.start_datetime + timedelta(minutes=50)
+        charge.validate_and_save()
+
+        refreshed_rollups = self.get_rollups()
+        ChargeRollup.objects.rebuild()
+
+        self.assertEqual(refreshed_rollups, [(self.start_datetime, 20 * 60, 2)])
+        self.assertEqual(self.get_rollups(), refreshed_rollups)
+
+    def test_charge_rollups_can_be_rebuilt_with_management_command(self):
+        Charge(
+            project=self.project,
+            owner=self.owner,
+            start_time=self.start_datetime,
+            end_time=self.start_datetime + timedelta(minutes=15)
+        ).validate_and_save()
+
+        ChargeRollup.objects.all().delete()
+
+        stdout = StringIO()
+        call_command('rebuild_rollups', project_ids=[self.project.pk], stdout=stdout)
+
+        self.assertIn('Rebuilt 1 rollup(s).', stdout.getvalue())
+        self.assertEqual(self.get_rollups(), [(self.start_datetime, 15 * 60, 1)])
@@ -0,0 +1,148 @@
+# pylint: disable=missing-function-docstring
+
+from datetime import datetime, timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.utils import timezone
+
+from ProjectTime.project.models import Charge, ChargeTotal, Project
+
+
+class ChargeTotalModelTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner')
+        cls.project = Project(name='Test').validate_and_save()
+        cls.other_project = Project(name='Other').validate_and_save()
+        cls.start_datetime = timezone.make_aware(
+            datetime(2019, 1, 1, hour=8, minute=0, second=0),
+            timezone=timezone.utc)
+
+    def create_charge(self, project=None, minutes=(0, 30), owner=None):
+        return Charge(
+            project=project or self.project,
+            owner=owner or self.owner,
+            start_time=self.start_datetime + timedelta(minutes=minutes[0]),
+            end_time=(self.start_datetime + timedelta(minutes=minutes[1])
+                      if minutes[1] is not None else None)
+        ).validate_and_save()
+
+    def get_totals(self, project=None, owner=None):
+        return (ChargeTotal.objects
+                .filter(project=project or self.project, owner=owner or self.owner)
+                .values_list('latest_charge_at', 'total_seconds')
+                .first() or (None, 0))
+
+    def test_charge_totals_default_to_no_charges(self):
+        self.assertEqual(self.get_totals(), (None, 0))
+
+    def test_charge_totals_are_updated_when_charge_is_created(self):
+        self.create_charge(minutes=(0, 30))
+        self.create_charge(minutes=(40, 50))
+        self.create_charge(minutes=(60, None))
+
+        self.assertEqual(self.get_totals(),
+                         (self.start_datetime + timedelta(minutes=50), 40 * 60))
+
+    def test_charge_totals_are_updated_when_charge_is_modified(self):
+        self.create_charge(minutes=(0, 30))
+        charge = self.create_charge(minutes=(40, 90))
+
+        charge.end_time = self.start_datetime + timedelta(minutes=20)
+        charge.start_time = self.start_datetime + timedelta(minutes=10)
+        charge.validate_and_save()
+
+        self.assertEqual(self.get_totals(),
+                         (self.start_datetime + timedelta(minutes=30), 40 * 60))
+
+    def test_charge_totals_are_updated_when_charge_is_closed(self):
+        charge = self.create_charge(minutes=(0, None))
+
+        charge.end_time = self.start_datetime + timedelta(minutes=45)
+        charge.closed = True
+        charge.validate_and_save()
+
+        self.assertEqual(self.get_totals(),
+                         (self.start_datetime + timedelta(minutes=45), 45 * 60))
+
+    def test_charge_totals_are_updated_when_charge_moves_project(self):
+        charge = self.create_charge(minutes=(0, 30))
+
+        charge.project = self.other_project
+        charge.validate_and_save()
+
+        self.assertEqual(self.get_totals(), (None, 0))
+        self.assertEqual(self.get_totals(self.other_project),
+                         (self.start_datetime + timedelta(minutes=30), 30 * 60))
+
+    def test_charge_totals_are_updated_when_charge_is_deleted(self):
+        self.create_charge(minutes=(0, 30))
+        charge = self.create_charge(minutes=(40, 50))
+
+        charge.delete()
+
+        self.assertEqual(self.get_totals(),
+                         (self.start_datetime + timedelta(minutes=30), 30 * 60))
+
+    def test_charge_totals_are_kept_per_owner(self):
+        other_owner = User.objects.create_user('other')
+        self.create_charge(minutes=(0, 30))
+        self.create_charge(minutes=(0, 15), owner=other_owner)
+
+        self.assertEqual(self.get_totals(),
+                         (self.start_datetime + timedelta(minutes=30), 30 * 60))
+        self.assertEqual(self.get_totals(owner=other_owner),
+                         (self.start_datetime + timedelta(minutes=15), 15 * 60))
+
+    def test_charge_totals_exclude_charges_without_owner(self):
+        Charge(
+            project=self.project,
+            start_time=self.start_datetime,
+            end_time=self.start_datetime + timedelta(minutes=30)
+        ).validate_and_save()
+
+        self.assertFalse(ChargeTotal.objects.exists())
+        self.assertEqual(ChargeTotal.objects.rebuild(), 0)
+
+    def test_charge_totals_can_be_rebuilt_from_charges(self):
+        self.create_charge(minutes=(0, 30))
+        self.create_charge(project=self.other_project, minutes=(0, 15))
+        ChargeTotal.objects.all().delete()
+
+        created = ChargeTotal.objects.rebuild()
+
+        self.assertEqual(created, 2)
+        self.assertEqual(self.get_totals(),
+                         (self.start_datetime + timedelta(minutes=30), 30 * 60))
+        self.assertEqual(self.get_totals(self.other_project),
+                         (self.start_datetime + timedelta(minutes=15), 15 * 60))
+
+    def test_charge_totals_can_be_checked_with_management_command(self):
+        self.create_charge(minutes=(0, 30))
+        self.create_charge(project=self.other_project, minutes=(0, None))
+
+        stdout = StringIO()
+        call_command('check_charge_totals', stdout=stdout, stderr=StringIO())
+        self.assertIn('All project totals are consistent.', stdout.getvalue())
+
+        ChargeTotal.objects.filter(project=self.project).update(total_seconds=0)
+        stderr = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('check_charge_totals', stdout=StringIO(), stderr=stderr)
+        self.assertIn(f'Test (ID {self.project.pk}), user ID {self.owner.pk}',
+                      stderr.getvalue())
+
+    def test_charge_totals_can_be_repaired_with_management_command(self):
+        self.create_charge(minutes=(0, 30))
+        ChargeTotal.objects.all().delete()
+
+        stdout = StringIO()
+        call_command('check_charge_totals', repair=True, stdout=stdout, stderr=StringIO())
+
+        self.assertIn('Repaired 1 project(s).', stdout.getvalue())
+        self.assertEqual(self.get_totals(),
+                         (self.start_datetime + timedelta(minutes=30), 30 * 60))
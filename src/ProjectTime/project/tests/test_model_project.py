@@ -118,3 +118,42 @@ class ProjectModelTestCase(ValidationMixin, TestCase):
         project.active = True
         project.validate_and_save()
         self.assertEqual(project.active, True)
+
+    def test_project_validation_can_recheck_stored_project_with_lock(self):
+        project = Project(name='Test').validate_and_save()
+
+        # Deactivated by someone else after the project was loaded
+        Project.objects.filter(pk=project.pk).update(active=False)
+        project.active = False
+
+        with self.assertRaises(ValidationError) as context_manager:
+            project.validate_and_save(lock=True)
+
+        self.assertValidationMessagePresent(
+            context_manager.exception.error_dict,
+            field='__all__',
+            error_code='cannot_modify_when_inactive'
+        )
+
+    def test_project_cannot_be_modified_when_deactivated_after_refresh(self):
+        project = Project(name='Test').validate_and_save()
+
+        Project.objects.filter(pk=project.pk).update(active=False)
+        project.refresh_from_db()
+        project.name = 'Renamed'
+
+        with self.assertRaises(ValidationError) as context_manager:
+            project.validate_and_save()
+
+        self.assertValidationMessagePresent(
+            context_manager.exception.error_dict,
+            field='__all__',
+            error_code='cannot_modify_when_inactive'
+        )
+
+    def test_project_original_values_are_known_after_loading(self):
+        project_id = Project(name='Test', active=False).validate_and_save().pk
+        project = Project.objects.get(pk=project_id)
+
+        with self.assertNumQueries(0):
+            self.assertFalse(project.get_original_value('active'))
@@ -1,17 +1,30 @@
 # pylint: disable=missing-function-docstring
 
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
 import pandas as pd
-from datetime import timedelta
+import pytz
 
+from django.contrib.auth.models import AnonymousUser, User
+from django.db import connection
 from django.test import TestCase
 from django.utils import timezone
 
 from ProjectTime.project.models import Charge, Project
+from ProjectTime.project.querysets import has_trigram_extension
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
 
 
 class ProjectQuerySetTestCase(TestCase):
     @classmethod
     def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner')
         cls.project = Project(name='Test').validate_and_save()
 
     def test_project_queryset_can_annotate_latest_charge(self):
@@ -21,11 +34,13 @@ class ProjectQuerySetTestCase(TestCase):
 
         Charge(
             project=self.project,
+            owner=self.owner,
             start_time=yesterday,
             end_time=today).validate_and_save()
 
         Charge(
             project=self.project,
+            owner=self.owner,
             start_time=today,
             end_time=tomorrow
         ).validate_and_save()
@@ -35,10 +50,94 @@ class ProjectQuerySetTestCase(TestCase):
 
         self.assertEqual(annotated_project.db_latest_charge, tomorrow)
 
+    def test_project_queryset_latest_charge_ignores_charges_without_end_time(self):
+        today = timezone.now().replace(hour=0, minute=0, second=0)
+
+        Charge(
+            project=self.project,
+            owner=self.owner,
+            start_time=today - timedelta(days=1),
+            end_time=today
+        ).validate_and_save()
+
+        Charge(
+            project=self.project,
+            owner=self.owner,
+            start_time=today
+        ).validate_and_save()
+
+        annotated_project = (Project.objects.annotate_latest_charge()
+                             .get(pk=self.project.pk))
+
+        self.assertEqual(annotated_project.db_latest_charge, today)
+
+    def test_project_queryset_can_annotate_latest_charge_of_owner(self):
+        other_owner = User.objects.create_user('other')
+        today = timezone.now().replace(hour=0, minute=0, second=0)
+        tomorrow = today + timedelta(days=1)
+
+        Charge(
+            project=self.project,
+            owner=self.owner,
+            start_time=today - timedelta(days=1),
+            end_time=today
+        ).validate_and_save()
+
+        Charge(
+            project=self.project,
+            owner=other_owner,
+            start_time=today,
+            end_time=tomorrow
+        ).validate_and_save()
+
+        self.assertEqual(
+            [(owner, project.db_latest_charge) for owner in (self.owner, other_owner, None)
+             for project in Project.objects.annotate_latest_charge(owner=owner)],
+            [(self.owner, today), (other_owner, tomorrow), (None, tomorrow)]
+        )
+
     def test_project_queryset_can_be_converted_to_pandas(self):
         self.assertIsInstance(Project.objects.to_pandas(), pd.DataFrame)
 
 
+class ProjectQuerySetSearchTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for name in ('Big Acme Holdings', 'Acme Corp', 'Acme', 'Unrelated'):
+            Project(name=name).validate_and_save()
+
+    def search(self, text):
+        return list(Project.objects.search(text).values_list('name', flat=True))
+
+    def test_project_queryset_search_ranks_best_matches_first(self):
+        self.assertEqual(self.search('acme'), ['Acme', 'Acme Corp', 'Big Acme Holdings'])
+
+    def test_project_queryset_search_without_trigram_extension(self):
+        with patch('ProjectTime.project.querysets.has_trigram_extension',
+                   return_value=False):
+            self.assertEqual(self.search('ACME'),
+                             ['Acme', 'Acme Corp', 'Big Acme Holdings'])
+            self.assertEqual(self.search('holdings'), ['Big Acme Holdings'])
+
+    def test_project_queryset_search_filters_by_the_indexed_expression(self):
+        sql = str(Project.objects.search('acme').query)
+
+        self.assertIn('UPPER("project_project"."name"::text) LIKE UPPER(', sql)
+
+    def test_project_queryset_search_without_text_is_by_name(self):
+        self.assertEqual(self.search(' '),
+                         ['Acme', 'Acme Corp', 'Big Acme Holdings', 'Unrelated'])
+
+    def test_project_queryset_search_ranks_by_similarity(self):
+        if not has_trigram_extension():
+            self.skipTest('The pg_trgm extension is not installed.')
+
+        project = Project.objects.search('acme').first()
+
+        self.assertEqual(project.name, 'Acme')
+        self.assertEqual(project.db_rank, 1.0)
+
+
 class ChargeQuerySetTestCase(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -84,5 +183,357 @@ class ChargeQuerySetTestCase(TestCase):
         total_time_charged = Charge.objects.aggregate_time_charged()
         self.assertEqual(total_time_charged, timedelta(hours=9))
 
+    def test_charge_queryset_can_annotate_total_time_charged(self):
+        start_of_today = timezone.now().replace(
+            hour=0,
+            minute=0,
+            second=0,
+            microsecond=0)
+
+        Charge(
+            project=self.project,
+            start_time=start_of_today.replace(hour=8),
+            end_time=start_of_today.replace(hour=9)
+        ).validate_and_save()
+
+        Charge(
+            project=self.project,
+            start_time=start_of_today.replace(hour=9),
+            end_time=start_of_today.replace(hour=17)
+        ).validate_and_save()
+
+        Charge(
+            project=self.project,
+            start_time=start_of_today.replace(hour=17)
+        ).validate_and_save()
+
+        with self.assertNumQueries(1):
+            charges = list(Charge.objects.order_by('start_time').annotate_total_time_charged())
+
+        self.assertEqual([charge.db_time_charged for charge in charges],
+                         [timedelta(hours=1), timedelta(hours=8), None])
+        self.assertEqual({charge.db_total_time_charged for charge in charges},
+                         {timedelta(hours=9)})
+
+    def test_charge_queryset_can_bucket_time_charged_in_timezone(self):
+        tz = pytz.timezone('America/New_York')
+        # 23:00 on Sunday the 31st of March and 01:00 on Monday the 1st of
+        # April in New York, which are both in April in UTC.
+        sunday_night = tz.localize(datetime(2019, 3, 31, hour=23))
+        monday_morning = tz.localize(datetime(2019, 4, 1, hour=1))
+
+        for start_time in (sunday_night, monday_morning):
+            Charge(
+                project=self.project,
+                start_time=start_time,
+                end_time=start_time + timedelta(minutes=30)
+            ).validate_and_save()
+
+        self.assertEqual(
+            list(Charge.objects.bucket_time_charged('month', tz=tz)),
+            [{'project': self.project.pk,
+              'bucket': tz.localize(datetime(2019, 3, 1)),
+              'total_time_charged': timedelta(minutes=30),
+              'charge_count': 1},
+             {'project': self.project.pk,
+              'bucket': tz.localize(datetime(2019, 4, 1)),
+              'total_time_charged': timedelta(minutes=30),
+              'charge_count': 1}]
+        )
+        self.assertEqual(
+            [row['bucket'] for row in Charge.objects.bucket_time_charged('week', tz=tz)],
+            [tz.localize(datetime(2019, 3, 25)), tz.localize(datetime(2019, 4, 1))]
+        )
+        with timezone.override(tz):
+            self.assertEqual(
+                [row['bucket'] for row in Charge.objects.bucket_time_charged('year')],
+                [tz.localize(datetime(2019, 1, 1))]
+            )
+
+    def test_charge_queryset_can_sum_time_charged_between_clipping_charges(self):
+        start = timezone.make_aware(datetime(2019, 2, 1))
+        end = timezone.make_aware(datetime(2019, 3, 1))
+
+        for start_time, end_time in (
+                # Overlaps the start of the interval
+                (start - timedelta(hours=2), start + timedelta(hours=1)),
+                # Within the interval
+                (start + timedelta(days=1), start + timedelta(days=1, hours=3)),
+                # Overlaps the end of the interval
+                (end - timedelta(minutes=30), end + timedelta(hours=1)),
+                # Outside of the interval
+                (end, end + timedelta(hours=1)),
+                (start - timedelta(hours=1), start),
+                (end, end),
+                # No time within the interval
+                (start, start)):
+            Charge(
+                project=self.project,
+                start_time=start_time,
+                end_time=end_time
+            ).validate_and_save()
+
+        Charge(project=self.project, start_time=start).validate_and_save()
+
+        self.assertEqual(list(Charge.objects.time_charged_between(start, end)), [{
+            'project': self.project.pk,
+            'total_time_charged': timedelta(hours=4, minutes=30),
+            'charge_count': 4
+        }])
+
+    def test_charge_queryset_overlapping_uses_time_range_index(self):
+        start = timezone.make_aware(datetime(2019, 2, 1))
+
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+        plan = (Charge.objects
+                .overlapping(start, start + timedelta(days=1))
+                .explain())
+
+        self.assertIn('charge_time_range_idx', plan)
+
+    def test_charge_queryset_cannot_bucket_time_charged_by_unknown_period(self):
+        with self.assertRaises(ValueError):
+            Charge.objects.bucket_time_charged('fortnight')
+
     def test_charge_queryset_can_be_converted_to_pandas(self):
         self.assertIsInstance(Charge.objects.to_pandas(), pd.DataFrame)
+
+    def create_charges_for_pandas(self):
+        other_project = Project(name='Other').validate_and_save()
+        start_of_today = timezone.now().replace(
+            hour=0,
+            minute=0,
+            second=0,
+            microsecond=0)
+
+        for hour, project in enumerate((self.project, other_project, self.project)):
+            Charge(
+                project=project,
+                start_time=start_of_today.replace(hour=hour),
+                end_time=start_of_today.replace(hour=hour, minute=30) if hour else None
+            ).validate_and_save()
+
+    def test_charge_queryset_to_pandas_derives_dtypes_from_fields(self):
+        self.create_charges_for_pandas()
+
+        frame = (Charge.objects.order_by('start_time').annotate_time_charged()
+                 .to_pandas('id', 'project__name', 'start_time', 'end_time',
+                            'closed', 'db_time_charged'))
+
+        self.assertEqual(frame.dtypes.astype(str).to_dict(), {
+            'id': 'int64',
+            'project__name': 'category',
+            'start_time': 'datetime64[ns, UTC]',
+            'end_time': 'datetime64[ns, UTC]',
+            'closed': 'bool',
+            'db_time_charged': 'timedelta64[ns]',
+        })
+        self.assertEqual(frame['db_time_charged'].tolist()[1:],
+                         [timedelta(minutes=30)] * 2)
+
+    def test_charge_queryset_to_pandas_in_chunks_matches_single_chunk(self):
+        self.create_charges_for_pandas()
+        queryset = Charge.objects.order_by('start_time')
+
+        frame = queryset.to_pandas('start_time', 'project__name', chunk_size=1)
+
+        pd.testing.assert_frame_equal(
+            frame, queryset.to_pandas('start_time', 'project__name'))
+        self.assertEqual(len(list(queryset.iter_pandas(chunk_size=2))), 2)
+
+    def test_charge_queryset_to_pandas_keeps_columns_when_empty(self):
+        frame = Charge.objects.to_pandas('start_time', 'closed')
+
+        self.assertEqual(list(frame.columns), ['start_time', 'closed'])
+        self.assertEqual(str(frame['start_time'].dtype), 'datetime64[ns, UTC]')
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_charge_queryset_to_pandas_with_arrow_matches_default(self):
+        self.create_charges_for_pandas()
+        queryset = Charge.objects.order_by('start_time').annotate_time_charged()
+        values = ('id', 'project__name', 'start_time', 'end_time', 'closed',
+                  'db_time_charged')
+
+        pd.testing.assert_frame_equal(
+            queryset.to_pandas(*values, arrow=True, chunk_size=2),
+            queryset.to_pandas(*values, chunk_size=2))
+
+
+class ChargeQuerySetForUserTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user')
+        cls.other_user = User.objects.create_user('other')
+        cls.project = Project(name='Test').validate_and_save()
+        cls.start_datetime = timezone.make_aware(datetime(2019, 1, 1))
+
+    def create_charges(self, owner, count):
+        Charge.objects.bulk_create([
+            Charge(project=self.project,
+                   owner=owner,
+                   start_time=self.start_datetime + timedelta(minutes=index),
+                   end_time=self.start_datetime + timedelta(minutes=index + 1),
+                   closed=index % 10 != 0)
+            for index in range(count)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE project_charge')
+
+    def get_charge_rows_read(self, queryset):
+        # The rows of the charge table that executing the query read, whether
+        # they were returned or filtered out.
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (ANALYZE, FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0][0]['Plan']
+
+        rows_read = 0
+        nodes = [plan]
+        while nodes:
+            node = nodes.pop()
+            nodes.extend(node.get('Plans', ()))
+            if node.get('Relation Name') == Charge._meta.db_table:
+                rows_read += (node['Actual Rows'] * node['Actual Loops'] +
+                              node.get('Rows Removed by Filter', 0) +
+                              node.get('Rows Removed by Index Recheck', 0))
+
+        return rows_read
+
+    def test_charge_queryset_for_user_only_includes_charges_of_user(self):
+        self.create_charges(self.user, 3)
+        self.create_charges(self.other_user, 5)
+
+        self.assertEqual(Charge.objects.for_user(self.user).count(), 3)
+        self.assertEqual(Charge.objects.for_user(AnonymousUser()).count(), 0)
+
+    def test_project_queryset_for_user_only_includes_projects_of_member(self):
+        Project(name='Other').validate_and_save().members.add(self.other_user)
+        self.project.members.add(self.user)
+
+        self.assertEqual(list(Project.objects.for_user(self.user)), [self.project])
+        self.assertEqual(list(Project.objects.for_user(AnonymousUser())), [])
+
+    def test_charge_queryset_for_user_reads_only_rows_of_user_as_table_grows(self):
+        self.create_charges(self.user, 100)
+        open_charges = (Charge.objects
+                        .for_user(self.user)
+                        .filter(closed=False)
+                        .select_related('project')
+                        .order_by('start_time')
+                        .annotate_time_charged())
+        listed_charges = (Charge.objects
+                          .for_user(self.user)
+                          .order_by('start_time', 'pk')[:10])
+
+        rows_read = []
+        for other_charges in (5000, 20000):
+            self.create_charges(self.other_user, other_charges)
+            rows_read.append((self.get_charge_rows_read(open_charges),
+                              self.get_charge_rows_read(listed_charges)))
+
+        self.assertEqual(rows_read, [(10, 10), (10, 10)])
+
+
+class ChargeQuerySetTimerTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user')
+        cls.project = Project(name='Test').validate_and_save()
+        cls.project.members.add(cls.user)
+        cls.start_datetime = timezone.make_aware(datetime(2019, 1, 1, hour=8))
+
+    def test_charge_queryset_can_start_charge_with_single_query(self):
+        with self.assertNumQueries(1):
+            charge = Charge.objects.start(self.user, self.project.pk, self.start_datetime)
+
+        self.assertEqual(charge, Charge.objects.get())
+        self.assertEqual(charge.owner, self.user)
+        self.assertEqual(charge.project, self.project)
+        self.assertEqual(charge.start_time, self.start_datetime)
+        self.assertIsNone(charge.end_time)
+
+    def test_charge_queryset_does_not_start_second_running_charge(self):
+        Charge.objects.start(self.user, self.project.pk, self.start_datetime)
+
+        self.assertIsNone(Charge.objects.start(self.user, self.project.pk,
+                                               self.start_datetime + timedelta(hours=1)))
+        self.assertEqual(Charge.objects.count(), 1)
+
+    def test_charge_queryset_does_not_start_charge_on_project_user_cannot_charge(self):
+        inactive_project = Project(name='Inactive', active=False).validate_and_save()
+        inactive_project.members.add(self.user)
+        other_project = Project(name='Other').validate_and_save()
+
+        for project in (inactive_project, other_project):
+            self.assertIsNone(Charge.objects.start(self.user, project.pk,
+                                                   self.start_datetime))
+        self.assertFalse(Charge.objects.exists())
+
+    def test_charge_queryset_can_stop_running_charge_with_single_query(self):
+        Charge.objects.start(self.user, self.project.pk, self.start_datetime)
+
+        with self.assertNumQueries(1):
+            charge = Charge.objects.stop(self.user, self.start_datetime + timedelta(hours=2))
+
+        self.assertEqual(charge.end_time, self.start_datetime + timedelta(hours=2))
+        self.assertEqual(Charge.objects.get().end_time, charge.end_time)
+        self.assertIsNone(Charge.objects.stop(self.user, self.start_datetime))
+
+    def test_charge_queryset_stops_charge_no_earlier_than_it_started(self):
+        Charge.objects.start(self.user, self.project.pk, self.start_datetime)
+
+        charge = Charge.objects.stop(self.user, self.start_datetime - timedelta(hours=1))
+        self.assertEqual(charge.end_time, self.start_datetime)
+
+    def test_charge_queryset_does_not_stop_charge_on_inactive_project(self):
+        Charge.objects.start(self.user, self.project.pk, self.start_datetime)
+        Project.objects.filter(pk=self.project.pk).update(active=False)
+
+        self.assertIsNone(Charge.objects.stop(self.user,
+                                              self.start_datetime + timedelta(hours=2)))
+        self.assertIsNone(Charge.objects.get().end_time)
+
+
+class ChargeQuerySetCloseTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.project = Project(name='Test').validate_and_save()
+        cls.inactive_project = Project(name='Inactive').validate_and_save()
+        cls.start_datetime = timezone.make_aware(datetime(2019, 1, 1, hour=8))
+
+    def create_charge(self, project=None, ended=True, closed=False):
+        return Charge(
+            project=project or self.project,
+            start_time=self.start_datetime,
+            end_time=self.start_datetime + timedelta(hours=1) if ended else None,
+            closed=closed
+        ).validate_and_save()
+
+    def test_charge_queryset_can_close_charges_with_single_query(self):
+        closable_charges = [self.create_charge(), self.create_charge()]
+        already_closed_charge = self.create_charge(closed=True)
+        running_charge = self.create_charge(ended=False)
+        inactive_project_charge = self.create_charge(project=self.inactive_project)
+        self.inactive_project.active = False
+        self.inactive_project.validate_and_save()
+
+        with self.assertNumQueries(1):
+            closed_count, skipped_count = Charge.objects.close()
+
+        self.assertEqual((closed_count, skipped_count), (2, 3))
+        self.assertEqual(set(Charge.objects.filter(closed=True)),
+                         {*closable_charges, already_closed_charge})
+        for charge in (running_charge, inactive_project_charge):
+            charge.refresh_from_db()
+            self.assertFalse(charge.closed)
+
+    def test_charge_queryset_only_closes_charges_of_queryset(self):
+        charge = self.create_charge()
+        other_charge = self.create_charge()
+
+        self.assertEqual(Charge.objects.filter(pk=charge.pk).close(), (1, 0))
+        other_charge.refresh_from_db()
+        self.assertFalse(other_charge.closed)
+        self.assertEqual(Charge.objects.none().close(), (0, 0))
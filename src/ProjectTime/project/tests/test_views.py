@@ -1,10 +1,20 @@
 # pylint: disable=missing-function-docstring
 
 from datetime import timedelta
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
-from ProjectTime.project.models import Charge, Project
+from ProjectTime.project.models import Charge, ChargeRollup, ChargeTotal, Project
+from ProjectTime.project.tables import ChargeTable
+from ProjectTime.project.tests.utils.charge import ChargeFactory
 from ProjectTime.project.tests.utils.testcase import AdminUserTestCase
+from ProjectTime.project.utils import reporting as report_helpers
 
 
 class ProjectTimeIndexViewTestCase(AdminUserTestCase):
@@ -28,6 +38,119 @@ class ProjectTimeDashboardViewTestCase(AdminUserTestCase):
         response = self.client.get(reverse('dashboard'))
         self.assertEqual(response.status_code, 200)
 
+    def test_dashboard_view_totals_open_charges_without_another_query(self):
+        project = Project(name='Test').validate_and_save()
+        project.members.add(self.user)
+        for hours in (1, 2):
+            charge = ChargeFactory.today(project=project, charge_time=timedelta(hours=hours))
+            charge.owner = self.user
+            charge.validate_and_save()
+        self.performLogin()
+
+        # The session, the user, the timezone profile of the user (which is
+        # then cached), the active projects, the open charges (and their
+        # total), the generation of the cached charts, the chart's projects
+        # and the chart's rollups.
+        with self.assertNumQueries(8):
+            response = self.client.get(reverse('dashboard'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['open_charges_time_charged'], timedelta(hours=3))
+        self.assertContains(response, 'Total Time Spent: 3:00:00')
+
+    def test_dashboard_view_shows_latest_charge_of_user(self):
+        project = Project(name='Test').validate_and_save()
+        other_user = User.objects.create_user('other')
+        project.members.add(self.user, other_user)
+        charge = ChargeFactory.today(project=project, owner=self.user,
+                                     charge_time=timedelta(hours=1)).validate_and_save()
+        ChargeFactory.today(project=project, owner=other_user,
+                            charge_time=timedelta(hours=2)).validate_and_save()
+        self.performLogin()
+
+        response = self.client.get(reverse('dashboard'))
+
+        self.assertEqual([project.db_latest_charge
+                          for project in response.context['active_projects']],
+                         [charge.end_time])
+
+    def test_dashboard_view_totals_no_open_charges_as_none(self):
+        self.performLogin()
+        response = self.client.get(reverse('dashboard'))
+
+        self.assertIsNone(response.context['open_charges_time_charged'])
+
+    @override_settings(PROJECTTIME_DASHBOARD_ASYNC_CHART=True)
+    def test_dashboard_view_defers_chart_data_when_async(self):
+        self.performLogin()
+
+        with patch.object(report_helpers, 'get_monthly_summary_series') as get_series:
+            response = self.client.get(reverse('dashboard'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(get_series.called)
+        self.assertIn(reverse('project:dashboard-chart-data'),
+                      response.context['month_summary_chart_script'])
+
+
+class DashboardChartDataViewTestCase(AdminUserTestCase):
+    def test_chart_data_view_redirects_when_not_logged_in(self):
+        response = self.client.get(reverse('project:dashboard-chart-data'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_chart_data_view_returns_series_columns(self):
+        project = Project(name='Test').validate_and_save()
+        other_user = User.objects.create_user('other')
+        project.members.add(self.user, other_user)
+        ChargeFactory.today(project=project, owner=self.user,
+                            charge_time=timedelta(hours=2)).validate_and_save()
+        # Not counted, as users only see their own charges.
+        ChargeFactory.today(project=project, owner=other_user,
+                            charge_time=timedelta(hours=3)).validate_and_save()
+
+        self.performLogin()
+        response = self.client.get(reverse('project:dashboard-chart-data'))
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['charge'], ['Test'])
+        self.assertEqual(data['value'], [2.0])
+        self.assertEqual(len(data['angle']), 1)
+        self.assertEqual(len(data['color']), 1)
+
+    def test_chart_data_view_can_be_revalidated_with_etag(self):
+        self.performLogin()
+        response = self.client.get(reverse('project:dashboard-chart-data'))
+        etag = response['ETag']
+
+        response = self.client.get(reverse('project:dashboard-chart-data'),
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        project = Project(name='Test').validate_and_save()
+        project.members.add(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            ChargeFactory.today(project=project, owner=self.user,
+                                charge_time=timedelta(hours=2)).validate_and_save()
+
+        response = self.client.get(reverse('project:dashboard-chart-data'),
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_chart_data_view_etag_changes_when_written_in_another_process(self):
+        self.performLogin()
+        response = self.client.get(reverse('project:dashboard-chart-data'))
+        etag = response['ETag']
+
+        # Another process invalidates the charts, and this process has none
+        # of its cache.
+        report_helpers.invalidate_monthly_summary_charts()
+        cache.clear()
+
+        response = self.client.get(reverse('project:dashboard-chart-data'),
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
 
 class ProjectListViewTestCase(AdminUserTestCase):
     def test_project_list_view_redirects_when_not_logged_in(self):
@@ -39,6 +162,84 @@ class ProjectListViewTestCase(AdminUserTestCase):
         response = self.client.get(reverse('project:project-list'))
         self.assertEqual(response.status_code, 200)
 
+    def test_project_list_view_shows_latest_charge_of_user(self):
+        project = Project(name='Test').validate_and_save()
+        other_user = User.objects.create_user('other')
+        project.members.add(self.user, other_user)
+        ChargeFactory.today(project=project, owner=other_user,
+                            charge_time=timedelta(hours=2)).validate_and_save()
+        self.performLogin()
+
+        response = self.client.get(reverse('project:project-list'))
+
+        self.assertEqual([row.record.db_latest_charge
+                          for row in response.context['table'].page.object_list],
+                         [None])
+
+    @override_settings(PROJECTTIME_KEYSET_PAGINATION=True)
+    def test_project_list_view_pages_by_cursor(self):
+        self.performLogin()
+        for index in range(25):
+            project = Project(name=f'Project {index:02}').validate_and_save()
+            project.members.add(self.user)
+
+        names = []
+        cursor = ''
+        while cursor is not None:
+            response = self.client.get(reverse('project:project-list'),
+                                       {'cursor': cursor})
+            table = response.context['table']
+            names.extend(row.record.name for row in table.page.object_list)
+            cursor = table.next_cursor
+
+        self.assertEqual(names, [f'Project {index:02}' for index in range(25)])
+
+
+class ProjectAutocompleteViewTestCase(AdminUserTestCase):
+    def test_project_autocomplete_view_redirects_when_not_logged_in(self):
+        response = self.client.get(reverse('project:project-autocomplete'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_project_autocomplete_view_searches_projects_of_user(self):
+        self.performLogin()
+        for name in ('Acme Corp', 'Acme', 'Unrelated'):
+            Project(name=name).validate_and_save().members.add(self.user)
+        Project(name='Acme Holdings').validate_and_save()
+
+        response = self.client.get(reverse('project:project-autocomplete'), {'term': 'acme'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['text'] for result in response.json()['results']],
+                         ['Acme', 'Acme Corp'])
+        self.assertFalse(response.json()['pagination']['more'])
+
+    def test_project_autocomplete_view_can_search_active_projects_only(self):
+        self.performLogin()
+        for name, active in (('Acme', True), ('Acme Old', False)):
+            Project(name=name, active=active).validate_and_save().members.add(self.user)
+
+        response = self.client.get(reverse('project:project-autocomplete'),
+                                   {'term': 'acme', 'active': 'true'})
+
+        self.assertEqual([result['text'] for result in response.json()['results']], ['Acme'])
+
+    def test_project_autocomplete_view_pages_results(self):
+        self.performLogin()
+        for index in range(25):
+            Project(name=f'Project {index:02}').validate_and_save().members.add(self.user)
+
+        # The session, the user, the timezone profile and the projects.
+        with self.assertNumQueries(4):
+            first_page = self.client.get(reverse('project:project-autocomplete')).json()
+        second_page = self.client.get(reverse('project:project-autocomplete'),
+                                      {'page': 2}).json()
+
+        self.assertEqual(len(first_page['results']), 20)
+        self.assertTrue(first_page['pagination']['more'])
+        self.assertEqual([result['text'] for result in second_page['results']],
+                         [f'Project {index:02}' for index in range(20, 25)])
+        self.assertFalse(second_page['pagination']['more'])
+
 
 class ProjectCreateViewTestCase(AdminUserTestCase):
     def test_project_create_view_redirects_when_not_logged_in(self):
@@ -54,6 +255,7 @@ class ProjectCreateViewTestCase(AdminUserTestCase):
 class ProjectUpdateViewTestCase(AdminUserTestCase):
     def test_project_update_view_redirects_when_not_logged_in(self):
         project = Project(name='Test').validate_and_save()
+        project.members.add(self.user)
         response = self.client.get(
             reverse('project:project-update',
                     args=(project.pk,)))
@@ -62,6 +264,7 @@ class ProjectUpdateViewTestCase(AdminUserTestCase):
     def test_project_update_view_is_ok(self):
         self.performLogin()
         project = Project(name='Test').validate_and_save()
+        project.members.add(self.user)
         response = self.client.get(
             reverse('project:project-update',
                     args=(project.pk,)))
@@ -79,6 +282,173 @@ class ChargeListViewTestCase(AdminUserTestCase):
         self.assertEqual(response.status_code, 200)
 
 
+    def create_charges(self):
+        project = Project(name='Test').validate_and_save()
+        project.members.add(self.user)
+        start_of_today = timezone.localtime().replace(hour=0, minute=0, second=0,
+                                                      microsecond=0)
+        # Pairs of charges share a start time, to page across ties.
+        return [
+            Charge(project=project,
+                   owner=self.user,
+                   start_time=start_of_today + timedelta(hours=index // 2),
+                   end_time=start_of_today + timedelta(hours=index // 2,
+                                                       minutes=index % 7)
+                   ).validate_and_save()
+            for index in range(25)
+        ]
+
+    def get_pages(self, **params):
+        pages = []
+        cursor = ''
+        while cursor is not None:
+            response = self.client.get(reverse('project:charge-list'),
+                                       {**params, 'cursor': cursor})
+            table = response.context['table']
+            pages.append(([row.record.pk for row in table.page.object_list],
+                          table.previous_cursor))
+            cursor = table.next_cursor
+
+        return pages
+
+    @override_settings(PROJECTTIME_KEYSET_PAGINATION=True)
+    def test_charge_list_view_pages_by_cursor(self):
+        self.performLogin()
+        charges = self.create_charges()
+
+        pages = self.get_pages()
+
+        self.assertEqual(
+            [pk for page, _ in pages for pk in page],
+            [charge.pk for charge in sorted(charges,
+                                            key=lambda c: (c.start_time, c.pk))])
+        self.assertEqual([len(page) for page, _ in pages], [10, 10, 5])
+
+    @override_settings(PROJECTTIME_KEYSET_PAGINATION=True)
+    def test_charge_list_view_pages_back_by_cursor(self):
+        self.performLogin()
+        self.create_charges()
+
+        pages = self.get_pages()
+
+        self.assertIsNone(pages[0][1])
+        self.assertEqual(pages[1][1], '')
+        response = self.client.get(reverse('project:charge-list'),
+                                   {'cursor': pages[2][1]})
+        self.assertEqual(
+            [row.record.pk for row in response.context['table'].page.object_list],
+            pages[1][0])
+
+    @override_settings(PROJECTTIME_KEYSET_PAGINATION=True)
+    def test_charge_list_view_pages_by_cursor_when_sorted(self):
+        self.performLogin()
+        charges = self.create_charges()
+
+        pages = self.get_pages(sort='-db_time_charged')
+
+        self.assertEqual(
+            [pk for page, _ in pages for pk in page],
+            [charge.pk for charge in sorted(charges,
+                                            key=lambda c: (-c.time_charged, -c.pk))])
+
+    def test_charge_list_view_sorts_time_spent_by_stored_duration(self):
+        table = ChargeTable(Charge.objects.for_user(self.user).annotate_time_charged(),
+                            order_by='-db_time_charged')
+
+        # Served by the charge_owner_duration_idx index.
+        self.assertIn('ORDER BY "project_charge"."duration_seconds" DESC',
+                      str(table.data.data.query))
+
+    @override_settings(PROJECTTIME_KEYSET_PAGINATION=True)
+    def test_charge_list_view_ignores_invalid_cursor(self):
+        self.performLogin()
+        self.create_charges()
+        first_page = self.get_pages()[0][0]
+        second_cursor = self.client.get(
+            reverse('project:charge-list')).context['table'].next_cursor
+
+        for params in ({'cursor': 'invalid'},
+                       {'cursor': second_cursor[:-1]},
+                       # A cursor from the table when sorted differently.
+                       {'cursor': second_cursor, 'sort': '-start_time'}):
+            response = self.client.get(reverse('project:charge-list'), params)
+            self.assertEqual(response.status_code, 200)
+            if 'sort' not in params:
+                self.assertEqual(
+                    [row.record.pk for row in response.context['table'].page.object_list],
+                    first_page)
+
+    @override_settings(PROJECTTIME_KEYSET_PAGINATION=True)
+    def test_charge_list_view_does_not_count_charges(self):
+        self.performLogin()
+        self.create_charges()
+        cursor = self.client.get(
+            reverse('project:charge-list')).context['table'].next_cursor
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('project:charge-list'),
+                                       {'cursor': cursor})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in context.captured_queries
+                          if 'COUNT(' in query['sql']])
+
+    def test_charge_list_view_shows_only_charges_of_user(self):
+        self.performLogin()
+        charges = self.create_charges()
+        other_user = User.objects.create_user('other')
+        Charge.objects.filter(pk__in=[charge.pk for charge in charges[:20]]).update(
+            owner=other_user)
+
+        response = self.client.get(reverse('project:charge-list'))
+
+        self.assertEqual(
+            sorted(row.record.pk for row in response.context['table'].page.object_list),
+            sorted(charge.pk for charge in charges[20:]))
+
+    def test_charge_list_view_pages_by_number_by_default(self):
+        self.performLogin()
+        self.create_charges()
+
+        response = self.client.get(reverse('project:charge-list'), {'page': 3})
+
+        table = response.context['table']
+        self.assertEqual(table.paginator.num_pages, 3)
+        self.assertEqual(len(table.page.object_list), 5)
+
+
+class ChargeExportViewTestCase(AdminUserTestCase):
+    def test_charge_export_view_redirects_when_not_logged_in(self):
+        response = self.client.get(reverse('project:charge-export'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_charge_export_view_streams_filtered_charges_as_csv(self):
+        project = Project.objects.create(name='Test')
+        project.members.add(self.user)
+        other_project = Project.objects.create(name='Other')
+        charge = ChargeFactory.today(project=project,
+                                     charge_time=timedelta(hours=1))
+        charge.owner = self.user
+        charge.validate_and_save()
+        ChargeFactory.today(project=other_project,
+                            charge_time=timedelta(hours=1)).validate_and_save()
+
+        self.performLogin()
+        response = self.client.get(reverse('project:charge-export'),
+                                   {'project': project.pk})
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines, [
+            'id,project,start_time,end_time,closed',
+            '{},Test,{},{},false'.format(
+                charge.pk,
+                timezone.localtime(charge.start_time).isoformat(),
+                timezone.localtime(charge.end_time).isoformat())
+        ])
+
+
 class ChargeCreateViewTestCase(AdminUserTestCase):
     def test_charge_create_view_redirects_when_not_logged_in(self):
         response = self.client.get(reverse('project:charge-create'))
@@ -89,6 +459,40 @@ class ChargeCreateViewTestCase(AdminUserTestCase):
         response = self.client.get(reverse('project:charge-create'))
         self.assertEqual(response.status_code, 200)
 
+    def test_charge_create_view_charges_user_projects_only(self):
+        self.performLogin()
+        project = Project(name='Test').validate_and_save()
+        project.members.add(self.user)
+        Project(name='Other').validate_and_save()
+
+        response = self.client.get(reverse('project:charge-create'))
+        self.assertEqual(list(response.context['form'].fields['project'].queryset),
+                         [project])
+
+        start_time = timezone.localtime().replace(second=0, microsecond=0)
+        response = self.client.post(reverse('project:charge-create'), {
+            'project': project.pk,
+            'start_time_0': start_time.date().isoformat(),
+            'start_time_1': start_time.time().isoformat(),
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Charge.objects.get().owner, self.user)
+
+    def test_charge_create_view_searches_active_projects_instead_of_listing_them(self):
+        self.performLogin()
+        project = Project(name='Test').validate_and_save()
+        project.members.add(self.user)
+        Project(name='Inactive', active=False).validate_and_save().members.add(self.user)
+
+        response = self.client.get(reverse('project:charge-create'))
+
+        self.assertEqual(list(response.context['form'].fields['project'].queryset),
+                         [project])
+        self.assertNotContains(response, f'<option value="{project.pk}"')
+        self.assertContains(response, f'data-ajax--url="{reverse("project:project-autocomplete")}'
+                                      '?active=true"')
+        self.assertContains(response, 'admin/js/autocomplete.js')
+
     def test_charge_create_view_time_resolution_defaults_to_minutes(self):
         self.performLogin()
         response = self.client.get(reverse('project:charge-create'))
@@ -98,34 +502,167 @@ class ChargeCreateViewTestCase(AdminUserTestCase):
         self.assertEqual(default_charge_start_time.microsecond, 0)
 
 
+    def test_charge_create_view_rejects_second_running_charge(self):
+        self.performLogin()
+        project = Project(name='Test').validate_and_save()
+        project.members.add(self.user)
+        Charge(project=project, owner=self.user,
+               start_time=timezone.now()).validate_and_save()
+
+        start_time = timezone.localtime().replace(second=0, microsecond=0)
+        response = self.client.post(reverse('project:charge-create'), {
+            'project': project.pk,
+            'start_time_0': start_time.date().isoformat(),
+            'start_time_1': start_time.time().isoformat(),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].has_error('end_time',
+                                                           'one_running_charge_per_owner'))
+        self.assertEqual(Charge.objects.count(), 1)
+
+
+class ChargeTimerViewTestCase(AdminUserTestCase):
+    def setUp(self):
+        super().setUp()
+        self.project = Project(name='Test').validate_and_save()
+        self.project.members.add(self.user)
+
+    def test_charge_start_view_redirects_when_not_logged_in(self):
+        response = self.client.post(reverse('project:charge-start'),
+                                    {'project': self.project.pk})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Charge.objects.exists())
+
+    def test_charge_start_view_starts_running_charge(self):
+        self.performLogin()
+        response = self.client.post(reverse('project:charge-start'),
+                                    {'project': self.project.pk})
+
+        self.assertEqual(response.status_code, 201)
+        charge = Charge.objects.get()
+        self.assertEqual(charge.owner, self.user)
+        self.assertIsNone(charge.end_time)
+        self.assertEqual(response.json()['id'], charge.pk)
+        self.assertIsNone(response.json()['end_time'])
+
+    def test_charge_start_view_conflicts_with_running_charge(self):
+        self.performLogin()
+        self.client.post(reverse('project:charge-start'), {'project': self.project.pk})
+        response = self.client.post(reverse('project:charge-start'),
+                                    {'project': self.project.pk})
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['charge']['id'], Charge.objects.get().pk)
+
+    def test_charge_start_view_rejects_project_of_other_users(self):
+        self.performLogin()
+        other_project = Project(name='Other').validate_and_save()
+
+        for data in ({'project': other_project.pk}, {'project': 'x'}, {}):
+            response = self.client.post(reverse('project:charge-start'), data)
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(Charge.objects.exists())
+
+    def test_charge_stop_view_stops_running_charge_and_updates_totals(self):
+        self.performLogin()
+        start_time = timezone.now() - timedelta(hours=2)
+        Charge.objects.start(self.user, self.project.pk, start_time)
+
+        response = self.client.post(reverse('project:charge-stop'))
+
+        self.assertEqual(response.status_code, 200)
+        charge = Charge.objects.get()
+        self.assertIsNotNone(charge.end_time)
+        self.assertEqual(response.json()['id'], charge.pk)
+
+        total = ChargeTotal.objects.get(owner=self.user, project=self.project)
+        self.assertEqual(total.latest_charge_at, charge.end_time)
+        self.assertEqual(total.total_seconds,
+                         int((charge.end_time - charge.start_time).total_seconds()))
+        # Rollups drop the fractions of a second charged in each bucket.
+        self.assertAlmostEqual(
+            sum(ChargeRollup.objects.values_list('total_seconds', flat=True)),
+            total.total_seconds,
+            delta=ChargeRollup.objects.count())
+
+    def test_charge_stop_view_conflicts_without_running_charge(self):
+        self.performLogin()
+        response = self.client.post(reverse('project:charge-stop'))
+        self.assertEqual(response.status_code, 409)
+
+    def test_charge_stop_view_conflicts_when_project_is_inactive(self):
+        self.performLogin()
+        charge = Charge.objects.start(self.user, self.project.pk,
+                                      timezone.now() - timedelta(hours=2))
+        Project.objects.filter(pk=self.project.pk).update(active=False)
+
+        response = self.client.post(reverse('project:charge-stop'))
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['charge']['id'], charge.pk)
+        charge.refresh_from_db()
+        self.assertIsNone(charge.end_time)
+
+
 class ChargeUpdateViewTestCase(AdminUserTestCase):
     def test_charge_update_view_redirects_when_not_logged_in(self):
         now = timezone.now()
         project = Project(name='Test').validate_and_save()
-        charge = Charge(project=project, start_time=now).validate_and_save()
+        project.members.add(self.user)
+        charge = Charge(project=project, owner=self.user,
+                        start_time=now).validate_and_save()
         response = self.client.get(
             reverse('project:charge-update',
                     args=(charge.pk,)))
         self.assertEqual(response.status_code, 302)
 
+    def test_charge_update_view_is_not_found_for_charge_of_other_user(self):
+        self.performLogin()
+        project = Project(name='Test').validate_and_save()
+        charge = Charge(project=project, owner=User.objects.create_user('other'),
+                        start_time=timezone.now()).validate_and_save()
+        response = self.client.get(
+            reverse('project:charge-update',
+                    args=(charge.pk,)))
+        self.assertEqual(response.status_code, 404)
+
     def test_charge_update_view_is_ok(self):
         now = timezone.now()
         self.performLogin()
         project = Project(name='Test').validate_and_save()
-        charge = Charge(project=project, start_time=now).validate_and_save()
+        project.members.add(self.user)
+        charge = Charge(project=project, owner=self.user,
+                        start_time=now).validate_and_save()
         response = self.client.get(
             reverse('project:charge-update',
                     args=(charge.pk,)))
         self.assertEqual(response.status_code, 200)
 
+    def test_charge_update_view_keeps_inactive_project_of_charge_selectable(self):
+        self.performLogin()
+        project = Project(name='Test').validate_and_save()
+        project.members.add(self.user)
+        charge = Charge(project=project, owner=self.user,
+                        start_time=timezone.now()).validate_and_save()
+        project.active = False
+        project.validate_and_save()
+
+        response = self.client.get(reverse('project:charge-update', args=(charge.pk,)))
+
+        self.assertEqual(list(response.context['form'].fields['project'].queryset),
+                         [project])
+        self.assertContains(response, f'<option value="{project.pk}" selected>', count=1)
+
 
 class ChargeCloseViewTestCase(AdminUserTestCase):
     def test_charge_close_view_redirects_when_not_logged_in(self):
         now = timezone.now()
         end = now+timedelta(minutes=1)
         project = Project(name='Test').validate_and_save()
+        project.members.add(self.user)
         charge = Charge(
             project=project,
+            owner=self.user,
             start_time=now,
             end_time=end
         ).validate_and_save()
@@ -139,8 +676,10 @@ class ChargeCloseViewTestCase(AdminUserTestCase):
         end = now+timedelta(minutes=1)
         self.performLogin()
         project = Project(name='Test').validate_and_save()
+        project.members.add(self.user)
         charge = Charge(
             project=project,
+            owner=self.user,
             start_time=now,
             end_time=end
         ).validate_and_save()
@@ -150,3 +689,109 @@ class ChargeCloseViewTestCase(AdminUserTestCase):
         charge.refresh_from_db()
         self.assertTrue(charge.closed)
         self.assertEqual(response.status_code, 302)
+
+    def test_charge_close_view_is_not_found_for_charge_of_other_user(self):
+        now = timezone.now()
+        self.performLogin()
+        project = Project(name='Test').validate_and_save()
+        charge = Charge(
+            project=project,
+            owner=User.objects.create_user('other'),
+            start_time=now,
+            end_time=now + timedelta(minutes=1)
+        ).validate_and_save()
+        response = self.client.post(
+            reverse('project:close-charge',
+                    args=(charge.pk,)))
+        charge.refresh_from_db()
+        self.assertFalse(charge.closed)
+        self.assertEqual(response.status_code, 404)
+
+    def test_charge_close_view_conflicts_when_charge_cannot_be_closed(self):
+        now = timezone.now()
+        self.performLogin()
+        project = Project(name='Test').validate_and_save()
+        charges = [
+            Charge(project=project, owner=self.user, start_time=now,
+                   end_time=now + timedelta(minutes=1), closed=True).validate_and_save(),
+            Charge(project=project, owner=self.user, start_time=now).validate_and_save(),
+        ]
+
+        for charge in charges:
+            response = self.client.post(
+                reverse('project:close-charge',
+                        args=(charge.pk,)))
+            self.assertEqual(response.status_code, 409)
+            self.assertContains(response, 'was not closed', status_code=409)
+
+
+class ChargeBulkCloseViewTestCase(AdminUserTestCase):
+    def setUp(self):
+        super().setUp()
+        self.project = Project(name='Test').validate_and_save()
+        self.other_project = Project(name='Other').validate_and_save()
+        for project in (self.project, self.other_project):
+            project.members.add(self.user)
+
+        now = timezone.now()
+        self.charges = [
+            Charge(project=project, owner=self.user, start_time=now,
+                   end_time=now + timedelta(minutes=1)).validate_and_save()
+            for project in (self.project, self.project, self.other_project)
+        ]
+        self.running_charge = Charge(project=self.project, owner=self.user,
+                                     start_time=now).validate_and_save()
+
+    def test_charge_bulk_close_view_redirects_when_not_logged_in(self):
+        response = self.client.post(reverse('project:charge-bulk-close'))
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Charge.objects.filter(closed=True).exists())
+
+    def test_charge_bulk_close_view_closes_filtered_charges(self):
+        self.performLogin()
+        response = self.client.post('{}?project={}'.format(
+            reverse('project:charge-bulk-close'), self.project.pk))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'closed': 2, 'skipped': 1})
+        self.assertEqual(set(Charge.objects.filter(closed=True)), set(self.charges[:2]))
+
+    def test_charge_bulk_close_view_does_not_close_charges_of_other_users(self):
+        other_user = User.objects.create_user('other')
+        self.project.members.add(other_user)
+        now = timezone.now()
+        other_charge = Charge(project=self.project, owner=other_user, start_time=now,
+                              end_time=now + timedelta(minutes=1)).validate_and_save()
+
+        self.performLogin()
+        response = self.client.post('{}?project={}'.format(
+            reverse('project:charge-bulk-close'), self.project.pk))
+
+        self.assertEqual(response.json(), {'closed': 2, 'skipped': 1})
+        other_charge.refresh_from_db()
+        self.assertFalse(other_charge.closed)
+
+    def test_charge_bulk_close_view_requires_a_filter(self):
+        self.performLogin()
+        for query in ('', '?closed=false', '?start_time__range_after=&project='):
+            response = self.client.post(reverse('project:charge-bulk-close') + query)
+
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('__all__', response.json()['errors'])
+        self.assertFalse(Charge.objects.filter(closed=True).exists())
+
+    def test_charge_bulk_close_view_closes_charges_filtered_by_date(self):
+        self.performLogin()
+        response = self.client.post('{}?start_time__period=today'.format(
+            reverse('project:charge-bulk-close')))
+
+        self.assertEqual(response.json(), {'closed': 3, 'skipped': 1})
+
+    def test_charge_bulk_close_view_rejects_invalid_filter(self):
+        self.performLogin()
+        response = self.client.post('{}?start_time__date=x'.format(
+            reverse('project:charge-bulk-close')))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('start_time__date', response.json()['errors'])
+        self.assertFalse(Charge.objects.filter(closed=True).exists())
@@ -7,22 +7,25 @@ from .general import get_start_of_today
 
 class ChargeFactory:
     @classmethod
-    def today(cls, project=None, charge_time=None):
+    def today(cls, project=None, charge_time=None, owner=None):
         start_of_today = get_start_of_today()
         return Charge(project=project,
+                      owner=owner,
                       start_time=start_of_today,
                       end_time=start_of_today + charge_time)
 
     @classmethod
-    def past_month(cls, project=None, charge_time=None):
+    def past_month(cls, project=None, charge_time=None, owner=None):
         past_month = get_start_of_today() - timedelta(days=31)
         return Charge(project=project,
+                      owner=owner,
                       start_time=past_month,
                       end_time=past_month + charge_time)
 
     @classmethod
-    def future_month(cls, project=None, charge_time=None):
+    def future_month(cls, project=None, charge_time=None, owner=None):
         future_month = get_start_of_today() + timedelta(days=31)
         return Charge(project=project,
+                      owner=owner,
                       start_time=future_month,
                       end_time=future_month + charge_time)
@@ -1,11 +1,16 @@
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
 
 
 class AdminUserTestCase(TestCase):
     @classmethod
     def setUpTestData(cls):
-        User.objects.create_superuser('test', '', 'test')
+        cls.user = User.objects.create_superuser('test', '', 'test')
+
+    def setUp(self):
+        # Rendered charts are cached across requests, and so across tests.
+        cache.clear()
 
     # Helper methods
     def performLogin(self):
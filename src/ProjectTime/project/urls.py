@@ -1,19 +1,30 @@
 from django.urls import path
 
-from ProjectTime.project.views import (ChargeCloseView, ChargeCreateView,
-                                       ChargeListView, ChargeUpdateView,
-                                       DashboardView, ProjectCreateView,
-                                       ProjectListView, ProjectUpdateView)
+from ProjectTime.project.views import (ChargeBulkCloseView, ChargeCloseView,
+                                       ChargeCreateView, ChargeExportView,
+                                       ChargeListView, ChargeStartView,
+                                       ChargeStopView, ChargeUpdateView,
+                                       DashboardChartDataView, DashboardView,
+                                       ProjectAutocompleteView,
+                                       ProjectCreateView, ProjectListView,
+                                       ProjectUpdateView)
 from ProjectTime.timezone.views import TimezoneView
 
 urlpatterns = [
     path('dashboard', DashboardView.as_view(), name='dashboard'),
+    path('dashboard/chart-data', DashboardChartDataView.as_view(), name='dashboard-chart-data'),
     path('set-timezone', TimezoneView.as_view(success_url='dashboard'), name='set-timezone'),
     path('project', ProjectListView.as_view(), name='project-list'),
     path('project/create', ProjectCreateView.as_view(), name='project-create'),
+    path('project/autocomplete', ProjectAutocompleteView.as_view(),
+         name='project-autocomplete'),
     path('project/<int:pk>/update', ProjectUpdateView.as_view(), name='project-update'),
     path('charge', ChargeListView.as_view(), name='charge-list'),
+    path('charge/export', ChargeExportView.as_view(), name='charge-export'),
     path('charge/create', ChargeCreateView.as_view(), name='charge-create'),
     path('charge/<int:pk>/update', ChargeUpdateView.as_view(), name='charge-update'),
     path('charge/<int:pk>/close', ChargeCloseView.as_view(), name='close-charge'),
+    path('charge/close', ChargeBulkCloseView.as_view(), name='charge-bulk-close'),
+    path('charge/start', ChargeStartView.as_view(), name='charge-start'),
+    path('charge/stop', ChargeStopView.as_view(), name='charge-stop'),
 ]
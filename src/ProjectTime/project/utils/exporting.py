@@ -0,0 +1,99 @@
+""" Defines helper functions for exporting charges in bulk.
+
+Charges are read with a server-side cursor in chunks and written out as they
+are read, so memory use does not grow with the number of exported charges.
+"""
+
+import csv
+
+from django.utils import timezone
+
+# The exported columns and the fields they are read from. The columns match
+# those read by the import_charges command.
+EXPORT_COLUMNS = ('id', 'project', 'start_time', 'end_time', 'closed')
+EXPORT_FIELDS = ('pk', 'project__name', 'start_time', 'end_time', 'closed')
+DEFAULT_CHUNK_SIZE = 2000
+
+
+class Echo:  # pylint: disable=too-few-public-methods
+    """ A file-like object that returns what is written to it, for use with
+        csv.writer when streaming.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_charge_rows(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    """ Yields a tuple of the export fields per charge in the queryset, with
+        times in the current timezone.
+    """
+    rows = (queryset
+            .order_by('start_time', 'pk')
+            .values_list(*EXPORT_FIELDS)
+            .iterator(chunk_size=chunk_size))
+
+    for charge_id, project, start_time, end_time, closed in rows:
+        yield (charge_id,
+               project,
+               timezone.localtime(start_time),
+               timezone.localtime(end_time) if end_time else None,
+               closed)
+
+
+def iter_charge_csv(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    """ Yields the lines of a CSV export of the charges in the queryset,
+        starting with a header line.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+
+    for charge_id, project, start_time, end_time, closed in iter_charge_rows(
+            queryset, chunk_size):
+        yield writer.writerow((
+            charge_id,
+            project,
+            start_time.isoformat(),
+            end_time.isoformat() if end_time else '',
+            'true' if closed else 'false'
+        ))
+
+
+def write_charge_parquet(queryset, path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """ Writes the charges in the queryset to a Parquet file, one row group
+        per chunk. Requires pyarrow, which is an optional dependency.
+        Returns the number of charges written.
+    """
+    import pyarrow as pa  # pylint: disable=import-outside-toplevel
+    import pyarrow.parquet as pq  # pylint: disable=import-outside-toplevel
+
+    schema = pa.schema([
+        ('id', pa.int64()),
+        ('project', pa.string()),
+        ('start_time', pa.timestamp('us', tz='UTC')),
+        ('end_time', pa.timestamp('us', tz='UTC')),
+        ('closed', pa.bool_()),
+    ])
+
+    written = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        chunk = []
+        for row in iter_charge_rows(queryset, chunk_size):
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                writer.write_table(_to_arrow_table(pa, schema, chunk))
+                written += len(chunk)
+                chunk = []
+
+        if chunk or not written:
+            writer.write_table(_to_arrow_table(pa, schema, chunk))
+            written += len(chunk)
+
+    return written
+
+
+def _to_arrow_table(pa, schema, rows):  # pylint: disable=invalid-name
+    columns = list(zip(*rows)) if rows else [()] * len(schema)
+    return pa.Table.from_arrays(
+        [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+        schema=schema)
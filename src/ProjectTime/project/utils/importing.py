@@ -0,0 +1,200 @@
+""" Defines helper functions for importing charges in bulk.
+"""
+
+import csv
+import io
+import json
+from datetime import datetime
+
+import pandas as pd
+from django.db import connection, transaction
+from django.utils import timezone
+
+from ..models import Charge, Project
+from ..signals import charges_bulk_created
+
+CHARGE_COLUMNS = ('project', 'start_time', 'end_time', 'closed')
+TRUE_VALUES = ('true', 't', 'yes', 'y', '1')
+FALSE_VALUES = ('false', 'f', 'no', 'n', '0', '')
+
+
+def get_project_map(owner):
+    """ Returns a dictionary of project names to (project id, active) pairs,
+        of the projects that the owner is a member of.
+    """
+    return {
+        name: (project_id, active)
+        for name, project_id, active
+        in Project.objects.for_user(owner).values_list('name', 'pk', 'active')
+    }
+
+
+def has_running_charge(owner):
+    """ Returns whether the owner has a running charge, i.e. one without an
+        end time.
+    """
+    return Charge.objects.filter(owner=owner, end_time__isnull=True).exists()
+
+
+def read_charge_records(stream, file_format):
+    """ Yields (line number, record) pairs from a CSV (with a header row) or
+        JSON Lines stream. Lines that cannot be parsed as a record are yielded
+        with a record of None, so that they can be rejected individually.
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+        return
+
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+
+        yield line_number, record if isinstance(record, dict) else None
+
+
+def validate_charge_batch(records, projects, owner_has_running_charge=False):
+    """ Validates a batch of (line number, record) pairs against the charge
+        invariants, column by column rather than row by row. Only the first
+        running charge of the batch is accepted, and none if the owner
+        already has one.
+
+        Returns a DataFrame of the valid charges (project_id, start_time,
+        end_time, closed) and a DataFrame of the rejected records (line,
+        code, message), both indexed by line number.
+    """
+    lines = [line_number for line_number, _ in records]
+    frame = pd.DataFrame.from_records(
+        [record or {} for _, record in records],
+        columns=CHARGE_COLUMNS,
+        index=pd.Index(lines, name='line'))
+    frame = frame.where(frame.notna(), None).astype(object)
+
+    rejects = pd.DataFrame({'code': None, 'message': None},
+                           index=frame.index, dtype=object)
+
+    def reject(mask, code, message):
+        mask = mask & rejects['code'].isna()
+        rejects.loc[mask, 'code'] = code
+        rejects.loc[mask, 'message'] = message
+
+    reject(pd.Series([record is None for _, record in records], index=frame.index),
+           'invalid_record', 'The line is not a valid record.')
+
+    names = frame['project'].map(lambda value: '' if value is None else str(value))
+    project_ids = names.map(lambda name: projects.get(name, (None, None))[0])
+    project_active = names.map(lambda name: projects.get(name, (None, False))[1])
+    reject(project_ids.isna(), 'unknown_project', 'The project does not exist.')
+    reject(~project_active.astype(bool), 'project_must_be_active',
+           'The project must be active.')
+
+    start_text = _to_text(frame['start_time'])
+    start_times = _parse_times(start_text)
+    reject(start_times.isna(), 'invalid_start_time',
+           'The start time is missing or not a valid date and time.')
+
+    end_text = _to_text(frame['end_time'])
+    end_times = _parse_times(end_text)
+    reject((end_text != '') & end_times.isna(), 'invalid_end_time',
+           'The end time is not a valid date and time.')
+    reject(end_times < start_times, 'end_time_must_be_on_or_after_start_time',
+           'The end time must not be before the start time.')
+
+    closed_text = _to_text(frame['closed']).str.lower()
+    closed = closed_text.isin(TRUE_VALUES)
+    reject(~closed & ~closed_text.isin(FALSE_VALUES), 'invalid_closed',
+           'The closed flag is not a valid boolean.')
+    reject(closed & end_times.isna(), 'cannot_close_without_end_time',
+           'Cannot mark as closed without end time specified.')
+
+    running = end_times.isna() & rejects['code'].isna()
+    reject(running & (running.cumsum() > (0 if owner_has_running_charge else 1)),
+           'one_running_charge_per_owner',
+           'Another time increment is already running.')
+
+    valid = rejects['code'].isna()
+    charges = pd.DataFrame({
+        'project_id': project_ids[valid].astype('int64'),
+        'start_time': start_times[valid],
+        'end_time': end_times[valid],
+        'closed': closed[valid],
+    })
+
+    return charges, rejects[~valid]
+
+
+@transaction.atomic
+def load_charges(charges, owner, method='copy'):
+    """ Inserts a DataFrame of validated charges, owned by the given user,
+        either with a single PostgreSQL COPY or with bulk_create, then sends
+        the charges_bulk_created signal so derived data is kept current.
+    """
+    if charges.empty:
+        return
+
+    charges = charges.assign(owner_id=owner.pk)
+    if method == 'copy':
+        _copy_charges(charges)
+    else:
+        Charge.objects.bulk_create((
+            Charge(project_id=row.project_id,
+                   owner_id=row.owner_id,
+                   start_time=row.start_time.to_pydatetime(),
+                   end_time=(None if pd.isna(row.end_time)
+                             else row.end_time.to_pydatetime()),
+                   closed=row.closed)
+            for row in charges.itertuples(index=False)
+        ), batch_size=1000)
+
+    charges_bulk_created.send(sender=Charge, charges=charges)
+
+
+def _copy_charges(charges):
+    columns = [Charge._meta.get_field(name).column for name in charges.columns]
+
+    buffer = io.StringIO()
+    charges.to_csv(buffer, header=False, index=False,
+                   date_format='%Y-%m-%d %H:%M:%S.%f%z')
+    buffer.seek(0)
+
+    quote_name = connection.ops.quote_name
+    # copy_expert is not wrapped by Django, so its errors are translated here.
+    with connection.cursor() as cursor:
+        with connection.wrap_database_errors:
+            cursor.copy_expert(
+                'COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)'.format(
+                    table=quote_name(Charge._meta.db_table),
+                    columns=', '.join(quote_name(column) for column in columns)),
+                buffer)
+
+
+def _to_text(values):
+    return values.map(lambda value: '' if value is None else str(value).strip())
+
+
+def _parse_times(text):
+    # Naive times are taken to be in the current timezone, as in forms.
+    text = text.where(text != '')
+    times = pd.to_datetime(text, errors='coerce')
+    if times.dtype != object:
+        return (_localize(times) if times.dt.tz is None else times).dt.tz_convert('UTC')
+
+    # Times with different offsets, or a mix of naive times and times with an
+    # offset, are parsed as objects. The naive ones are parsed and localized
+    # apart from the others, which are converted from their offsets.
+    naive = times.map(lambda time: isinstance(time, datetime) and time.tzinfo is None)
+    times = pd.to_datetime(text.where(~naive), errors='coerce', utc=True)
+    times[naive] = _localize(pd.to_datetime(text[naive], errors='coerce')).dt.tz_convert('UTC')
+
+    return times
+
+
+def _localize(times):
+    return times.dt.tz_localize(timezone.get_current_timezone_name(),
+                                ambiguous='NaT', nonexistent='NaT')
@@ -1,50 +1,82 @@
-from calendar import monthrange
-from datetime import timedelta
+import hashlib
+from datetime import datetime, timedelta
+from functools import lru_cache
 from math import pi
 
 import pandas as pd
 from bokeh.embed import components
+from bokeh.models import AjaxDataSource
 from bokeh.palettes import Category20c
 from bokeh.plotting import figure
 from bokeh.transform import cumsum
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import connection
 from django.db.models import F, Sum
+from django.utils import timezone
+
+from ProjectTime.project import instrumentation
+from ProjectTime.project.models import Charge, ChargeRollup
+from ProjectTime.project.querysets import ROLLUP_BUCKET_SIZE
+
+CHART_CACHE_PREFIX = 'project:monthly-summary-chart'
+CHART_GENERATION_SEQUENCE = 'project_chart_generation'
+CHART_CACHE_HITS_KEY = f'{CHART_CACHE_PREFIX}:hits'
+CHART_CACHE_MISSES_KEY = f'{CHART_CACHE_PREFIX}:misses'
+SERIES_COLUMNS = ('charge', 'value', 'angle', 'color')
+
+
+def get_monthly_summary_series(date, project_ids=None, owner=None):
+    # All projects when project_ids is None, and none when it is empty. The
+    # charges of all users when there is no owner.
+    rollups = ChargeRollup.objects.all()
+    charges = Charge.objects.all()
+    if owner is not None:
+        rollups = rollups.filter(owner=owner)
+        charges = charges.filter(owner=owner)
+    if project_ids is not None:
+        rollups = rollups.filter(project__in=project_ids)
+        charges = charges.filter(project__in=project_ids)
 
-from ProjectTime.project.models import Charge
-
+    start_of_month, start_of_next_month = get_month_bounds(date)
 
-def get_monthly_summary_series(date, project_ids=None):
-    charges = Charge.objects.filter(end_time__isnull=False)
-    if project_ids:
-        charges = charges.filter(project__in=project_ids)
+    # Rollups are whole hours in UTC, so in timezones offset from it by part
+    # of an hour (e.g. Asia/Kolkata or Australia/Adelaide) a month starts and
+    # ends partway through a bucket. The time charged in those partial hours
+    # is clipped from the charges instead.
+    start_of_buckets = ChargeRollup.get_bucket(start_of_month)
+    if start_of_buckets < start_of_month:
+        start_of_buckets += ROLLUP_BUCKET_SIZE
+    end_of_buckets = ChargeRollup.get_bucket(start_of_next_month)
 
-    _, end_of_month = monthrange(date.year, date.month)
-    limit_day = timedelta(days=1, microseconds=-1)
-
-    charges = (charges
-               .filter(start_time__range=(
-                   date.replace(day=1,
-                                hour=0,
-                                minute=0,
-                                second=0,
-                                microsecond=0),
-                   date.replace(day=end_of_month,
-                                hour=0,
-                                minute=0,
-                                second=0,
-                                microsecond=0) + limit_day
-               ))
-               .select_related('project')
+    rollups = (rollups
+               .filter(bucket__gte=start_of_buckets, bucket__lt=end_of_buckets)
                .values('project')
                .order_by('project_id')
                .annotate(project_name=F('project__name'))
-               .annotate(total_time_charged=Sum(
-                   F('end_time') - F('start_time')
-               )))
+               .annotate(total_seconds=Sum('total_seconds')))
+
+    project_seconds = {
+        (rollup['project'], rollup['project_name']): rollup['total_seconds']
+        for rollup in rollups
+    }
+
+    for start, end in ((start_of_month, start_of_buckets),
+                       (end_of_buckets, start_of_next_month)):
+        if start == end:
+            continue
+
+        for total in (charges
+                      .time_charged_between(start, end)
+                      .annotate(project_name=F('project__name'))):
+            key = (total['project'], total['project_name'])
+            project_seconds[key] = (project_seconds.get(key, 0) +
+                                    int(total['total_time_charged'].total_seconds()))
 
     chart_data = ({
-        charge['project_name']:
-        charge['total_time_charged'].total_seconds() / 3600
-        for charge in charges
+        project_name: total_seconds / 3600
+        for (_, project_name), total_seconds in sorted(project_seconds.items())
     })
 
     series = (pd.Series(chart_data, dtype='float64')
@@ -62,6 +94,42 @@ def get_monthly_summary_series(date, project_ids=None):
     return series
 
 
+def get_month_bounds(date):
+    """ Returns the start of the month of a date, and the start of the month
+        after it, in the current timezone.
+    """
+    start_of_month = datetime(date.year, date.month, 1)
+    start_of_next_month = (start_of_month + timedelta(days=31)).replace(day=1)
+
+    return (timezone.make_aware(start_of_month, is_dst=False),
+            timezone.make_aware(start_of_next_month, is_dst=False))
+
+
+def get_monthly_summary_series_data(series):
+    """ Returns the series as a mapping of column names to lists of values,
+        the format that Bokeh data sources load JSON data in.
+    """
+    return series.to_dict(orient='list')
+
+
+def get_monthly_summary_ajax_chart_components(data_url, **kwargs):
+    """ Like get_monthly_summary_chart_components, but the chart is empty
+        when rendered and loads its series from data_url in the browser.
+    """
+    return _get_ajax_chart_components(data_url, tuple(sorted(kwargs.items())))
+
+
+@lru_cache(maxsize=32)
+def _get_ajax_chart_components(data_url, chart_options):
+    # The chart does not depend on any data, so it is rendered only once.
+    source = AjaxDataSource(data_url=data_url,
+                            method='GET',
+                            data={column: [] for column in SERIES_COLUMNS})
+
+    return get_monthly_summary_chart_components(source, **dict(chart_options))
+
+
+@instrumentation.timed('bokeh')
 def get_monthly_summary_chart_components(series, **kwargs):
     chart = figure(title=None,
                    toolbar_location=None,
@@ -86,3 +154,90 @@ def get_monthly_summary_chart_components(series, **kwargs):
     chart.legend.location = 'top_left'
 
     return components(chart)
+
+
+def get_cached_monthly_summary_chart_components(date, project_ids=None, owner=None, **kwargs):
+    """ Like get_monthly_summary_chart_components(get_monthly_summary_series(...)),
+        but the rendered chart is cached until a charge or project is written.
+    """
+    key = get_monthly_summary_chart_cache_key(date, project_ids, owner, **kwargs)
+    chart_components = cache.get(key)
+
+    if chart_components is not None:
+        _increment_counter(CHART_CACHE_HITS_KEY)
+        return chart_components
+
+    _increment_counter(CHART_CACHE_MISSES_KEY)
+    chart_components = get_monthly_summary_chart_components(
+        get_monthly_summary_series(date, project_ids, owner),
+        **kwargs
+    )
+    cache.set(key, chart_components,
+              getattr(settings, 'PROJECTTIME_CHART_CACHE_TIMEOUT', DEFAULT_TIMEOUT))
+
+    return chart_components
+
+
+def get_monthly_summary_chart_cache_key(date, project_ids=None, owner=None, **kwargs):
+    # Every write advances the generation, which orphans all previously
+    # cached charts at once; they then age out of the cache on their own.
+    generation = get_monthly_summary_chart_generation()
+    fingerprint = repr((
+        date.year,
+        date.month,
+        timezone.get_current_timezone_name(),
+        (None if project_ids is None
+         else sorted({str(project_id) for project_id in project_ids})),
+        None if owner is None else owner.pk,
+        sorted(kwargs.items()),
+    ))
+
+    return '{prefix}:{generation}:{digest}'.format(
+        prefix=CHART_CACHE_PREFIX,
+        generation=generation,
+        digest=hashlib.md5(fingerprint.encode()).hexdigest()
+    )
+
+
+def get_monthly_summary_etag(date, project_ids=None, owner=None):
+    """ Returns an ETag for the monthly summary series, which changes whenever
+        the series could have changed, without querying for the series. As
+        the chart generation is kept in the database, every server process
+        gives the same ETag.
+    """
+    return get_monthly_summary_chart_cache_key(date, project_ids, owner)
+
+
+def get_monthly_summary_chart_generation():
+    """ Returns the generation of the cached charts. It is kept in a database
+        sequence (see migration 0014), so that it is shared by every server
+        process even when the cache is not.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT last_value FROM {CHART_GENERATION_SEQUENCE}')
+        return cursor.fetchone()[0]
+
+
+def invalidate_monthly_summary_charts():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT nextval(%s)', [CHART_GENERATION_SEQUENCE])
+
+
+def get_monthly_summary_chart_cache_stats():
+    hits = cache.get(CHART_CACHE_HITS_KEY, 0)
+    misses = cache.get(CHART_CACHE_MISSES_KEY, 0)
+
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / (hits + misses) if hits + misses else None,
+    }
+
+
+def _increment_counter(key):
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # The counter was evicted between add() and incr().
+        cache.set(key, 1, timeout=None)
@@ -0,0 +1,49 @@
+""" Defines helper functions for starting and stopping charges as a timer.
+
+Starting and stopping a charge are each a single write to the charge table,
+without the reads of model validation, for clients that do so many times a
+day. See ChargeQuerySet.start and ChargeQuerySet.stop.
+"""
+
+import pandas as pd
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import Charge
+from ..signals import charges_bulk_ended
+
+
+def start_charge(user, project_id, start_time=None):
+    """ Starts a running charge for the user on a project, by default now.
+        Returns the charge, or None if the project cannot be charged by the
+        user or the user already has a running charge.
+    """
+    return Charge.objects.start(user, project_id, start_time or timezone.now())
+
+
+@transaction.atomic
+def stop_charge(user, end_time=None):
+    """ Stops the running charge of the user, by default now, and sends the
+        charges_bulk_ended signal so derived data is kept current. Returns
+        the charge, or None if the user has no running charge or it is on a
+        project that is no longer active.
+    """
+    charge = Charge.objects.stop(user, end_time or timezone.now())
+    if charge is None:
+        return None
+
+    charges_bulk_ended.send(sender=Charge, charges=pd.DataFrame({
+        'owner_id': [charge.owner_id],
+        'project_id': [charge.project_id],
+        'start_time': pd.to_datetime([charge.start_time], utc=True),
+        'end_time': pd.to_datetime([charge.end_time], utc=True),
+        'closed': [charge.closed],
+    }))
+
+    return charge
+
+
+def get_running_charge(user):
+    """ Returns the running charge of the user, or None if there is none.
+    """
+    return Charge.objects.for_user(user).filter(end_time__isnull=True).first()
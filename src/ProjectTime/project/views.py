@@ -1,22 +1,35 @@
 """ Defines the routable views for this app
 """
 
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.views import LoginView
-from django.http.response import HttpResponseRedirect
+from django.core.exceptions import PermissionDenied
+from django.http import Http404
+from django.http.response import (HttpResponse, HttpResponseRedirect,
+                                  JsonResponse, StreamingHttpResponse)
 from django.urls.base import reverse, reverse_lazy
 from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from django.views.generic.base import TemplateView, View
 from django.views.generic.edit import CreateView, UpdateView
-from django_filters.views import FilterView
+from django_filters.constants import EMPTY_VALUES
+from django_filters.views import FilterMixin, FilterView
 from django_tables2 import SingleTableMixin
 
+from ProjectTime.project import instrumentation
 from ProjectTime.project.filters import ChargeFilter, ProjectFilter
 from ProjectTime.project.forms import ChargeModelForm
 from ProjectTime.project.models import Charge, Project
+from ProjectTime.project.pagination import KeysetPaginationMixin
 from ProjectTime.project.tables import ChargeTable, ProjectTable
+from ProjectTime.project.utils import exporting as export_helpers
 from ProjectTime.project.utils import reporting as report_helpers
+from ProjectTime.project.utils import timer as timer_helpers
 from ProjectTime.timezone.forms import TimezoneForm
+from ProjectTime.timezone.utils import get_request_timezone
 
 
 class IndexView(LoginView):
@@ -24,6 +37,19 @@ class IndexView(LoginView):
     redirect_authenticated_user = True
 
 
+def get_chart_project_ids(request):
+    """ Returns the IDs of the projects in the dashboard chart: those that
+        the user is a member of, or only those given by the project query
+        parameter, of them. The chart only counts the charges of the user.
+    """
+    projects = Project.objects.for_user(request.user)
+    requested = request.GET.getlist('project')
+    if requested:
+        projects = projects.filter(pk__in=[value for value in requested if value.isdigit()])
+
+    return list(projects.order_by('pk').values_list('pk', flat=True))
+
+
 class DashboardView(LoginRequiredMixin, TemplateView):
     template_name = "project/dashboard.html"
 
@@ -31,33 +57,51 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         context = super().get_context_data(**kwargs)
 
         active_projects = (Project.objects
+                           .for_user(self.request.user)
                            .filter(active=True)
                            .order_by('name')
-                           .annotate_latest_charge()
+                           .annotate_latest_charge(owner=self.request.user)
                            )
 
         open_charges = (Charge.objects
+                        .for_user(self.request.user)
                         .filter(closed=False)
                         .select_related('project')
                         .order_by('start_time')
-                        .annotate_time_charged()
+                        .annotate_total_time_charged()
                         )
+        # The total is read from the rows, rather than with another query.
+        open_charges = list(open_charges)
+        open_charges_time_charged = (open_charges[0].db_total_time_charged
+                                     if open_charges else None)
 
         month_summary_chart_height = 600
-        month_summary_chart_script, month_summary_chart_div = (
-            report_helpers.get_monthly_summary_chart_components(
-                report_helpers.get_monthly_summary_series(
-                    timezone.localtime()
-                ),
-                sizing_mode="stretch_width",
-                height=month_summary_chart_height,
+        if getattr(settings, 'PROJECTTIME_DASHBOARD_ASYNC_CHART', False):
+            # Render the page without waiting on the report; the chart
+            # fetches its data from DashboardChartDataView once loaded.
+            month_summary_chart_script, month_summary_chart_div = (
+                report_helpers.get_monthly_summary_ajax_chart_components(
+                    reverse('project:dashboard-chart-data'),
+                    sizing_mode="stretch_width",
+                    height=month_summary_chart_height,
+                )
+            )
+        else:
+            month_summary_chart_script, month_summary_chart_div = (
+                report_helpers.get_cached_monthly_summary_chart_components(
+                    timezone.localtime(),
+                    get_chart_project_ids(self.request),
+                    self.request.user,
+                    sizing_mode="stretch_width",
+                    height=month_summary_chart_height,
+                )
             )
-        )
 
-        has_timezone = self.request.session.get('timezone')
+        has_timezone = get_request_timezone(self.request)
 
         context['active_projects'] = active_projects
         context['open_charges'] = open_charges
+        context['open_charges_time_charged'] = open_charges_time_charged
         context['month_summary_chart_script'] = month_summary_chart_script
         context['month_summary_chart_div'] = month_summary_chart_div
         context['month_summary_chart_height'] = month_summary_chart_height
@@ -66,14 +110,44 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         return context
 
 
-class ProjectListView(LoginRequiredMixin, SingleTableMixin, FilterView):
+def get_dashboard_chart_data_etag(request, *args, **kwargs):  # pylint: disable=unused-argument
+    return report_helpers.get_monthly_summary_etag(
+        timezone.localtime(),
+        get_chart_project_ids(request),
+        request.user
+    )
+
+
+@method_decorator(cache_control(private=True, no_cache=True), name='dispatch')
+class DashboardChartDataView(LoginRequiredMixin, View):
+    """ Serves the monthly summary series of the dashboard chart as JSON, for
+        the chart to load asynchronously. Responses carry an ETag, so that
+        clients can revalidate them without the series being recomputed.
+    """
+    http_method_names = ['get']
+
+    @method_decorator(condition(etag_func=get_dashboard_chart_data_etag))
+    def get(self, request):
+        series = report_helpers.get_monthly_summary_series(
+            timezone.localtime(),
+            get_chart_project_ids(request),
+            request.user
+        )
+
+        return JsonResponse(report_helpers.get_monthly_summary_series_data(series))
+
+
+class ProjectListView(LoginRequiredMixin, KeysetPaginationMixin, SingleTableMixin,
+                      FilterView):
     model = Project
     table_class = ProjectTable
     table_pagination = {'per_page': 10}
     filterset_class = ProjectFilter
 
     def get_queryset(self):
-        return super().get_queryset().annotate_latest_charge()
+        return (super().get_queryset()
+                .for_user(self.request.user)
+                .annotate_latest_charge(owner=self.request.user))
 
     def get_table_kwargs(self):
         kwargs = super().get_table_kwargs()
@@ -86,21 +160,67 @@ class ProjectCreateView(LoginRequiredMixin, CreateView):
     fields = ('name', 'active',)
     success_url = reverse_lazy('project:project-list')
 
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        self.object.members.add(self.request.user)
+        return response
+
 
 class ProjectUpdateView(LoginRequiredMixin, UpdateView):
     model = Project
     fields = ('name', 'active',)
     success_url = reverse_lazy('project:project-list')
 
-
-class ChargeListView(LoginRequiredMixin, SingleTableMixin, FilterView):
+    def get_queryset(self):
+        return super().get_queryset().for_user(self.request.user)
+
+
+class ProjectAutocompleteView(LoginRequiredMixin, View):
+    """ Searches the projects of the user by name (the "term" query
+        parameter), best matches first, and responds with a page of them as
+        JSON, in the format of Select2 (and so of the admin's autocomplete
+        widgets): {"results": [{"id", "text"}], "pagination": {"more"}}.
+        Given "active=true", only active projects are searched.
+    """
+    http_method_names = ['get']
+    paginate_by = 20
+
+    def get(self, request):
+        try:
+            page = max(int(request.GET.get('page', 1)), 1)
+        except ValueError:
+            page = 1
+
+        projects = Project.objects.for_user(request.user)
+        if request.GET.get('active') == 'true':
+            projects = projects.filter(active=True)
+
+        offset = (page - 1) * self.paginate_by
+        # One more than a page, to tell whether there is a next page without
+        # counting the matches.
+        projects = list(projects
+                        .search(request.GET.get('term', ''))
+                        .only('pk', 'name', 'active')[offset:offset + self.paginate_by + 1])
+
+        return JsonResponse({
+            'results': [{'id': str(project.pk), 'text': str(project)}
+                        for project in projects[:self.paginate_by]],
+            'pagination': {'more': len(projects) > self.paginate_by},
+        })
+
+
+class ChargeListView(LoginRequiredMixin, KeysetPaginationMixin, SingleTableMixin,
+                     FilterView):
     model = Charge
     table_class = ChargeTable
     table_pagination = {'per_page': 10}
     filterset_class = ChargeFilter
 
     def get_queryset(self):
-        return super().get_queryset().select_related('project').annotate_time_charged()
+        return (super().get_queryset()
+                .for_user(self.request.user)
+                .select_related('project')
+                .annotate_time_charged())
 
     def get_table_kwargs(self):
         kwargs = super().get_table_kwargs()
@@ -108,11 +228,38 @@ class ChargeListView(LoginRequiredMixin, SingleTableMixin, FilterView):
         return kwargs
 
 
+class ChargeExportView(LoginRequiredMixin, FilterMixin, View):
+    """ Streams the charges matching the same filters as ChargeListView as a
+        CSV file, reading them in chunks so that memory use stays flat.
+    """
+    http_method_names = ['get']
+    filterset_class = ChargeFilter
+
+    def get_queryset(self):
+        return Charge.objects.for_user(self.request.user)
+
+    def get(self, _):
+        filterset = self.get_filterset(self.get_filterset_class())
+        charges = filterset.qs if filterset.is_valid() else Charge.objects.none()
+
+        response = StreamingHttpResponse(
+            export_helpers.iter_charge_csv(charges),
+            content_type='text/csv'
+        )
+        response['Content-Disposition'] = 'attachment; filename="charges.csv"'
+        return response
+
+
 class ChargeCreateView(LoginRequiredMixin, CreateView):
     model = Charge
     form_class = ChargeModelForm
     success_url = reverse_lazy('project:charge-list')
 
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['user'] = self.request.user
+        return kwargs
+
     def get_initial(self):
         initial = super().get_initial()
 
@@ -127,12 +274,148 @@ class ChargeUpdateView(LoginRequiredMixin, UpdateView):
     form_class = ChargeModelForm
     success_url = reverse_lazy('project:charge-list')
 
+    def get_queryset(self):
+        return super().get_queryset().for_user(self.request.user)
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['user'] = self.request.user
+        return kwargs
+
 
 class ChargeCloseView(LoginRequiredMixin, View):
     http_method_names = ['post']
 
-    def post(self, _, pk):
-        charge = Charge.objects.get(pk=pk)
-        charge.closed = True
-        charge.validate_and_save()
+    def post(self, request, pk):
+        closed_count, skipped_count = (Charge.objects
+                                       .for_user(request.user)
+                                       .filter(pk=pk)
+                                       .close())
+        if not closed_count and not skipped_count:
+            raise Http404()
+
+        if skipped_count:
+            return HttpResponse('The time increment was not closed, as it is already '
+                                'closed, has no end time or is on an inactive project.',
+                                content_type='text/plain', status=409)
+
         return HttpResponseRedirect(reverse('dashboard'))
+
+
+def has_filter_value(value):
+    # Date ranges are cleaned to a slice, even when both dates are left out.
+    if isinstance(value, slice):
+        return value.start is not None or value.stop is not None
+
+    return value not in EMPTY_VALUES
+
+
+class ChargeBulkCloseView(LoginRequiredMixin, FilterMixin, View):
+    """ Closes the charges matching the same filters as ChargeListView (given
+        in the query string) that can be closed, in a single UPDATE, and
+        responds with the numbers of charges closed and skipped as JSON.
+        Responds with 400 unless at least one project or date filter is given.
+    """
+    http_method_names = ['post']
+    filterset_class = ChargeFilter
+
+    # At least one of these is required, so that a request without filters
+    # does not close every charge of the user.
+    required_filters = ('project', 'project__name__icontains', 'start_time__date',
+                        'start_time__range', 'start_time__period', 'end_time__date')
+
+    def get_queryset(self):
+        return Charge.objects.for_user(self.request.user)
+
+    def post(self, _):
+        filterset = self.get_filterset(self.get_filterset_class())
+        if filterset.is_bound and not filterset.is_valid():
+            return JsonResponse({'errors': filterset.errors}, status=400)
+
+        if not filterset.is_bound or not any(
+                has_filter_value(filterset.form.cleaned_data.get(name))
+                for name in self.required_filters):
+            return JsonResponse({'errors': {'__all__': [
+                'At least one project or date filter is required.']}}, status=400)
+
+        closed_count, skipped_count = filterset.qs.close()
+        return JsonResponse({'closed': closed_count, 'skipped': skipped_count})
+
+
+def get_timer_charge_data(charge):
+    return {
+        'id': charge.pk,
+        'project': charge.project_id,
+        'start_time': charge.start_time,
+        'end_time': charge.end_time,
+        'closed': charge.closed,
+    }
+
+
+class ChargeStartView(LoginRequiredMixin, View):
+    """ Starts a running charge for the user on the posted project, now,
+        and responds with the charge as JSON. Responds with 409 and the
+        running charge if the user already has one.
+    """
+    http_method_names = ['post']
+
+    def post(self, request):
+        try:
+            project_id = int(request.POST.get('project', ''))
+        except ValueError:
+            return JsonResponse({'error': 'A project is required.'}, status=400)
+
+        charge = timer_helpers.start_charge(request.user, project_id)
+        if charge:
+            return JsonResponse(get_timer_charge_data(charge), status=201)
+
+        # Only read to explain why the charge could not be started.
+        running_charge = timer_helpers.get_running_charge(request.user)
+        if running_charge:
+            return JsonResponse({'error': 'A time increment is already running.',
+                                 'charge': get_timer_charge_data(running_charge)},
+                                status=409)
+
+        return JsonResponse({'error': 'The project does not exist or is not active.'},
+                            status=400)
+
+
+class ChargeStopView(LoginRequiredMixin, View):
+    """ Stops the running charge of the user, now, and responds with the
+        charge as JSON. Responds with 409 if no charge is running, or if its
+        project is no longer active.
+    """
+    http_method_names = ['post']
+
+    def post(self, request):
+        charge = timer_helpers.stop_charge(request.user)
+        if charge:
+            return JsonResponse(get_timer_charge_data(charge))
+
+        # Only read to explain why the charge could not be stopped.
+        running_charge = timer_helpers.get_running_charge(request.user)
+        if running_charge:
+            return JsonResponse({'error': 'The project is not active.',
+                                 'charge': get_timer_charge_data(running_charge)},
+                                status=409)
+
+        return JsonResponse({'error': 'No time increment is running.'}, status=409)
+
+
+class MetricsView(View):
+    """ Serves the request metrics totalled per view by this server process,
+        in the Prometheus text format, when the PROJECTTIME_INSTRUMENTATION
+        setting is enabled. Only staff users and INTERNAL_IPS may read them.
+    """
+    http_method_names = ['get']
+
+    def get(self, request):
+        if not getattr(settings, 'PROJECTTIME_INSTRUMENTATION', False):
+            raise Http404()
+
+        if not (request.user.is_staff or
+                request.META.get('REMOTE_ADDR') in getattr(settings, 'INTERNAL_IPS', ())):
+            raise PermissionDenied()
+
+        return HttpResponse(instrumentation.registry.render_prometheus(),
+                            content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,7 +1,11 @@
 """ Defines the widgets used by fields in this app
 """
 
+from django.contrib.admin.widgets import AutocompleteSelect
 from django.forms import SplitDateTimeWidget
+from django.urls import reverse
+
+from ProjectTime.project.models import Charge
 
 
 class HTML5SplitDateTimeWidget(SplitDateTimeWidget):
@@ -19,3 +23,21 @@ class HTML5SplitDateTimeWidget(SplitDateTimeWidget):
         kwargs["time_attrs"] = time_attrs
 
         super().__init__(*args, **kwargs)
+
+
+class ProjectAutocompleteSelect(AutocompleteSelect):
+    """ A select for the project of a charge that only renders the selected
+        project, and searches the others as the user types, a page at a
+        time, with ProjectAutocompleteView. It uses the admin's Select2
+        widget, so its form media must be included in the page. Given
+        active_only, only active projects are offered.
+    """
+
+    def __init__(self, attrs=None, active_only=False):
+        # Served by ProjectAutocompleteView rather than an admin site.
+        super().__init__(Charge._meta.get_field('project'), None, attrs)
+        self.active_only = active_only
+
+    def get_url(self):
+        url = reverse('project:project-autocomplete')
+        return f'{url}?active=true' if self.active_only else url
@@ -4,10 +4,12 @@
 from django.utils import timezone as django_timezone
 from pytz import timezone
 
+from .utils import get_request_timezone
+
 
 class TimezoneMiddleware:  # pylint: disable=too-few-public-methods
-    """ Middleware that activates the selected timezone for a user session on
-        every request.
+    """ Middleware that activates the selected timezone for a user (or a
+        user session) on every request.
     """
 
     def __init__(self, get_response):
@@ -17,8 +19,9 @@ class TimezoneMiddleware:  # pylint: disable=too-few-public-methods
     def __call__(self, request):
         # Code to be executed for each request before
         # the view (and later middleware) are called.
-        if 'timezone' in request.session:
-            django_timezone.activate(timezone(request.session['timezone']))
+        timezone_name = get_request_timezone(request)
+        if timezone_name:
+            django_timezone.activate(timezone(timezone_name))
 
         # Call the next middleware (or the view, if this is the last middleware)
         response = self.get_response(request)
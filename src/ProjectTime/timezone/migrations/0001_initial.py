@@ -0,0 +1,24 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimezoneProfile',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='timezone_profile', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('timezone', models.CharField(help_text='The name of the timezone that dates and times are shown in.', max_length=63)),
+            ],
+        ),
+    ]
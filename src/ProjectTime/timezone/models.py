@@ -0,0 +1,24 @@
+""" Defines the Django models for this app.
+"""
+
+from django.conf import settings
+from django.db import models
+
+
+class TimezoneProfile(models.Model):
+    """ The timezone that a user has selected. It is read through
+        utils.get_user_timezone, which caches it, rather than from the
+        session, so that sessions only need to identify the user.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='timezone_profile')
+
+    timezone = models.CharField(
+        max_length=63,
+        help_text='The name of the timezone that dates and times are shown in.')
+
+    def __str__(self):
+        return f'{self.user}: {self.timezone}'
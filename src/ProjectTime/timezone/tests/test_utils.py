@@ -0,0 +1,62 @@
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+
+from ProjectTime.timezone.models import TimezoneProfile
+from ProjectTime.timezone.utils import (get_request_timezone,
+                                        get_user_timezone, set_user_timezone)
+
+
+class UserTimezoneTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('test')
+
+    def setUp(self):
+        cache.clear()
+
+    def get_request(self, user, session=None):
+        request = RequestFactory().get('/foo/bar')
+        request.user = user
+        request.session = session or {}
+        return request
+
+    def test_user_timezone_is_none_without_profile(self):
+        self.assertIsNone(get_user_timezone(self.user))
+
+    def test_user_timezone_is_cached(self):
+        TimezoneProfile.objects.create(user=self.user, timezone='America/New_York')
+
+        with self.assertNumQueries(1):
+            self.assertEqual(get_user_timezone(self.user), 'America/New_York')
+            self.assertEqual(get_user_timezone(self.user), 'America/New_York')
+
+    def test_user_without_profile_is_cached(self):
+        with self.assertNumQueries(1):
+            self.assertIsNone(get_user_timezone(self.user))
+            self.assertIsNone(get_user_timezone(self.user))
+
+    def test_set_user_timezone_saves_profile_and_updates_cache(self):
+        self.assertIsNone(get_user_timezone(self.user))
+
+        set_user_timezone(self.user, 'Europe/Paris')
+        set_user_timezone(self.user, 'Asia/Tokyo')
+
+        self.assertEqual(TimezoneProfile.objects.get(user=self.user).timezone, 'Asia/Tokyo')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_timezone(self.user), 'Asia/Tokyo')
+
+    def test_request_timezone_prefers_profile_of_user(self):
+        set_user_timezone(self.user, 'Asia/Tokyo')
+        request = self.get_request(self.user, {'timezone': 'Europe/Paris'})
+
+        self.assertEqual(get_request_timezone(request), 'Asia/Tokyo')
+
+    def test_request_timezone_falls_back_to_session(self):
+        self.assertEqual(
+            get_request_timezone(self.get_request(self.user, {'timezone': 'Europe/Paris'})),
+            'Europe/Paris')
+        self.assertEqual(
+            get_request_timezone(self.get_request(AnonymousUser(), {'timezone': 'Europe/Paris'})),
+            'Europe/Paris')
+        self.assertIsNone(get_request_timezone(self.get_request(AnonymousUser())))
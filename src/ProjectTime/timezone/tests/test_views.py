@@ -1,10 +1,16 @@
 from unittest.mock import patch
 
-from django.test import RequestFactory, TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from django.views.generic import FormView
 from django.views.generic.edit import FormMixin
 
 from ProjectTime.timezone.forms import TimezoneForm
+from ProjectTime.timezone.utils import get_user_timezone
 from ProjectTime.timezone.views import TimezoneView
 
 
@@ -48,3 +54,61 @@ class TimezoneViewTestCase(ViewTestCase):
             view.form_valid(form)
 
         self.assertEqual(request.session['timezone'], 'America/New_York')
+
+    def test_set_timezone_for_user_on_successful_submit(self):
+        user = User.objects.create_user('test')
+        request = RequestFactory().get('/foo/bar')
+        request.session = {}
+        request.user = user
+
+        view = self.setup_class_based_view(TimezoneView, request)
+
+        form = TimezoneForm(data={
+            'timezone': 'America/New_York'
+        })
+
+        form.full_clean()
+
+        with patch.object(FormMixin, 'form_valid'):
+            view.form_valid(form)
+
+        self.assertEqual(get_user_timezone(user), 'America/New_York')
+        self.assertNotIn('timezone', request.session)
+
+
+class TimezoneSessionEngineTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('test', password='test', is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def check_session_engine(self, engine):
+        with override_settings(SESSION_ENGINE=engine):
+            self.assertTrue(self.client.login(username='test', password='test'))
+            response = self.client.post(reverse('project:set-timezone'),
+                                        {'timezone': 'Asia/Tokyo'})
+            self.assertEqual(response.status_code, 302)
+
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(reverse('admin:index'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['timezone'], 'Asia/Tokyo')
+        return [query['sql'] for query in context.captured_queries]
+
+    def test_timezone_with_database_sessions(self):
+        queries = self.check_session_engine('django.contrib.sessions.backends.db')
+
+        self.assertTrue(any('django_session' in sql for sql in queries))
+
+    def test_timezone_with_cached_database_sessions(self):
+        queries = self.check_session_engine('django.contrib.sessions.backends.cached_db')
+
+        self.assertFalse(any('django_session' in sql for sql in queries))
+
+    def test_timezone_with_signed_cookie_sessions(self):
+        queries = self.check_session_engine('django.contrib.sessions.backends.signed_cookies')
+
+        self.assertFalse(any('django_session' in sql for sql in queries))
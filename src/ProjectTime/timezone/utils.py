@@ -0,0 +1,56 @@
+""" Defines helpers for reading and writing the timezone of users
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import TimezoneProfile
+
+USER_TIMEZONE_CACHE_PREFIX = 'timezone:user'
+
+
+def _get_cache_key(user_id):
+    return f'{USER_TIMEZONE_CACHE_PREFIX}:{user_id}'
+
+
+def _get_cache_timeout():
+    return getattr(settings, 'PROJECTTIME_TIMEZONE_CACHE_TIMEOUT', 5 * 60)
+
+
+def get_user_timezone(user):
+    """ Returns the name of the timezone on the profile of a user, or None.
+        Profiles are cached (including the lack of one), so that most
+        requests do not query them.
+    """
+    key = _get_cache_key(user.pk)
+    name = cache.get(key)
+    if name is None:
+        name = (TimezoneProfile.objects
+                .filter(user=user.pk)
+                .values_list('timezone', flat=True)
+                .first()) or ''
+        cache.set(key, name, _get_cache_timeout())
+
+    return name or None
+
+
+def set_user_timezone(user, name):
+    """ Saves the name of a timezone to the profile of a user.
+    """
+    TimezoneProfile.objects.update_or_create(user=user, defaults={'timezone': name})
+    cache.set(_get_cache_key(user.pk), name, _get_cache_timeout())
+
+
+def get_request_timezone(request):
+    """ Returns the name of the timezone selected for a request, or None: the
+        timezone on the profile of the logged in user, or else the one in
+        the session (for anonymous users, and for sessions that selected a
+        timezone before it was stored on profiles).
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.pk is not None:
+        name = get_user_timezone(user)
+        if name:
+            return name
+
+    return request.session.get('timezone')
@@ -4,14 +4,21 @@
 from django.views import generic as views
 
 from .forms import TimezoneForm
+from .utils import set_user_timezone
 
 
 class TimezoneView(views.FormView):  # pylint: disable=too-many-ancestors
-    """ View to set the timezone for a user session
+    """ View to set the timezone for a user, or for the session of an
+        anonymous user
     """
     template_name = 'timezone_form.html'
     form_class = TimezoneForm
 
     def form_valid(self, form):
-        self.request.session['timezone'] = form.cleaned_data['timezone']
+        user = getattr(self.request, 'user', None)
+        if user is not None and user.is_authenticated:
+            set_user_timezone(user, form.cleaned_data['timezone'])
+        else:
+            self.request.session['timezone'] = form.cleaned_data['timezone']
+
         return super().form_valid(form)